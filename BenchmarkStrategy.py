@@ -1,31 +1,43 @@
+import numpy as np
 import pandas as pd
-from collections import defaultdict
+from price_store import load_panel
+from tradelog import TradeLog, REASONS, SIDES
+from valuation import portfolio_frame, portfolio_records
+import instrument
+import results
 
 class static_stratgy:
     """
     Benchmark:
-      - Buy X shares of each ticker on the first available day (using previous day's volume as ADV cap).
+      - Buy X shares of each ticker on its first available day (using previous day's volume as ADV cap);
+        a ticker listed after the panel starts buys on its own second close.
       - No further trades.
       - Track holdings, cash, equity over time.
+    All tickers are handled at once: share counts are one vector, holdings
+    one matrix-vector product over the wide price matrix.
     """
-    def __init__(self, initial_capital, tickers, pr=0.05):
+    def __init__(self, initial_capital, tickers, pr=0.05, data_dir="data/adjclose"):
         self.init_cash = float(initial_capital)
         self.cash = float(initial_capital)
         self.tickers = tickers
+        self.data_dir = data_dir
         self.window = 1
         self.pr_rate = float(pr)
-        self.trade = []
+        self.trade = TradeLog()
         self.base = self.init_cash / max(1, len(tickers))
-        self.portfolio = defaultdict()     
-        self.equity = 0.0                  
+        self.shares = None                 # Series: shares bought per ticker
+        self.prices = None                 # wide price matrix the benchmark holds
+        self.entry = None                  # per ticker: row of self.prices it is bought on
+        self.equity = 0.0
+        self.cached = False                # last run() restored from the run store
         # time series (filled in access_portfolio)
-        self.total_holdings = None        
-        self.cash_series = None           
-        self.equity_series = None        
-        self.portfolio_rows = []           
+        self.total_holdings = None
+        self.cash_series = None
+        self.equity_series = None
+        self._portfolio = None
 
-    def base_shares(self, ticker_price: float):
-        return self.base / float(ticker_price)
+    def base_shares(self, ticker_price):
+        return self.base / ticker_price
 
     @staticmethod
     def adv(volume):
@@ -35,97 +47,157 @@ class static_stratgy:
     def pr_shares(self, volume):
         return self.pr_rate * self.adv(volume)
 
-    def get_shares(self, volume: int, ticker_price: float):
-        # cap by base dollars and participation rate
-        ptcpt_cap = self.pr_shares(volume)
-        shares = min(self.base_shares(ticker_price), ptcpt_cap)
-        return shares if shares > 0 else 0
+    def get_shares(self, volume, ticker_price):
+        # cap by base dollars and participation rate (scalars or arrays)
+        ptcpt_cap = self.pr_shares(np.asarray(volume, dtype="float64"))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            shares = np.minimum(self.base_shares(np.asarray(ticker_price, dtype="float64")), ptcpt_cap)
+        return np.where(shares > 0, shares, 0.0)    # NaN -> 0 as well
 
-    def strategy_static(self, prices, volume, ticker):
+    @staticmethod
+    def entry_rows(close):
+        """
+        Per ticker, the rows of its first and second valid close: the
+        volume day and the buy day (like iloc[0] / iloc[1:] on the ticker's
+        own history). len(close) for the buy day when there is none.
+        """
+        valid = np.array(close.notna().to_numpy())
+        cols = np.arange(valid.shape[1])
+        first = valid.argmax(axis=0)
+        valid[first, cols] = False
+        second = valid.argmax(axis=0)
+        return first, np.where(valid[second, cols], second, len(close))
+
+    def run(self, close=None, volume=None):
         """
-        Buy on the first day in `prices` using previous day's volume cap.
-        Then hold forever. Return the *position value series* (shares * price).
+        close / volume: optional wide (date x ticker) frames to reuse, e.g. the
+        matrices a sweep already loaded; by default they come from the store.
         """
-        # previous day's volume (assumed aligned so volume.iloc[0] is prev day)
-        shares = self.get_shares(volume.iloc[0], prices.iloc[0])
-
-        if shares > 0:
-            self.cash -= shares * prices.iloc[0]     # spend once on day 0
-            self.trading_log(ticker, shares, prices.iloc[0], "BUY")
-        else:
-            self.trading_log(ticker, shares, prices.iloc[0], "SKIP")
-
-        # position value over time = fixed shares * daily price series
-        position_value = shares * prices
-        return position_value
-
-    def run(self):
-        for ticker in self.tickers:
-            df = pd.read_parquet(f"data/adjclose/{ticker}.parquet")
-            prices = df["Close"].iloc[1:]    # buy at first “real” trading day
-            vol    = df["Volume"]            # previous day volume is at .iloc[0]
-
-            pos_val = self.strategy_static(prices, vol, ticker)
-            self.portfolio[ticker] = pos_val
-            self.equity += pos_val.iloc[-1]  # accumulate final holdings value
-
-        self.equity += self.cash            # add remaining cash to final equity
+        with instrument.phase("static_stratgy.load"):
+            close, volume = self._inputs(close, volume)
+
+        prices = close.iloc[1:]                      # buy at first “real” trading day
+        if prices.empty:
+            return self
+        run = results.lookup(self, close, volume)    # stored result for this config + data?
+        self.cached = run is not None and run.hit
+        if self.cached:
+            return self._restore(run)
+        with instrument.phase("static_stratgy.execution"):
+            # each ticker buys on its own second close, capped by the volume of its first
+            prev, buy = self.entry_rows(close)
+            at = np.minimum(buy, len(close) - 1)
+            cols = np.arange(len(self.tickers))
+            listed = buy < len(close)
+            px0 = np.where(listed, close.to_numpy(dtype="float64")[at, cols], np.nan)
+            vol0 = np.where(listed, volume.to_numpy(dtype="float64")[prev, cols], np.nan)
+            shares = self.get_shares(vol0, px0)
+            dates = np.where(listed, close.index.values[at], prices.index.values[0]).astype("M8[ns]")
+
+            # cash after each ticker's buy, in ticker order (sequential, like one-by-one)
+            bought = shares > 0
+            spend = np.where(bought, shares * px0, 0.0)
+            steps = np.subtract.accumulate(np.r_[self.cash, spend])
+            self._log_first_day(dates, shares, px0, bought, steps)
+            self.cash = float(steps[-1])
+            instrument.count("candidates", len(shares))
+            instrument.count("fills", int(bought.sum()))
+            instrument.count("skips", int((~bought).sum()))
+
+        with instrument.phase("static_stratgy.valuation"):
+            self.shares = pd.Series(shares, index=self.tickers)
+            self.prices = prices
+            self.entry = buy - 1                     # rows of prices (= close.iloc[1:])
+            self.access_portfolio()
+            self.equity = float(self.equity_series.iloc[-1])
+            instrument.count("days", len(prices))
+        results.save(run, self)
+        return self
+
+    def params(self):
+        # what besides cash and the input data decides the result (run store key)
+        return {"pr": self.pr_rate}
+
+    def _inputs(self, close=None, volume=None):
+        if close is None:
+            close = load_panel(self.tickers, "Close", self.data_dir)
+        if volume is None:
+            volume = load_panel(self.tickers, "Volume", self.data_dir)
+        return close.reindex(columns=self.tickers), volume.reindex(columns=self.tickers)
+
+    def _restore(self, run):
+        # results of an identical stored run (see results.py)
+        self.trade = run.trade_log()
+        self.prices = run.inputs[0].iloc[1:]
+        self.entry = self.entry_rows(run.inputs[0])[1] - 1
+        self.shares = pd.Series(self.tickers, index=self.tickers).map(run.positions()).fillna(0.0).astype("float64")
+        self.cash = run.final_cash
+        self._portfolio = run.portfolio
+        self.total_holdings = run.portfolio["holdings"]
+        self.cash_series = run.portfolio["cash"]
+        self.equity_series = run.portfolio["equity"]
+        self.equity = float(self.equity_series.iloc[-1])
         return self
 
-    def trading_log(self, tkr, shares, price, action):
-        self.trade.append({
-            "ticker": tkr,
-            "qty": shares,
-            "price": price,
-            "cash_snapshot": self.cash,
-            "action": action
-        })
+    def _log_first_day(self, date, shares, px0, buy, steps):
+        # same schema as the signal strategies (see tradelog.py); date: each ticker's buy day
+        codes = self.trade.intern(list(self.tickers))
+        reason = np.where(buy, -1,
+                          np.where(px0 > 0, REASONS.index("no_volume"), REASONS.index("no_price")))
+        self.trade.extend(np.asarray(date, dtype="M8[ns]"), codes,
+                          np.where(buy, SIDES.index("BUY"), SIDES.index("SKIP")),
+                          shares, px0, np.where(buy, shares * px0, 0.0),
+                          steps[:-1], steps[1:], reason)
+
+    def trades_df(self):
+        return self.trade.to_frame()
+
+    @property
+    def portfolio(self):
+        # position value per ticker over time (shares * price), built on demand
+        if self.shares is None:
+            return pd.DataFrame()
+        held = np.arange(len(self.prices))[:, None] >= self.entry
+        return self.prices.where(held) * self.shares
 
     def access_portfolio(self):
         """
         Build daily series:
-          - total_holdings: sum of position values across tickers (Series)
+          - total_holdings: price matrix @ share vector (NaN price and days
+            before a ticker's buy count as 0)
           - cash_series: cash per day (constant after day 0 here)
           - equity_series: cash_series + total_holdings
-        Also populates self.portfolio_rows for easy export.
         """
-        # wide matrix of position values (one column per ticker)
-        wide = pd.concat(self.portfolio, axis=1).sort_index()
-
-        # total holdings value over time
-        total_holdings = wide.sum(axis=1, min_count=1).fillna(0.0)
-
-        # cash is constant after the buys (single-shot benchmark)
-        cash_series = pd.Series(self.cash, index=total_holdings.index)
-
-        # equity = cash + holdings
-        equity_series = cash_series + total_holdings
-
-        # save for later use
-        self.total_holdings = total_holdings
-        self.cash_series = cash_series
-        self.equity_series = equity_series
+        px = self.prices.to_numpy()
+        shares = self.shares.to_numpy()
+        holdings = np.empty(len(px))
+        for a in range(0, len(px), 256):             # row blocks: no full-size temporaries
+            blk = px[a:a + 256]
+            before = np.arange(a, a + len(blk))[:, None] < self.entry
+            holdings[a:a + 256] = np.where(np.isnan(blk) | before, 0.0, blk) @ shares
+        cash = np.full(len(px), self.cash)
+
+        frame = portfolio_frame(self.prices.index, cash, holdings)
+        self._portfolio = frame
+        self.total_holdings = frame["holdings"]
+        self.cash_series = frame["cash"]
+        self.equity_series = frame["equity"]
+        return self.total_holdings, self.cash_series, self.equity_series
+
+    def portfolio_df(self):
+        if self.shares is None:            # not run yet
+            return pd.DataFrame()
+        if self._portfolio is None:
+            self.access_portfolio()
+        return self._portfolio
 
-        # build row snapshots (date, cash, holdings, equity)
-        self.portfolio_rows = [
-            {"date": d,
-             "cash": float(cash_series.loc[d]),
-             "holdings": float(total_holdings.loc[d]),
-             "equity": float(equity_series.loc[d])}
-            for d in equity_series.index
-        ]
-        return total_holdings, cash_series, equity_series
+    @property
+    def portfolio_rows(self):
+        # (date, cash, holdings, equity) dicts for easy export
+        return portfolio_records([self.portfolio_df()]) if self.shares is not None else []
 
     def final_shot(self):
         # make sure series exist
         if self.equity_series is None:
             self.access_portfolio()
-
-        last_date = self.equity_series.index[-1]
-        out = {
-            "date": last_date,
-            "cash": float(self.cash_series.loc[last_date]),
-            "holdings": float(self.total_holdings.loc[last_date]),
-            "equity": float(self.equity_series.loc[last_date])
-        }
-        return pd.DataFrame([out])  # single-row DataFrame
+        return self.portfolio_df().iloc[[-1]].reset_index()  # single-row DataFrame
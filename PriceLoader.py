@@ -1,14 +1,25 @@
 
 
 from dataclasses import dataclass
-import yfinance as yf
 from collections import defaultdict
 import pandas as pd
+import numpy as np
 import os
 from pathlib import Path
-import time
+from price_store import build_store, update_store
+import bar_store
+import json
+import warnings
+from typing import Callable
+from downloader import BatchDownloader
+import instrument
 
 
+def _yf_download(*args, **kwargs):
+    # yfinance (and its HTTP stack) is imported only when something is downloaded
+    import yfinance as yf
+    return yf.download(*args, **kwargs)
+
 # change format
 def _yf_symbol(sym: str) -> str:
     return sym.replace('.', '-').strip()
@@ -38,9 +49,42 @@ def get_sp500_tickers():
     return out
 
 # trading calendar
-def load_trading_calendar(start, end):
-    sp500_data = yf.download("^GSPC",start =start,end = end)
-    return list(sp500_data.index)
+CALENDAR = "_calendar.json"
+
+def load_trading_calendar(start, end, download=None, cache_dir=None):
+    '''
+    trading days in [start, end) from the ^GSPC history
+
+    With cache_dir the calendar is kept in {cache_dir}/_calendar.json with
+    the range it covers; a request inside that range is answered locally,
+    anything else downloads the union of both ranges once and re-saves.
+    '''
+    req_start, req_end = start, end = pd.Timestamp(start), pd.Timestamp(end)
+    path = Path(cache_dir) / CALENDAR if cache_dir is not None else None
+    cached = None
+    if path is not None and path.exists():
+        with open(path) as fh:
+            cached = json.load(fh)
+        lo = pd.Timestamp(cached["start"])
+        # days after the download date weren't known yet when it was saved
+        hi = min(pd.Timestamp(cached["end"]), pd.Timestamp(cached["fetched"]))
+        if lo <= start and end <= hi:
+            days = pd.DatetimeIndex(cached["dates"])
+            return list(days[(days >= start) & (days < end)])
+        start, end = min(start, lo), max(end, pd.Timestamp(cached["end"]))
+
+    download = download if download is not None else _yf_download
+    sp500_data = download("^GSPC",start =start.strftime("%Y-%m-%d"),end = end.strftime("%Y-%m-%d"))
+    days = pd.DatetimeIndex(sp500_data.index)
+    if path is not None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(".tmp")
+        with open(tmp, "w") as fh:
+            json.dump({"start": start.strftime("%Y-%m-%d"), "end": end.strftime("%Y-%m-%d"),
+                       "fetched": pd.Timestamp.now().strftime("%Y-%m-%d"),
+                       "dates": [d.strftime("%Y-%m-%d") for d in days]}, fh)
+        os.replace(tmp, path)
+    return list(days[(days >= req_start) & (days < req_end)])
 
 #handle raw data
 def cov_rate(data,days):
@@ -58,6 +102,120 @@ def cov_rate(data,days):
         nonNA = len(data) - data.isna().sum()
         return float(nonNA)/float(days) if days else 0.0
 
+def coverage_report(close, days, min_coverage=0.0):
+    '''
+    cov_rate for every ticker in one vectorized pass
+
+    input:
+            1. close: aligned close prices (dates x tickers)
+            2. days: number of trading days in the calendar
+    output:
+            DataFrame indexed by ticker: rows, observations, coverage,
+            first / last valid date, covered (coverage >= min_coverage)
+    '''
+    valid = close.notna().to_numpy()
+    T = valid.shape[0]
+    n_obs = valid.sum(axis=0)
+    any_obs = n_obs > 0
+    first = np.where(any_obs, valid.argmax(axis=0), 0)
+    last = np.where(any_obs, T - 1 - valid[::-1].argmax(axis=0), 0)
+    dates = pd.DatetimeIndex(close.index)
+    coverage = n_obs / float(days) if days else np.zeros(len(n_obs))
+    rep = pd.DataFrame({
+        "rows": T,
+        "observations": n_obs,
+        "coverage": coverage,
+        "first": dates[first].where(any_obs) if T else pd.NaT,
+        "last": dates[last].where(any_obs) if T else pd.NaT,
+        "covered": coverage >= min_coverage,
+    }, index=pd.Index(close.columns, name="ticker"))
+    return rep
+
+COVERAGE = "_coverage.csv"
+
+def save_coverage(outdir, report):
+    # per-ticker coverage written next to the data (existing rows are updated)
+    path = Path(outdir) / COVERAGE
+    if path.exists():
+        old = pd.read_csv(path, index_col="ticker", parse_dates=["first", "last"])
+        report = pd.concat([old[~old.index.isin(report.index)], report])
+    report.sort_index().to_csv(path)
+
+
+# manifest of what is stored locally (for incremental updates)
+MANIFEST = "_manifest.json"
+
+def load_manifest(outdir):
+    '''
+    {"tickers": {ticker: last valid close},
+     "rejected": {ticker: {"reason": "low_coverage" | "no_data", "coverage": ...}},
+     "run": {"key": ..., "done": [batch index, ...]}}
+    '''
+    path = Path(outdir) / MANIFEST
+    if not path.exists():
+        return {"tickers": {}, "rejected": {}, "run": None}
+    with open(path) as fh:
+        m = json.load(fh)
+    m.setdefault("tickers", {}); m.setdefault("rejected", {}); m.setdefault("run", None)
+    return m
+
+def save_manifest(outdir, manifest):
+    # write-then-rename so a crash never leaves a half written manifest
+    path = Path(outdir) / MANIFEST
+    tmp = path.with_suffix(".tmp")
+    with open(tmp, "w") as fh:
+        json.dump(manifest, fh, indent=1, sort_keys=True)
+    os.replace(tmp, path)
+
+def _last_date(df_t):
+    # the ticker's own last valid close ("YYYY-MM-DD"), None if it has none
+    last = df_t["Close"].last_valid_index() if "Close" in df_t else None
+    return None if last is None else pd.Timestamp(last).strftime("%Y-%m-%d")
+
+def _rejection(report, t):
+    # manifest entry of a ticker that is not stored: too sparse, or nothing downloaded
+    if report is not None and t in report.index and report.at[t, "observations"] > 0:
+        return {"reason": "low_coverage", "coverage": float(report.at[t, "coverage"])}
+    return {"reason": "no_data"}
+
+def split_batch(df, batch):
+    '''
+    split a yf.download(group_by="ticker") frame into {ticker: Close/Volume frame}
+    '''
+    out = {}
+    if df is None or df.empty:
+        return out
+    if not isinstance(df.columns, pd.MultiIndex):      # single ticker, flat columns
+        df = pd.concat({batch[0]: df}, axis=1)
+    for t in df.columns.get_level_values(0).unique():
+        df_t = df.xs(t, axis=1, level=0, drop_level=True)
+        cols = [c for c in ("Close", "Volume") if c in df_t.columns]
+        out[t] = pd.DataFrame(df_t.loc[:, cols]).sort_index()
+    return out
+
+def _warn_failed(reports):
+    if len(reports) and not reports["ok"].all():
+        bad = reports.loc[~reports["ok"], ["index", "error"]]
+        warnings.warn(f"{len(bad)} download batch(es) failed: {bad.to_dict('records')}")
+
+def _yf_interval(bar_freq):
+    # pandas bar alias -> yfinance interval ("1min" -> "1m", "1h" -> "1h", "1D" -> "1d")
+    freq = bar_store.normalize_freq(bar_freq)
+    if freq == bar_store.DAILY:
+        return "1d"
+    td = pd.Timedelta(freq)
+    return f"{td // pd.Timedelta(hours=1)}h" if td % pd.Timedelta(hours=1) == pd.Timedelta(0) \
+        else f"{td // pd.Timedelta(minutes=1)}m"
+
+def append_parquet(path, new):
+    # append new rows to an existing per-ticker file (new rows win on overlap)
+    if path.exists():
+        old = pd.read_parquet(path)
+        new = pd.concat([old, new])
+        new = new[~new.index.duplicated(keep="last")].sort_index()
+    new.to_parquet(path)
+    return new
+
 
 
 
@@ -79,72 +237,302 @@ class PriceLoader:
     batch_size:int = 25
     threads:bool  = True # fetch batches concurrently
     min_coverage:float = 0.9
+    download: Callable = None   # yf.download-compatible function (injectable for tests)
+    max_workers:int = 4         # concurrent batch requests
+    retries:int = 3             # extra attempts per batch (exponential backoff)
     covered_tickers = []
 
+    def _download(self, batch, start, end, interval=None):
+        fn = self.download if self.download is not None else _yf_download
+        kw = {} if interval is None else {"interval": interval}
+        return fn(batch, start=start, end=end, group_by="ticker",
+                  threads=self.threads, progress=False, **kw)
+
+    def _downloader(self):
+        # `sleep` seconds between requests becomes a token-bucket rate,
+        # requests overlap up to max_workers
+        return BatchDownloader(lambda job: self._download(*job),
+                               max_workers=self.max_workers,
+                               rate=(1.0 / self.sleep) if self.sleep else None,
+                               retries=self.retries)
+
+    def _calendar_days(self):
+        # number of trading days in [start, end), with the same retries as batches
+        with instrument.phase("PriceLoader.calendar"):
+            dl = self._downloader()
+            dl.fetch = lambda _: load_trading_calendar(self.start, self.end, self.download,
+                                                       cache_dir=self.outdir)
+            (_, _, cal, rep), = dl.run([["^GSPC"]])
+            if not rep.ok:
+                raise RuntimeError(f"trading calendar download failed: {rep.error}")
+            return len(cal)
+
     def loader(self):
         
         # get tickers of SP 500
         tickers = get_sp500_tickers()
 
         # download daily adjusted close prices for all S&P 500
-        frames = []
-        for i in range(0, len(tickers), self.batch_size):
-            batch = tickers[i:i + self.batch_size]
-            df = yf.download(
-                batch,
-                start=self.start, end=self.end,
-                group_by="ticker",
-                threads=self.threads,       
-                progress=False
-            )
-            frames.append(df)
-            
-            # sleep only if there is a next batch
-            if i + self.batch_size < len(tickers):
-                time.sleep(self.sleep)   
-            
+        batches = [tickers[i:i + self.batch_size] for i in range(0, len(tickers), self.batch_size)]
+        dl = self._downloader()
+        frames = {}
+        with instrument.phase("PriceLoader.loader"):
+            for i, job, df, rep in dl.run((batch, self.start, self.end) for batch in batches):
+                instrument.count("batches")
+                instrument.count("attempts", rep.attempts)
+                if rep.ok:
+                    frames[i] = df
+        self.reports = dl.report_frame()
+        _warn_failed(self.reports)
 
         # combine per-batch frames (MultiIndex columns will align)
-        return pd.concat(frames, axis=1)
+        return pd.concat([frames[i] for i in sorted(frames)], axis=1)
 
   
         
-    def fetch_data(self,data):
+    def _store_batch(self, parts, out, totaldays):
+        '''
+        coverage-filter one downloaded batch and write its tickers
+        input: {ticker: Close/Volume frame}
+        output: {ticker: stored date index}, coverage report of the batch
+        '''
+        stored = {}
+        parts = {t: df_t for t, df_t in parts.items() if not df_t.empty}
+        if not parts:
+            return stored, None
+
+        with instrument.phase("PriceLoader.store_batch"):
+            #drop sparse tickers (one pass over the batch's close matrix)
+            close = pd.DataFrame({t: df_t["Close"] for t, df_t in parts.items()})
+            report = coverage_report(close, totaldays, self.min_coverage)
+            for t in report.index[report["covered"] & (report["observations"] > 0)]:
+                df_t = parts[t]
+                df_t.to_parquet(out / f"{t}.parquet")
+                stored[t] = df_t.index
+            instrument.count("tickers_stored", len(stored))
+            instrument.count("tickers_rejected", len(parts) - len(stored))
+        return stored, report
+
+    def fetch_data(self,data=None,tickers=None):
         '''
         Store data(close price) locally and one file per ticker
-        input: raw dataset
+        input: raw dataset from loader(); None = download and store in a
+               streaming way (each batch is filtered, written and released
+               as soon as it arrives, so peak memory ~ one batch)
+               tickers: universe to download (default: current S&P 500)
         output:many files for tickers
         '''
         
         out = Path(self.outdir) 
         out.mkdir(parents=True, exist_ok=True)
 
-        totaldays = len(load_trading_calendar(self.start, self.end))
-        for t in data.columns.levels[0]:
-            df_t = data.xs(t, axis=1, level=0, drop_level=True).copy() 
-            df_t = pd.DataFrame(df_t.loc[:,["Close","Volume"]])  
-            df_t.sort_index(inplace=True)
+        totaldays = self._calendar_days()
+        stored, last, rejected, reports = {}, {}, {}, []
 
-            #check if empty
-            if df_t.empty:
-                continue
+        def keep(batch, part, report):
+            # part: stored tickers; the batch's other tickers are rejected
+            stored.update(part); reports.append(report)
+            last.update({t: report.at[t, "last"].strftime("%Y-%m-%d") for t in part})
+            rejected.update({t: _rejection(report, t) for t in batch if t not in part})
+
+        if data is not None:
+            tickers = list(data.columns.levels[0])
+            keep(tickers, *self._store_batch(split_batch(data, tickers), out, totaldays))
+        else:
+            tickers = list(tickers) if tickers is not None else get_sp500_tickers()
+            batches = [tickers[i:i + self.batch_size] for i in range(0, len(tickers), self.batch_size)]
+            dl = self._downloader()
+            with instrument.phase("PriceLoader.fetch"):
+                for _, (batch, _, _), df, rep in dl.run((b, self.start, self.end) for b in batches):
+                    instrument.count("batches")
+                    instrument.count("attempts", rep.attempts)
+                    if rep.ok:
+                        keep(batch, *self._store_batch(split_batch(df, batch), out, totaldays))
+                    else:
+                        instrument.count("failed_batches")
+                    del df
+            self.reports = dl.report_frame()
+            _warn_failed(self.reports)
+
+        # batches finish in any order; keep the universe order
+        self.covered_tickers = [t for t in tickers if t in stored]
+
+        reports = [r for r in reports if r is not None]
+        if reports:
+            self.coverage = pd.concat(reports)
+            save_coverage(out, self.coverage)
+
+        # consolidated, memory-mappable date x ticker matrices (see price_store);
+        # built from the files one ticker at a time
+        with instrument.phase("PriceLoader.build_store"):
+            index = pd.DatetimeIndex([])
+            for idx in stored.values():
+                index = index.union(idx)
+            build_store(out, tickers=[t for t in tickers if t in stored], index=index)
+
+        # remember what is stored (each ticker's own last close) and what was
+        # rejected, so update() neither refetches history nor retries dead tickers
+        manifest = load_manifest(out)
+        for t, day in last.items():
+            manifest["tickers"][t] = day
+            manifest["rejected"].pop(t, None)
+        for t, why in rejected.items():
+            manifest["rejected"][t] = why
+            manifest["tickers"].pop(t, None)
+        save_manifest(out, manifest)
+
+    def update(self, tickers=None):
+        '''
+        Incremental, resumable refresh of the local store.
+
+        For every ticker only the range after its last stored date is
+        downloaded and appended to its parquet file; tickers never seen
+        before get the full [start, end) history and the usual coverage
+        check. Downloads run concurrently through the rate-limited
+        BatchDownloader; progress is saved to the manifest as batches
+        finish, so a crashed run (or one with failed batches) picks up the
+        unfinished batches on the next call. Tickers that
+        failed the coverage check or came back without data (delisted)
+        are remembered under "rejected" in the manifest, with the reason,
+        and not downloaded again (drop them from it to retry). The
+        consolidated store is grown by the appended rows and new tickers
+        (price_store.update_store), not rebuilt from every file.
+
+        input: tickers (default: current S&P 500 list)
+        output: list of stored tickers
+        '''
+        out = Path(self.outdir)
+        out.mkdir(parents=True, exist_ok=True)
+        tickers = list(tickers) if tickers is not None else get_sp500_tickers()
+        manifest = load_manifest(out)
+        stored, rejected = manifest["tickers"], manifest["rejected"]
+
+        # same range + universe + batching = same run -> resume it
+        run_key = [self.start, self.end, self.batch_size, tickers]
+        run = manifest["run"]
+        if not run or run.get("key") != run_key:
+            run = manifest["run"] = {"key": run_key, "done": []}
+        done = set(run["done"])
 
-            #drop sparse ticker
-            coverage_rate = cov_rate(df_t["Close"],days = totaldays)
-            if coverage_rate >= self.min_coverage:
-                self.covered_tickers.append(t)
-                df_t.to_parquet(out / f"{t}.parquet") 
-                
-            else:
+        end = pd.Timestamp(self.end)
+        batches = [tickers[i:i + self.batch_size] for i in range(0, len(tickers), self.batch_size)]
+
+        # one download job per (batch, first missing date)
+        jobs, pending = [], defaultdict(int)
+        for b, batch in enumerate(batches):
+            if b in done:
                 continue
+            groups = defaultdict(list)
+            for t in batch:
+                if t in rejected:
+                    continue
+                start = (pd.Timestamp(stored[t]) + pd.Timedelta(days=1)
+                         if t in stored else pd.Timestamp(self.start))
+                if start < end:
+                    groups[start].append(t)
+            for start, group in groups.items():
+                jobs.append((b, start, group))
+                pending[b] += 1
+            if not groups:
+                run["done"].append(b)          # already up to date
+
+        totaldays = None
+        if any(t not in stored for _, _, group in jobs for t in group):
+            totaldays = self._calendar_days()
+
+        dl = self._downloader()
+        failed, appended = set(), {}
+        work = ((group, start.strftime("%Y-%m-%d"), self.end) for _, start, group in jobs)
+        with instrument.phase("PriceLoader.update"):
+            for j, (group, _, _), data, rep in dl.run(work):
+                b, start, _ = jobs[j]
+                instrument.count("batches")
+                instrument.count("attempts", rep.attempts)
+                if not rep.ok:
+                    instrument.count("failed_batches")
+                    failed.add(b)
+                    continue
+                parts = {t: df_t[df_t.index >= start] for t, df_t in split_batch(data, group).items()}
+                new = {t: df_t for t, df_t in parts.items() if t not in stored and not df_t.empty}
+                report = None
+                if new:
+                    # new tickers: full history, apply the coverage filter
+                    close = pd.DataFrame({t: df_t["Close"] for t, df_t in new.items()})
+                    report = coverage_report(close, totaldays, self.min_coverage)
+                    save_coverage(out, report)
+                    for t in report.index[~report["covered"] | (report["observations"] == 0)]:
+                        rejected[t] = _rejection(report, t)
+                for t in group:
+                    if t not in stored and t not in rejected and t not in new:
+                        rejected[t] = _rejection(report, t)      # nothing downloaded
+                for t, df_t in parts.items():
+                    if t in rejected:
+                        continue
+                    if t in stored:
+                        df_t = df_t.dropna(subset=["Close"])
+                    if df_t.empty:
+                        continue
+                    if t in stored:
+                        appended[t] = df_t          # update_store writes just these rows
+                    full = append_parquet(out / f"{t}.parquet", df_t)
+                    stored[t] = _last_date(full)
 
+                pending[b] -= 1
+                if pending[b] == 0 and b not in failed:
+                    run["done"].append(b)
+                save_manifest(out, manifest)
+
+        self.reports = dl.report_frame()
+        _warn_failed(self.reports)
+        if not failed:
+            manifest["run"] = None      # finished: next call is a fresh run
+        save_manifest(out, manifest)
+
+        self.covered_tickers = [t for t in tickers if t in stored]
+        with instrument.phase("PriceLoader.build_store"):
+            # grow the existing store by the appended rows / new tickers
+            update_store(out, tickers=sorted(stored), rows=appended)
+        return self.covered_tickers
+
+    def fetch_bars(self, tickers, bar_freq="1min", root=bar_store.BARS_ROOT, partition="month"):
+        '''
+        Download intraday bars for [start, end) into the partitioned bar
+        store (bar_store.py): same batching, rate limit and retries as
+        fetch_data, each batch written as soon as it arrives. Existing
+        bars are kept (new rows win on overlap), so calling this again for
+        a later range extends the store.
+
+        input: tickers, bar_freq ("1min", "5min", "1h", ...), root of the
+               bar store, partition ("month" or "day", fixed by the first write)
+        output: list of tickers that got bars
+        '''
+        interval = _yf_interval(bar_freq)
+        tickers = list(tickers)
+        batches = [tickers[i:i + self.batch_size] for i in range(0, len(tickers), self.batch_size)]
+        dl = self._downloader()
+        stored = set()
+        with instrument.phase("PriceLoader.fetch_bars"):
+            for _, (batch, *_), df, rep in dl.run((b, self.start, self.end, interval) for b in batches):
+                instrument.count("batches")
+                instrument.count("attempts", rep.attempts)
+                if not rep.ok:
+                    instrument.count("failed_batches")
+                    continue
+                parts = {t: df_t.dropna(subset=["Close"]) for t, df_t in split_batch(df, batch).items()
+                         if "Close" in df_t}
+                parts = {t: df_t for t, df_t in parts.items() if not df_t.empty}
+                bar_store.write_bars(parts, root, bar_freq, partition)
+                stored.update(parts)
+                del df
+        self.reports = dl.report_frame()
+        _warn_failed(self.reports)
+        return [t for t in tickers if t in stored]
 
-    
 
-    if __name__ == "__main__":
-        plr = PriceLoader(start = "2005-01-01",
-                 end = "2025-01-01",
-                 outdir = "data/adjclose",
-                 sleep = 1.2)
-        data = plr.loader()
-        print(data.head())
\ No newline at end of file
+if __name__ == "__main__":
+    plr = PriceLoader(start = "2005-01-01",
+             end = "2025-01-01",
+             outdir = "data/adjclose",
+             sleep = 1.2)
+    data = plr.loader()
+    print(data.head())
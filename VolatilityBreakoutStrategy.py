@@ -1,70 +1,26 @@
-import pandas as pd
+from indicators import Indicators
+import streaming
+from strategy import SignalStrategy
 
-class VolatilityBreakoutStrategy:
+class VolatilityBreakoutStrategy(SignalStrategy):
     """
     Buy 1 share if daily return > rolling N-day std dev on day t; trade at t+1.
     """
     def __init__(self, initial_cash, tickers, lookback=20,
-                 data_dir="data/adjclose", price_col="Adj Close"):
-        self.cash = float(initial_cash)
-        self.tickers = list(tickers)
+                 data_dir=None, price_col="Adj Close", compact=False,
+                 bar_freq="1D", start=None, end=None):
+        super().__init__(initial_cash, tickers, data_dir, price_col, compact, bar_freq, start, end)
         self.lookback = int(lookback)
-        self.data_dir = data_dir
-        self.price_col = price_col
-        self.positions = {t: 0 for t in self.tickers}
-        self.trades = []
-        self.portfolio_rows = []
 
-    def _load_one(self, tkr):
-        df = pd.read_parquet(f"{self.data_dir}/{tkr}.parquet")
-        col = self.price_col if self.price_col in df.columns else ("Adj Close" if "Adj Close" in df.columns else "Close")
-        return df[col].sort_index()
+    def _make_signals(self, price, ind=None):
+        ind = Indicators(price) if ind is None else ind
+        ret = ind.returns()
+        vol = ind.rolling_std(self.lookback)
+        return (ret > vol) & ret.notna() & vol.notna()
 
-    def run(self):
-        price = pd.DataFrame({t: self._load_one(t) for t in self.tickers}).sort_index()
-        if price.empty: return self
+    def stream(self):
+        # O(1)-per-bar signals: update(today's closes) -> tickers to buy tomorrow
+        return streaming.VolBreakoutSignals(self.lookback, len(self.tickers))
 
-        ret = price.pct_change()
-        vol = ret.rolling(self.lookback, min_periods=self.lookback).std()
-        sig_t = (ret > vol) & ret.notna() & vol.notna()
-
-        orders = sig_t.shift(1).fillna(False).astype(int)
-
-        for d in price.index:
-            px_d = price.loc[d]; od_d = orders.loc[d]
-            cands = [(t, float(px_d[t])) for t in price.columns if od_d.get(t,0)==1 and pd.notna(px_d.get(t)) and px_d[t]>0]
-            for t in price.columns:
-                if od_d.get(t,0)==1 and (not pd.notna(px_d.get(t)) or px_d.get(t)<=0):
-                    self._log_skip(d, t, "no_price")
-
-            if cands:
-                total = sum(p for _, p in cands)
-                if total <= self.cash:
-                    filled, skipped = cands, []
-                else:
-                    cands.sort(key=lambda x: (x[1], x[0]))
-                    filled, skipped, cash_left = [], [], self.cash
-                    for t, p in cands:
-                        if p <= cash_left: filled.append((t,p)); cash_left -= p
-                        else: skipped.append((t,p))
-                for t, p in filled:
-                    cb = self.cash; self.cash -= p; self.positions[t]+=1
-                    self.trades.append({"date": d, "ticker": t, "side":"BUY", "qty":1,
-                                        "price": p, "notional": p,
-                                        "cash_before": cb, "cash_after": self.cash})
-                for t, p in skipped:
-                    self._log_skip(d, t, "insufficient_cash", price=p)
-
-            hold = sum(self.positions[t]*float(px_d[t]) for t in price.columns if pd.notna(px_d.get(t)))
-            self.portfolio_rows.append({"date": d, "cash": self.cash, "holdings": hold, "equity": self.cash + hold})
-
-        return self
-
-    def _log_skip(self, date, ticker, reason, price=None):
-        self.trades.append({"date": date, "ticker": ticker, "side":"SKIP", "qty":0,
-                            "price": (float(price) if price is not None else None),
-                            "notional": 0.0, "cash_before": self.cash, "cash_after": self.cash,
-                            "reason": reason})
-
-    def trades_df(self):     return pd.DataFrame(self.trades).sort_values(["date","ticker"])
-    def portfolio_df(self):  return pd.DataFrame(self.portfolio_rows).set_index("date").sort_index()
+    def params(self):
+        return dict(super().params(), lookback=self.lookback)
@@ -1,14 +1,43 @@
 import pandas as pd
 import numpy as np
+from tradelog import TradeLog
+import results
+from bar_store import TRADING_DAYS, bars_per_year
+
+
+'''
+Trade / portfolio normalization (get_trades, get_port) and metrics for
+many runs at once. Equity curves are stacked as one date x run matrix
+and every statistic is a vectorized reduction over the date axis, so
+scoring thousands of sweep results is a handful of numpy passes, not a
+Python loop per portfolio:
+
+    eq = stack({"MA": ma, "RSI": rsi, "MACD": mac})          # date x run
+    metrics(eq)                                               # one row per run
+    summarize({"MA": ma, "RSI": rsi})                         # + turnover, exposure, fill ratios
+    rolling_metrics(eq, 63)["sharpe"]                         # date x run
+
+Returns are taken between consecutive non-NaN rows of each column (runs
+over different date ranges can share one matrix). The annualization is
+the one used by the sweeps and the notebook: ann_return = (1 + mean
+daily return) ** 252 - 1, ann_vol = std * sqrt(252), sharpe = ann_return
+/ ann_vol, with 252 replaced by bars_per_year(bar_freq) for intraday
+runs. Traded notional is read from day-to-day cash changes: the
+strategies only buy, and nothing else moves their cash.
+'''
+
 
 def get_trades(obj):
 
+    if isinstance(obj, TradeLog):
+        return obj.to_frame()
+    obj = results.cached(obj)      # a not-yet-run strategy: its stored run, if any
     if hasattr(obj, "trades_df"):
         df = obj.trades_df()
         if df is None:
             df = pd.DataFrame()
-        else:
-            df = df.copy()
+        elif any(isinstance(getattr(obj, a, None), TradeLog) for a in ("trades", "trading_log", "trade")):
+            return df          # TradeLog view: typed columns already, no copy
     else:
         
         log_attr = None
@@ -19,36 +48,276 @@ def get_trades(obj):
         else:
             log_attr = []
 
-        df = pd.DataFrame(list(log_attr)).copy() if log_attr else pd.DataFrame(
+        df = pd.DataFrame(list(log_attr)) if log_attr else pd.DataFrame(
             columns=["date","ticker","side","qty","price","notional","cash_before","cash_after","reason"]
         )
 
-    if not df.empty and "date" in df.columns:
-        df["date"] = pd.to_datetime(df["date"])
+    if not df.empty and "date" in df.columns and not pd.api.types.is_datetime64_any_dtype(df["date"]):
+        df = df.assign(date=pd.to_datetime(df["date"]))     # new frame, the strategy's stays as is
     return df
 
 
 def get_port(obj):
     
+    obj = results.cached(obj)
     if hasattr(obj, "portfolio_df"):
         df = obj.portfolio_df()
         if df is None:
             df = pd.DataFrame()
-        else:
-            df = df.copy()
-            if "date" in df.columns:
-                df = df.set_index("date")
+        elif "date" in df.columns:
+            df = df.set_index("date")
 
     elif hasattr(obj, "portfolio_rows") and not callable(getattr(obj, "portfolio_rows")):
-        df = pd.DataFrame(getattr(obj, "portfolio_rows")).copy()
+        df = pd.DataFrame(getattr(obj, "portfolio_rows"))
         if not df.empty and "date" in df.columns:
             df = df.set_index("date")
     else:
         df = pd.DataFrame()
 
     if not df.empty:
-        df.index = pd.to_datetime(df.index)
-        for c in ["cash","holdings","equity"]:
-            if c not in df.columns:
+        missing = [c for c in ["cash","holdings","equity"] if c not in df.columns]
+        if missing or not isinstance(df.index, pd.DatetimeIndex):
+            df = df.copy(deep=False)      # never modify the strategy's own frame
+            df.index = pd.to_datetime(df.index)
+            for c in missing:
                 df[c] = np.nan
     return df
+
+
+# ---------- batched metrics ----------
+
+PORT_COLS = ["cash", "holdings", "equity"]
+
+
+def _column(obj, col):
+    if isinstance(obj, pd.Series):
+        return obj
+    df = obj if isinstance(obj, pd.DataFrame) else get_port(obj)
+    return df[col] if col in df else pd.Series(dtype="float64")
+
+
+def stack(runs, col="equity"):
+    '''
+    date x run matrix of one portfolio column
+    input:
+            1. runs: {name: strategy | portfolio frame | Series}
+            2. col: "equity", "cash" or "holdings"
+    output:
+            float DataFrame on the union of dates, one column per run (NaN where a run has no row)
+    '''
+    cols = {name: _column(obj, col) for name, obj in runs.items()}
+    return pd.DataFrame(cols, dtype="float64")
+
+
+def _prev_valid(valid):
+    # row of the previous non-NaN value of each column (-1 if none), and of the last one up to t
+    T = valid.shape[0]
+    last = np.maximum.accumulate(np.where(valid, np.arange(T)[:, None], -1), axis=0)
+    prev = np.vstack([np.full((1, valid.shape[1]), -1), last[:-1]])
+    return prev, last
+
+
+def _take(x, rows):
+    # x[rows[t, j], j], NaN where rows < 0
+    out = np.take_along_axis(x, np.maximum(rows, 0), axis=0)
+    out[rows < 0] = np.nan
+    return out
+
+
+def _matrix(x):
+    if x is None:
+        return None
+    x = np.asarray(x, dtype="float64")
+    return x[:, None] if x.ndim == 1 else x
+
+
+def _daily(E, C=None):
+    '''
+    daily returns (and traded notional) between consecutive non-NaN rows,
+    the forward-filled equity and the rows that had a previous value
+    '''
+    valid = ~np.isnan(E)
+    prev, last = _prev_valid(valid)
+    stepped = valid & (prev >= 0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ret = np.where(stepped, E / _take(E, prev) - 1, np.nan)
+    traded = None if C is None else np.where(stepped, np.abs(C - _take(C, prev)), np.nan)
+    return ret, traded, _take(E, last), valid
+
+
+def _ann(mean, std, down, n, periods):
+    # annualized return / vol / downside vol and the two ratios, as in sweep / the notebook
+    ann_ret = np.where(n > 0, (1 + mean) ** periods - 1, np.nan)
+    ann_vol = np.where(n > 1, std * np.sqrt(periods), np.nan)
+    down = down * np.sqrt(periods)
+    sharpe = np.where((ann_vol > 0) & np.isfinite(ann_vol), ann_ret / np.where(ann_vol > 0, ann_vol, 1), np.nan)
+    sortino = np.where(down > 0, ann_ret / np.where(down > 0, down, 1), np.nan)
+    return ann_ret, ann_vol, sharpe, sortino
+
+
+def metrics(equity, cash=None, holdings=None, fills=None, skips=None, initial=None,
+            periods=TRADING_DAYS):
+    '''
+    Performance metrics of many runs in one vectorized pass.
+
+    input:
+            1. equity: date x run matrix (DataFrame, or a (T, R) / (T,) array)
+            2. cash, holdings: matrices of the same shape (optional) -> turnover, exposure
+            3. fills, skips: BUY / SKIP counts per run (optional) -> fill / skip ratios
+            4. initial: starting capital (scalar or per run) for total_return; default the first equity
+            5. periods: bars per year (bar_store.bars_per_year(bar_freq); 252 for daily bars)
+    output:
+            DataFrame, one row per run: final_equity, total_return, ann_return, ann_vol,
+            sharpe, sortino, max_drawdown, max_dd_days [, turnover, exposure]
+            [, n_fills, n_skips, fill_ratio, skip_ratio]
+    '''
+    names = equity.columns if isinstance(equity, pd.DataFrame) else None
+    E, C, H = _matrix(equity), _matrix(cash), _matrix(holdings)
+    T, R = E.shape
+    names = names if names is not None else pd.RangeIndex(R, name="run")
+    ret, traded, F, valid = _daily(E, C)
+
+    # return statistics
+    n = (~np.isnan(ret)).sum(axis=0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mean = np.nansum(ret, axis=0) / n
+        std = np.sqrt(np.nansum((ret - mean) ** 2, axis=0) / (n - 1))
+        down = np.sqrt(np.nansum(np.minimum(ret, 0) ** 2, axis=0) / n)
+    ann_ret, ann_vol, sharpe, sortino = _ann(mean, std, down, n, periods)
+
+    has = valid.any(axis=0)
+    cols = np.arange(R)
+    first = valid.argmax(axis=0)
+    final = np.where(has, F[-1], np.nan) if T else np.full(R, np.nan)
+    start = E[first, cols] if initial is None else np.broadcast_to(np.asarray(initial, dtype="float64"), R)
+
+    # drawdown depth and the longest stretch below a previous peak (in rows)
+    peak = np.fmax.accumulate(F, axis=0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        dd = F / peak - 1
+        below = F < peak
+    since = np.maximum.accumulate(np.where(below, 0, np.arange(T)[:, None]), axis=0)
+    dd_days = (np.arange(T)[:, None] - since).max(axis=0) if T else np.zeros(R, dtype=int)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        out = {"final_equity": final, "total_return": np.where(has, final / start - 1, np.nan),
+               "ann_return": ann_ret, "ann_vol": ann_vol, "sharpe": sharpe, "sortino": sortino,
+               "max_drawdown": np.fmin.reduce(dd, axis=0) if T else np.full(R, np.nan),
+               "max_dd_days": dd_days}
+        rows = valid.sum(axis=0)
+        if C is not None:
+            spent = np.nansum(traded, axis=0)
+            if initial is not None:                        # what the first row bought
+                spent = spent + np.where(has, np.abs(start - C[first, cols]), 0)
+            avg = np.nansum(E, axis=0) / rows
+            out["turnover"] = spent / avg * periods / rows
+        if H is not None:
+            out["exposure"] = np.nansum(np.where(valid, H / E, np.nan), axis=0) / rows
+        if fills is not None or skips is not None:
+            f = np.broadcast_to(np.asarray(0 if fills is None else fills, dtype="float64"), R)
+            k = np.broadcast_to(np.asarray(0 if skips is None else skips, dtype="float64"), R)
+            out.update(n_fills=f, n_skips=k, fill_ratio=f / (f + k), skip_ratio=k / (f + k))
+    return pd.DataFrame(out, index=names)
+
+
+def summarize(runs, initial=None, periods=None):
+    '''
+    metrics() of {name: strategy} with cash / holdings / equity from get_port
+    and BUY / SKIP counts from get_trades; periods defaults to the bars per
+    year of the runs' bar_freq
+    '''
+    if periods is None:
+        freqs = {getattr(obj, "bar_freq", "1D") for obj in runs.values() if not isinstance(obj, pd.DataFrame)}
+        if len(freqs) > 1:
+            raise ValueError(f"runs mix bar frequencies {sorted(freqs)}; pass periods=")
+        periods = bars_per_year(freqs.pop() if freqs else "1D")
+    ports = {name: obj if isinstance(obj, pd.DataFrame) else get_port(obj) for name, obj in runs.items()}
+    mats = {c: stack(ports, c) for c in PORT_COLS}
+    fills, skips = [], []
+    for name, obj in runs.items():
+        tr = pd.DataFrame() if isinstance(obj, pd.DataFrame) else get_trades(obj)
+        side = tr["side"].astype(str) if "side" in tr else pd.Series(dtype=str)
+        fills.append(int((side == "BUY").sum())); skips.append(int((side == "SKIP").sum()))
+    return metrics(mats["equity"], mats["cash"], mats["holdings"], fills, skips,
+                   initial=initial, periods=periods)
+
+
+def _wsum(x, w):
+    # trailing w-row sums from one cumulative sum: O(1) per step
+    c = np.cumsum(np.vstack([np.zeros((1, x.shape[1])), x]), axis=0)
+    lo = np.maximum(np.arange(1, len(x) + 1) - w, 0)
+    return c[1:] - c[lo]
+
+
+def _wmax(x, w):
+    '''
+    trailing w-row maximum (van Herk / Gil-Werman): prefix and suffix
+    maxima inside blocks of w rows, so each step costs O(1) whatever w is
+    '''
+    T = len(x)
+    pad = (-T) % w
+    xp = np.vstack([x, np.full((pad, x.shape[1]), -np.inf)])
+    blocks = xp.reshape(-1, w, x.shape[1])
+    pre = np.maximum.accumulate(blocks, axis=1).reshape(xp.shape)
+    suf = np.maximum.accumulate(blocks[:, ::-1], axis=1)[:, ::-1].reshape(xp.shape)
+    out = pre[:T].copy()
+    t = np.arange(w - 1, T)
+    out[t] = np.maximum(suf[t - w + 1], pre[t])
+    return out
+
+
+def rolling_metrics(equity, window, cash=None, holdings=None, min_periods=None,
+                    periods=TRADING_DAYS):
+    '''
+    Trailing-window metrics of many runs, O(1) per date and run: every
+    statistic comes from running sums (cumsum differences) and a
+    block-wise running maximum, never from re-scanning the window.
+
+    input:
+            1. equity: date x run matrix; cash / holdings as in metrics()
+            2. window: rows (bars) per window
+            3. min_periods: returns a window needs (default window - 1, i.e. a full window)
+    output:
+            DataFrame with (metric, run) columns: return, ann_return, ann_vol, sharpe,
+            sortino, drawdown (from the window's high) [, turnover, exposure];
+            rolling_metrics(eq, 63)["sharpe"] is the date x run Sharpe matrix
+    '''
+    window = int(window)
+    if window < 2:
+        raise ValueError("window must be at least 2 rows")
+    index = equity.index if isinstance(equity, pd.DataFrame) else None
+    names = equity.columns if isinstance(equity, pd.DataFrame) else None
+    E, C, H = _matrix(equity), _matrix(cash), _matrix(holdings)
+    T, R = E.shape
+    min_periods = window - 1 if min_periods is None else int(min_periods)
+    ret, traded, F, valid = _daily(E, C)
+
+    has = ~np.isnan(ret)
+    r0 = np.where(has, ret, 0.0)
+    w = window - 1                                    # a window of `window` rows holds window - 1 returns
+    n = _wsum(has.astype("float64"), w)
+    s1, s2 = _wsum(r0, w), _wsum(r0 * r0, w)
+    sd = _wsum(np.minimum(r0, 0) ** 2, w)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mean = s1 / n
+        std = np.sqrt(np.maximum(s2 - s1 * mean, 0) / (n - 1))
+        down = np.sqrt(sd / n)
+        ann_ret, ann_vol, sharpe, sortino = _ann(mean, std, down, n, periods)
+        back = np.vstack([np.full((w, R), np.nan), F[:-w]]) if T > w else np.full((T, R), np.nan)
+        high = _wmax(np.where(np.isnan(F), -np.inf, F), window)
+        out = {"return": F / back - 1, "ann_return": ann_ret, "ann_vol": ann_vol,
+               "sharpe": sharpe, "sortino": sortino,
+               "drawdown": np.where(np.isfinite(high), F / high - 1, np.nan)}
+        rows = _wsum(valid.astype("float64"), window)
+        if C is not None:
+            spent = _wsum(np.nan_to_num(traded), w)
+            avg = _wsum(np.nan_to_num(E), window) / rows
+            out["turnover"] = spent / avg * periods / n
+        if H is not None:
+            out["exposure"] = _wsum(np.where(valid, np.nan_to_num(H / E), 0), window) / rows
+    short = n < min_periods
+    frames = {}
+    for k, v in out.items():
+        v = np.where(short, np.nan, v)
+        frames[k] = pd.DataFrame(v, index=index, columns=names)
+    return pd.concat(frames, axis=1)
@@ -0,0 +1,284 @@
+import argparse
+import json
+import sys
+import time
+from importlib import import_module
+from pathlib import Path
+
+
+'''
+Command-line entry point (for schedulers and shell scripts).
+
+    python backtest.py fetch --start 2005-01-01 --end 2025-01-01 [--tickers AAPL MSFT] [--update]
+    python backtest.py fetch --bar-freq 1min --start 2024-03-01 --end 2024-03-08 --tickers AAPL
+    python backtest.py run MACD --params fast=8 slow=26 --cash 1e6 --out out/macd_8_26
+    python backtest.py run MA --params s_window=20 l_window=50 --bar-freq 5min --start 2024-01-01
+    python backtest.py compare out/macd_8_26 out/ma_20_50 --out compare.parquet
+    python backtest.py compare --root data/runs --strategy MACDStrategy   # every stored run
+
+run prints one JSON line (strategy, params, cached, seconds, metrics) and,
+with --out, writes trades / portfolio (parquet or JSON) and meta.json in
+the run store's layout, so compare reads both. Runs go through the run
+store (results.py, --store, default data/runs): a repeated run loads its
+stored result instead of recomputing.
+
+Only argparse / json are imported up front; pandas, the strategies,
+PriceLoader (yfinance, HTML scraping) and plotting (matplotlib) are
+imported by the subcommand that needs them, so a cached run costs about
+one pandas import plus reading its stored result.
+'''
+
+# CLI name -> (module, class, default constructor kwargs)
+STRATEGIES = {
+    "Benchmark": ("BenchmarkStrategy", "static_stratgy", {}),
+    "MA": ("MovingAverageStrategy", "MA", {"s_window": 20, "l_window": 50}),
+    "RSI": ("RSIStrategy", "RSIStrategy", {}),
+    "MACD": ("MACDStrategy", "MACDStrategy", {}),
+    "VOL": ("VolatilityBreakoutStrategy", "VolatilityBreakoutStrategy", {}),
+}
+
+
+def _value(text):
+    # "8" -> 8, "0.5" -> 0.5, "true" -> True, anything else stays a string
+    try:
+        return json.loads(text)
+    except ValueError:
+        return text
+
+
+def _params(pairs):
+    out = {}
+    for pair in pairs or []:
+        key, sep, val = pair.partition("=")
+        if not sep:
+            raise SystemExit(f"--params expects key=value, got {pair!r}")
+        out[key.strip()] = _value(val.strip())
+    return out
+
+
+def _tickers(args, data_dir=None, bar_freq=None):
+    if args.tickers_file:
+        return [t.strip() for t in Path(args.tickers_file).read_text().split() if t.strip()]
+    if args.tickers:
+        return list(args.tickers)
+    if data_dir is None:
+        return None
+    import bar_store
+    if bar_store.is_daily(bar_freq):
+        from price_store import store_tickers
+        return store_tickers(data_dir)
+    meta = bar_store.read_meta(data_dir, bar_freq)
+    return meta["tickers"] if meta else None
+
+
+def _jsonable(value):
+    # numpy scalars / NaN -> plain JSON values
+    if hasattr(value, "item"):
+        value = value.item()
+    if isinstance(value, float) and value != value:
+        return None
+    return value
+
+
+def make_strategy(name, cash, tickers, params=None, **options):
+    '''
+    strategy object for a CLI name (case-insensitive); options (data_dir,
+    bar_freq, start, end, compact) are passed only when set
+    '''
+    key = {k.lower(): k for k in STRATEGIES}.get(name.lower())
+    if key is None:
+        raise SystemExit(f"unknown strategy {name!r}; one of {', '.join(STRATEGIES)}")
+    module, cls, defaults = STRATEGIES[key]
+    kwargs = dict(defaults, **(params or {}))
+    kwargs.update({k: v for k, v in options.items() if v not in (None, False)})
+    try:
+        return key, getattr(import_module(module), cls)(cash, tickers=tickers, **kwargs)
+    except TypeError as exc:
+        raise SystemExit(f"{key}: {exc}")
+
+
+# ---------- subcommands ----------
+
+def cmd_fetch(args):
+    from PriceLoader import PriceLoader
+    import pandas as pd
+    end = args.end or pd.Timestamp.now().strftime("%Y-%m-%d")
+    plr = PriceLoader(start=args.start, end=end, outdir=args.outdir, sleep=args.sleep,
+                      batch_size=args.batch_size, max_workers=args.workers)
+    tickers = _tickers(args)
+    if args.bar_freq:
+        if tickers is None:
+            raise SystemExit("fetch --bar-freq needs --tickers or --tickers-file")
+        stored = plr.fetch_bars(tickers, args.bar_freq, root=args.bars_root)
+    elif args.update:
+        stored = plr.update(tickers)
+    else:
+        plr.fetch_data(tickers=tickers)
+        stored = plr.covered_tickers
+    print(json.dumps({"stored": len(stored), "tickers": list(stored)}))
+    return 0
+
+
+def _write_run(out, strategy, meta, fmt):
+    out = Path(out)
+    out.mkdir(parents=True, exist_ok=True)
+    trades, port = strategy.trades_df(), strategy.portfolio_df()
+    if fmt == "parquet":
+        trades.to_parquet(out / "trades.parquet", index=False)
+        port.to_parquet(out / "portfolio.parquet")
+    else:
+        trades.to_json(out / "trades.json", orient="records", date_format="iso")
+        port.reset_index().to_json(out / "portfolio.json", orient="records", date_format="iso")
+    with open(out / "meta.json", "w") as fh:
+        json.dump(meta, fh, indent=1, default=str)
+
+
+def cmd_run(args):
+    t0 = time.perf_counter()
+    import analysis
+    import results
+    from bar_store import data_root
+
+    data_dir = data_root(args.bar_freq, args.data_dir)
+    tickers = _tickers(args, data_dir, args.bar_freq)
+    if not tickers:
+        raise SystemExit("no tickers: pass --tickers / --tickers-file or build the store first")
+    name, strat = make_strategy(args.strategy, args.cash, tickers, _params(args.params),
+                                data_dir=data_dir, bar_freq=args.bar_freq, start=args.start,
+                                end=args.end, compact=args.compact)
+    results.configure(args.store, enabled=not args.no_store)
+
+    if args.chunked:
+        if not hasattr(strat, "run_chunked"):
+            raise SystemExit(f"{name} has no chunked mode")
+        strat.run_chunked()
+    else:
+        strat.run()
+
+    row = analysis.summarize({name: strat}, initial=args.cash).iloc[0]
+    meta = {"strategy": type(strat).__name__, "name": name,
+            "params": strat.params() if hasattr(strat, "params") else {},
+            "cash": float(args.cash), "tickers": len(tickers),
+            "cached": bool(getattr(strat, "cached", False)),
+            "seconds": round(time.perf_counter() - t0, 4),
+            "metrics": {k: _jsonable(v) for k, v in row.items()}}
+    if args.out:
+        _write_run(args.out, strat, meta, args.format)
+    print(json.dumps(meta, default=str))
+    return 0
+
+
+def _load_run(path):
+    import pandas as pd
+    path = Path(path)
+    meta = json.loads((path / "meta.json").read_text()) if (path / "meta.json").exists() else {}
+    if (path / "portfolio.parquet").exists():
+        port = pd.read_parquet(path / "portfolio.parquet")
+        trades = pd.read_parquet(path / "trades.parquet", columns=["side"])
+    else:
+        port = pd.read_json(path / "portfolio.json", orient="records").set_index("date")
+        trades = pd.read_json(path / "trades.json", orient="records")
+    port.index = pd.to_datetime(port.index)
+    return meta, port, trades
+
+
+def cmd_compare(args):
+    import pandas as pd
+    import analysis
+    from bar_store import bars_per_year
+
+    paths = [Path(p) for p in args.runs]
+    if not paths:
+        import results
+        runs = results.RunStore(args.root).runs()
+        if args.strategy:
+            runs = runs[runs["strategy"] == args.strategy]
+        paths = [Path(args.root) / k for k in runs["key"]]
+    if not paths:
+        raise SystemExit("nothing to compare")
+
+    metas, ports, fills, skips = {}, {}, [], []
+    for p in paths:
+        meta, port, trades = _load_run(p)
+        metas[p.name], ports[p.name] = meta, port
+        side = trades["side"].astype(str) if "side" in trades else pd.Series(dtype=str)
+        fills.append(int((side == "BUY").sum())); skips.append(int((side == "SKIP").sum()))
+
+    freqs = {m.get("params", {}).get("bar_freq", "1D") for m in metas.values()}
+    if args.periods is None and len(freqs) > 1:
+        raise SystemExit(f"runs mix bar frequencies {sorted(freqs)}; pass --periods")
+    periods = args.periods or bars_per_year(freqs.pop())
+    mats = {c: analysis.stack(ports, c) for c in analysis.PORT_COLS}
+    cash = [metas[k].get("cash") for k in ports]
+    table = analysis.metrics(mats["equity"], mats["cash"], mats["holdings"], fills, skips,
+                             initial=None if None in cash else cash, periods=periods)
+    table.insert(0, "strategy", [metas[k].get("strategy") for k in ports])
+    table.insert(1, "params", [json.dumps(metas[k].get("params", {}), sort_keys=True) for k in ports])
+    table.index.name = "run"
+
+    if args.out:
+        out = Path(args.out)
+        if out.suffix == ".json":
+            table.reset_index().to_json(out, orient="records", indent=1)
+        else:
+            table.to_parquet(out)
+    else:
+        with pd.option_context("display.width", 200, "display.max_columns", 30):
+            print(table.sort_values(args.sort, ascending=False) if args.sort else table)
+    return 0
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Fetch data, run strategies and compare results.")
+    sub = ap.add_subparsers(dest="command", required=True)
+
+    def universe(p):
+        p.add_argument("--tickers", nargs="+", default=None)
+        p.add_argument("--tickers-file", default=None, help="whitespace-separated tickers")
+
+    f = sub.add_parser("fetch", help="download daily prices (or intraday bars) to the local stores")
+    f.add_argument("--start", default="2005-01-01")
+    f.add_argument("--end", default=None, help="exclusive, default today")
+    f.add_argument("--outdir", default="data/adjclose")
+    f.add_argument("--update", action="store_true", help="incremental update of the daily store")
+    f.add_argument("--bar-freq", default=None, help="intraday bars, e.g. 1min / 5min / 1h")
+    f.add_argument("--bars-root", default="data/bars")
+    f.add_argument("--sleep", type=float, default=1.2, help="seconds between requests")
+    f.add_argument("--workers", type=int, default=4)
+    f.add_argument("--batch-size", type=int, default=25)
+    universe(f)
+    f.set_defaults(fn=cmd_fetch)
+
+    r = sub.add_parser("run", help="run one strategy")
+    r.add_argument("strategy", help=" / ".join(STRATEGIES))
+    r.add_argument("--params", nargs="*", default=[], metavar="KEY=VALUE")
+    r.add_argument("--cash", type=float, default=1_000_000)
+    r.add_argument("--data-dir", default=None,
+                   help="daily store (data/adjclose), or the bar store root (data/bars) with --bar-freq")
+    r.add_argument("--bar-freq", default=None)
+    r.add_argument("--start", default=None)
+    r.add_argument("--end", default=None)
+    r.add_argument("--compact", action="store_true")
+    r.add_argument("--chunked", action="store_true", help="out-of-core run (run_chunked)")
+    r.add_argument("--store", default="data/runs", help="run store root")
+    r.add_argument("--no-store", action="store_true")
+    r.add_argument("--out", default=None, help="directory for trades / portfolio / meta.json")
+    r.add_argument("--format", choices=["parquet", "json"], default="parquet")
+    universe(r)
+    r.set_defaults(fn=cmd_run)
+
+    c = sub.add_parser("compare", help="metrics of several runs side by side")
+    c.add_argument("runs", nargs="*", help="run directories (run --out or the run store)")
+    c.add_argument("--root", default="data/runs", help="without run directories: every stored run")
+    c.add_argument("--strategy", default=None, help="class name filter for stored runs")
+    c.add_argument("--periods", type=float, default=None, help="bars per year (default from bar_freq)")
+    c.add_argument("--sort", default="sharpe")
+    c.add_argument("--out", default=None, help=".parquet or .json")
+    c.set_defaults(fn=cmd_compare)
+
+    args = ap.parse_args(argv)
+    return args.fn(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,260 @@
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import instrument
+from price_store import load_panel, resolve_col
+
+
+'''
+Intraday bar store (hive-partitioned parquet) and bar-frequency helpers.
+
+Daily prices stay in data/adjclose (per-ticker parquet + panel store).
+Intraday bars go to one partitioned dataset per bar frequency:
+
+    data/bars/1min/
+        _bars.json                              freq, partitioning, tickers, range
+        month=2024-03/ticker=AAPL/part-0.parquet
+        month=2024-03/ticker=MSFT/part-0.parquet
+        ...
+
+Each file is sorted by timestamp and written in row groups of ROW_GROUP
+rows with min / max statistics. load_bars turns a (tickers, start, end)
+request into a pyarrow.dataset filter: the partition keys prune whole
+directories (other months, other tickers) and the timestamp statistics
+skip row groups inside the files, so a one-month backtest reads one
+month of its tickers, not their full history.
+
+    write_bars({"AAPL": df, ...}, "data/bars", bar_freq="1min")
+    close = load_bars(["AAPL", "MSFT"], "2024-03-01", "2024-04-01", "Close", "data/bars", "1min")
+
+Strategies take bar_freq= ("1D" = the daily store, anything else reads
+this store from data_dir, default data/bars) and start / end;
+load_prices is the shared entry point. Timestamps are stored as exchange-local wall time (any
+timezone is dropped).
+'''
+
+DAILY = "1D"
+DAILY_DIR = "data/adjclose"
+BARS_ROOT = "data/bars"
+META = "_bars.json"
+ROW_GROUP = 2048                 # ~5 sessions of 1-minute bars per row group
+SESSION = pd.Timedelta(hours=6, minutes=30)
+TRADING_DAYS = 252
+
+
+def normalize_freq(bar_freq):
+    '''
+    canonical pandas alias: "1D" for daily bars, else e.g. "1min", "5min", "1h"
+    '''
+    off = pd.tseries.frequencies.to_offset(bar_freq or DAILY)
+    if isinstance(off, (pd.offsets.Day, pd.offsets.BusinessDay)) and off.n == 1:
+        return DAILY
+    if not isinstance(off, pd.offsets.Tick):
+        raise ValueError(f"bar_freq must be daily or intraday, not {bar_freq!r}")
+    return f"{off.n}{off.name}"
+
+
+def is_daily(bar_freq):
+    return normalize_freq(bar_freq) == DAILY
+
+
+def data_root(bar_freq=DAILY, data_dir=None):
+    # data_dir, or the default store for the frequency: data/adjclose or data/bars
+    if data_dir is not None:
+        return data_dir
+    return DAILY_DIR if is_daily(bar_freq) else BARS_ROOT
+
+
+def bars_per_year(bar_freq=DAILY):
+    '''
+    bars per year for annualizing: 252 sessions x bars per 6.5 h session
+    '''
+    freq = normalize_freq(bar_freq)
+    if freq == DAILY:
+        return TRADING_DAYS
+    return TRADING_DAYS * int(np.ceil(SESSION / pd.Timedelta(freq)))
+
+
+def _part_key(partition):
+    if partition not in ("month", "day"):
+        raise ValueError(f"partition must be 'month' or 'day', not {partition!r}")
+    return partition, ("M8[M]" if partition == "month" else "M8[D]")
+
+
+def bar_path(root=BARS_ROOT, bar_freq="1min"):
+    return Path(root) / normalize_freq(bar_freq)
+
+
+def read_meta(root=BARS_ROOT, bar_freq="1min"):
+    # None if nothing was written for this frequency yet
+    path = bar_path(root, bar_freq) / META
+    if not path.exists():
+        return None
+    with open(path) as fh:
+        return json.load(fh)
+
+
+def _arrow():
+    # pyarrow.dataset only for intraday bars: daily runs don't pay for its import
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    return pa, ds
+
+
+def _partitioning(field):
+    pa, ds = _arrow()
+    return ds.partitioning(pa.schema([(field, pa.string()), ("ticker", pa.string())]), flavor="hive")
+
+
+def _dataset(path, field):
+    _, ds = _arrow()
+    return ds.dataset(path, format="parquet", partitioning=_partitioning(field),
+                      exclude_invalid_files=False, ignore_prefixes=[".", "_"])
+
+
+def _long(frames, fmt, field):
+    # {ticker: timestamp-indexed frame} -> one long table sorted by (partition, ticker, timestamp)
+    parts = []
+    for t, df in frames.items():
+        if df is None or df.empty:
+            continue
+        idx = pd.DatetimeIndex(df.index)
+        if idx.tz is not None:
+            idx = idx.tz_localize(None)
+        part = pd.DataFrame({c: df[c].to_numpy(dtype="float64") for c in df.columns})
+        part.insert(0, "timestamp", idx.values.astype("M8[ns]"))
+        part.insert(0, "ticker", t)
+        part.insert(0, field, idx.values.astype(fmt).astype(str))     # "2024-03" / "2024-03-15"
+        parts.append(part)
+    if not parts:
+        return None
+    out = pd.concat(parts, ignore_index=True)
+    return out.sort_values([field, "ticker", "timestamp"], kind="stable", ignore_index=True)
+
+
+def write_bars(frames, root=BARS_ROOT, bar_freq="1min", partition="month"):
+    '''
+    Add bars to the partitioned store (new rows win on overlapping timestamps).
+
+    input:
+            1. frames: {ticker: DataFrame indexed by timestamp, e.g. Close / Volume}
+            2. root / bar_freq: the store is root/<bar_freq>/
+            3. partition: "month" or "day" (the first write fixes it)
+    output:
+            path of the store
+    '''
+    pa, ds = _arrow()
+    path = bar_path(root, bar_freq)
+    meta = read_meta(root, bar_freq) or {"freq": normalize_freq(bar_freq), "partition": partition,
+                                         "tickers": [], "start": None, "end": None}
+    field, fmt = _part_key(meta["partition"])
+    new = _long(frames, fmt, field)
+    if new is None:
+        return path
+
+    with instrument.phase("bar_store.write"):
+        # partitions that get new rows are rewritten whole: merge their old rows first
+        if path.exists():
+            touched = new[[field, "ticker"]].drop_duplicates()
+            flt = (ds.field(field).isin(sorted(set(touched[field])))
+                   & ds.field("ticker").isin(sorted(set(touched["ticker"]))))
+            old = _dataset(path, field).to_table(filter=flt).to_pandas()
+            if len(old):
+                old[field] = old[field].astype(str)
+                old["ticker"] = old["ticker"].astype(str)
+                keys = pd.MultiIndex.from_frame(touched)
+                old = old[pd.MultiIndex.from_frame(old[[field, "ticker"]]).isin(keys)]
+                new = (pd.concat([old[new.columns.intersection(old.columns)], new], ignore_index=True)
+                       .drop_duplicates([field, "ticker", "timestamp"], keep="last")
+                       .sort_values([field, "ticker", "timestamp"], kind="stable", ignore_index=True))
+
+        table = pa.Table.from_pandas(new, preserve_index=False)
+        ds.write_dataset(table, path, format="parquet", partitioning=_partitioning(field),
+                         basename_template="part-{i}.parquet",
+                         existing_data_behavior="delete_matching",
+                         min_rows_per_group=ROW_GROUP, max_rows_per_group=ROW_GROUP,
+                         file_options=ds.ParquetFileFormat().make_write_options(compression="zstd"))
+        instrument.count("rows", len(new))
+
+    ts = new["timestamp"]
+    meta["tickers"] = sorted(set(meta["tickers"]) | set(new["ticker"]))
+    meta["columns"] = sorted(set(meta.get("columns", [])) | (set(new.columns) - {field, "ticker", "timestamp"}))
+    meta["start"] = min(filter(None, [meta["start"], str(ts.min())]))
+    meta["end"] = max(filter(None, [meta["end"], str(ts.max())]))
+    tmp = path / (META + ".tmp")
+    with open(tmp, "w") as fh:
+        json.dump(meta, fh, indent=1)
+    os.replace(tmp, path / META)
+    return path
+
+
+def load_bars(tickers, start=None, end=None, col="Close", root=BARS_ROOT, bar_freq="1min",
+              strict=True):
+    '''
+    Aligned timestamp x ticker frame of `col` for bars in [start, end).
+
+    Only the partitions of the requested tickers and months / days are
+    opened and row groups outside [start, end) are skipped (filter
+    pushdown). Tickers without rows in the range are all-NaN columns;
+    strict=True raises FileNotFoundError for a ticker the store has never
+    seen.
+    '''
+    tickers = list(tickers)
+    path = bar_path(root, bar_freq)
+    meta = read_meta(root, bar_freq)
+    if meta is None:
+        raise FileNotFoundError(path / META)
+    if strict:
+        known = set(meta["tickers"])
+        for t in tickers:
+            if t not in known:
+                raise FileNotFoundError(path / f"ticker={t}")
+    field, fmt = _part_key(meta["partition"])
+    col = resolve_col(col, meta.get("columns", ["Close"]))
+
+    # partition keys prune directories, the timestamp bounds prune row groups
+    pa, ds = _arrow()
+    flt = ds.field("ticker").isin(tickers)
+    if start is not None:
+        start = np.datetime64(pd.Timestamp(start).value, "ns")
+        flt &= ((ds.field(field) >= str(start.astype(fmt)))
+                & (ds.field("timestamp") >= pa.scalar(start, pa.timestamp("ns"))))
+    if end is not None:
+        end = np.datetime64(pd.Timestamp(end).value, "ns")
+        flt &= ((ds.field(field) <= str(end.astype(fmt)))
+                & (ds.field("timestamp") < pa.scalar(end, pa.timestamp("ns"))))
+
+    with instrument.phase("bar_store.load"):
+        table = _dataset(path, field).to_table(columns=["timestamp", "ticker", col], filter=flt)
+        instrument.count("rows", table.num_rows)
+
+    # long -> wide with one scatter (no pivot_table)
+    ts = table.column("timestamp").to_numpy()
+    codes = pd.Categorical(table.column("ticker").to_pandas().astype(str), categories=tickers).codes
+    dates, row = np.unique(ts, return_inverse=True)
+    wide = np.full((len(dates), len(tickers)), np.nan)
+    wide[row, codes] = table.column(col).to_numpy(zero_copy_only=False)
+    return pd.DataFrame(wide, index=pd.DatetimeIndex(dates, name="timestamp"), columns=tickers)
+
+
+def load_prices(tickers, col="Close", data_dir=None, bar_freq=DAILY, start=None,
+                end=None, strict=True):
+    '''
+    The strategies' price panel: daily bars from the panel store
+    (load_panel), other frequencies from the bar store under data_dir
+    (None = data_root(bar_freq)); [start, end) limits the rows (None =
+    everything).
+    '''
+    data_dir = data_root(bar_freq, data_dir)
+    if is_daily(bar_freq):
+        price = load_panel(tickers, col, data_dir, strict=strict)
+        if start is not None or end is not None:
+            lo = 0 if start is None else price.index.searchsorted(pd.Timestamp(start))
+            hi = len(price) if end is None else price.index.searchsorted(pd.Timestamp(end))
+            price = price.iloc[lo:hi]
+        return price
+    return load_bars(tickers, start, end, col, data_dir, bar_freq, strict=strict)
@@ -0,0 +1,494 @@
+import argparse
+import hashlib
+import json
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import indicators
+import price_cache
+import synthetic
+from events import Events
+from execution import fill_orders, value_fills
+from price_store import load_panel
+from tradelog import TradeLog
+
+
+'''
+Benchmark harness: how run() scales, without live Yahoo data.
+
+    python bench.py                                   # 100 x 2500, golden check
+    python bench.py --tickers 10 500 5000 --days 250 5000 --fetch --out bench.json
+    python bench.py --compare old.json --out new.json # speedup per case
+    python bench.py --update-golden                   # after an intended change
+
+For every (tickers, days) size a synthetic GBM universe is written in
+the usual data/adjclose layout (per-ticker parquet + panel store) and
+each strategy is timed by phase: load (cold cache), signal, execution
+(fill loop with trade log) and valuation. --fetch also times
+PriceLoader.fetch_data against a stubbed downloader.
+
+Golden checks run every strategy on a fixed small universe and compare
+the trades (exactly) and portfolio values (to 1e-9 relative) with
+bench_golden.json, so a speedup can't silently change results; the
+compact (float32) mode is checked against the float64 path within the
+bound documented in check_compact(), run_chunked() must match run()
+exactly (check_chunked()) and "1ME" walk-forward windows must be
+calendar months (check_windows()). Against a stub download,
+PriceLoader.update must resume a partial run and not retry rejected
+tickers (check_update()), and fetch_data must keep to the token bucket
+rate and max_workers (check_downloader()). --memory reports the peak traced
+allocation of each run in both modes. The exit code is 1 when a check
+fails.
+'''
+
+GOLDEN = Path(__file__).with_name("bench_golden.json")
+GOLDEN_CASE = dict(n_tickers=40, n_days=750, seed=7, nan_rate=0.01, late_frac=0.1, delist_frac=0.05)
+GOLDEN_CASH = (1_000_000, 5_000)      # plenty of cash / cash-limited
+RTOL = 1e-9
+
+
+def _strategies():
+    from BenchmarkStrategy import static_stratgy
+    from MACDStrategy import MACDStrategy
+    from MovingAverageStrategy import MA
+    from RSIStrategy import RSIStrategy
+    from VolatilityBreakoutStrategy import VolatilityBreakoutStrategy
+    return {
+        "BENCH": lambda cash, t, d, **kw: static_stratgy(cash, t, data_dir=d, **kw),
+        "MA": lambda cash, t, d, **kw: MA(cash, 20, 50, t, data_dir=d, **kw),
+        "RSI": lambda cash, t, d, **kw: RSIStrategy(cash, t, data_dir=d, event_based=False, **kw),
+        "MACD": lambda cash, t, d, **kw: MACDStrategy(cash, t, data_dir=d, **kw),
+        "VOL": lambda cash, t, d, **kw: VolatilityBreakoutStrategy(cash, t, data_dir=d, **kw),
+    }
+
+
+def _clock(fn):
+    t0 = time.perf_counter()
+    out = fn()
+    return time.perf_counter() - t0, out
+
+
+# ---------- phase timings ----------
+
+def time_phases(name, make, tickers, data_dir, cash=1_000_000):
+    strat = make(cash, tickers, data_dir)
+    price_cache.clear()
+    indicators.clear()
+    if name == "BENCH":
+        load, (close, volume) = _clock(lambda: (load_panel(tickers, "Close", data_dir),
+                                                load_panel(tickers, "Volume", data_dir)))
+        run, _ = _clock(lambda: strat.run(close, volume))
+        return {"load_s": load, "signal_s": 0.0, "execution_s": run, "valuation_s": 0.0,
+                "n_fills": int((strat.shares > 0).sum())}
+
+    load, price = _clock(strat._load_price)
+    signal, orders = _clock(lambda: Events.from_signals(strat._make_signals(price)))
+    px = price.to_numpy(dtype="float64")
+    execution, fills = _clock(lambda: fill_orders(orders, px, price.index, list(price.columns),
+                                                  cash, log=TradeLog()))
+    valuation, _ = _clock(lambda: value_fills(fills, px))
+    return {"load_s": load, "signal_s": signal, "execution_s": execution,
+            "valuation_s": valuation, "n_fills": fills.n_fills}
+
+
+def bench_sizes(sizes, names, repeat, gaps, keep_dir=None):
+    rows = []
+    strategies = _strategies()
+    for n_tickers, n_days in sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            data_dir = Path(keep_dir or tmp) / f"{n_tickers}x{n_days}" / "adjclose"
+            tickers = synthetic.write_universe(data_dir, n_tickers, n_days, **gaps)
+            for name in names:
+                runs = [time_phases(name, strategies[name], tickers, data_dir) for _ in range(repeat)]
+                row = {"strategy": name, "tickers": n_tickers, "days": n_days}
+                for k in ("load_s", "signal_s", "execution_s", "valuation_s"):
+                    row[k] = min(r[k] for r in runs)
+                row["total_s"] = sum(row[k] for k in ("load_s", "signal_s", "execution_s", "valuation_s"))
+                row["n_fills"] = runs[0]["n_fills"]
+                rows.append(row)
+                print(f"{name:6s} {n_tickers:5d} x {n_days:5d}  total {row['total_s']:.4f}s", file=sys.stderr)
+    return rows
+
+
+def bench_fetch(sizes, repeat, gaps, latency=0.0, max_workers=4, batch_size=25):
+    from PriceLoader import PriceLoader
+    rows = []
+    for n_tickers, n_days in sizes:
+        close, volume = synthetic.gbm_panel(n_tickers, n_days, **gaps)
+        stub = synthetic.StubDownload(close, volume, latency=latency)
+        end = (close.index[-1] + pd.Timedelta(days=1)).strftime("%Y-%m-%d")
+        times = []
+        for _ in range(repeat):
+            with tempfile.TemporaryDirectory() as tmp:
+                plr = PriceLoader(start=close.index[0].strftime("%Y-%m-%d"), end=end,
+                                  outdir=str(Path(tmp) / "adjclose"), sleep=0, download=stub,
+                                  max_workers=max_workers, batch_size=batch_size, retries=0)
+                dt, _ = _clock(lambda: plr.fetch_data(tickers=list(close.columns)))
+                times.append(dt)
+        rows.append({"tickers": n_tickers, "days": n_days, "latency": latency,
+                     "seconds": min(times), "stored": len(plr.covered_tickers)})
+        print(f"fetch  {n_tickers:5d} x {n_days:5d}  {min(times):.4f}s", file=sys.stderr)
+    return rows
+
+
+def bench_memory(sizes, names, gaps):
+    '''
+    peak traced allocation of one run(), float64 path vs compact=True
+    '''
+    import tracemalloc
+    rows = []
+    strategies = _strategies()
+    names = [n for n in names if n != "BENCH"]        # the benchmark has no compact mode
+    with tempfile.TemporaryDirectory() as tmp:
+        for n_tickers, n_days in sizes:
+            data_dir = Path(tmp) / f"{n_tickers}x{n_days}" / "adjclose"
+            tickers = synthetic.write_universe(data_dir, n_tickers, n_days, **gaps)
+            for name in names:
+                row = {"strategy": name, "tickers": n_tickers, "days": n_days}
+                for mode, kw in (("float64", {}), ("compact", {"compact": True})):
+                    price_cache.clear()
+                    indicators.clear()
+                    tracemalloc.start()
+                    strategies[name](1_000_000, tickers, data_dir, **kw).run()
+                    row[f"{mode}_peak_mb"] = tracemalloc.get_traced_memory()[1] / 2**20
+                    tracemalloc.stop()
+                row["ratio"] = row["float64_peak_mb"] / row["compact_peak_mb"]
+                rows.append(row)
+                print(f"memory {name:6s} {n_tickers:5d} x {n_days:5d}  x{row['ratio']:.1f}", file=sys.stderr)
+    return rows
+
+
+# ---------- golden outputs ----------
+
+def _digest(strat):
+    trades = strat.trades_df()
+    port = strat.portfolio_df()
+    key = pd.DataFrame({"date": trades["date"].astype("int64"),
+                        "ticker": trades["ticker"].astype(str),
+                        "side": trades["side"].astype(str),
+                        "reason": trades["reason"].astype(str)})
+    sha = hashlib.sha256(key.to_csv(index=False).encode()).hexdigest()
+    return {"n_trades": int(len(trades)), "trades_sha256": sha,
+            "notional": float(trades["notional"].sum()),
+            "qty": float(trades["qty"].sum()),
+            "final_equity": float(port["equity"].iloc[-1]),
+            "equity_sum": float(port["equity"].sum()),
+            "cash_sum": float(port["cash"].sum())}
+
+
+def golden_outputs():
+    out = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        case = dict(GOLDEN_CASE)
+        data_dir = Path(tmp) / "adjclose"
+        tickers = synthetic.write_universe(data_dir, case.pop("n_tickers"), case.pop("n_days"), **case)
+        price_cache.clear()
+        indicators.clear()
+        for name, make in _strategies().items():
+            for cash in GOLDEN_CASH:
+                out[f"{name}@{cash}"] = _digest(make(cash, tickers, data_dir).run())
+    return out
+
+
+def check_golden(current, golden):
+    mismatches = []
+    for key, want in golden.items():
+        got = current.get(key)
+        if got is None:
+            mismatches.append({"case": key, "field": None, "want": "present", "got": None})
+            continue
+        for f, w in want.items():
+            g = got.get(f)
+            same = (np.isclose(g, w, rtol=RTOL, atol=0) if isinstance(w, float) else g == w)
+            if not same:
+                mismatches.append({"case": key, "field": f, "want": w, "got": g})
+    return mismatches
+
+
+# indicator pieces on float32-rounded prices (what compact signals see) vs
+# float64, relative to the piece's largest magnitude: price-level pieces move
+# by the rounding (~6e-8), return-based ones by the rounding of price
+# differences, RSI by the ratio of two small averages early on
+COMPACT_RTOL = {"rolling_mean": 1e-6, "ema": 1e-6, "macd_signal": 1e-6,
+                "rolling_std": 1e-5, "rsi": 1e-4}
+
+
+def check_compact():
+    '''
+    compact=True runs vs the float64 path on the golden universe.
+
+    Documented bound: every indicator piece computed from the float32
+    prices within COMPACT_RTOL[piece] of the float64 one (relative to the
+    piece's largest magnitude), the same
+    trades, and on every day
+        |equity32 - equity64| <= 2**-23 * (notional bought so far + holdings64)
+    since prices are rounded to float32 once (<= 2**-24 relative each)
+    and the cash / holdings arithmetic stays float64. Signals sitting
+    within ~1e-6 of a threshold could in principle flip; the golden
+    universe has none.
+    '''
+    from indicators import Indicators
+    mismatches = []
+    with tempfile.TemporaryDirectory() as tmp:
+        case = dict(GOLDEN_CASE)
+        data_dir = Path(tmp) / "adjclose"
+        tickers = synthetic.write_universe(data_dir, case.pop("n_tickers"), case.pop("n_days"), **case)
+        price_cache.clear()
+        indicators.clear()
+        price = load_panel(tickers, "Close", data_dir)
+        full = Indicators(price, cache=False)
+        compact = Indicators(price.astype("float32").astype("float64"), cache=False)
+        args = {"rolling_mean": (20,), "ema": (12,), "macd_signal": (12, 26, 9),
+                "rolling_std": (20,), "rsi": (14,)}
+        for piece, rtol in COMPACT_RTOL.items():
+            a = getattr(full, piece)(*args[piece]).to_numpy()
+            b = getattr(compact, piece)(*args[piece]).to_numpy()
+            err = float(np.nanmax(np.abs(a - b)) / np.nanmax(np.abs(a)))
+            if not err <= rtol or not np.array_equal(np.isnan(a), np.isnan(b)):
+                mismatches.append({"case": f"compact:{piece}", "field": "rel_err", "want": rtol, "got": err})
+
+        for name, make in _strategies().items():
+            if name == "BENCH":
+                continue
+            for cash in GOLDEN_CASH:
+                a = make(cash, tickers, data_dir).run()
+                b = make(cash, tickers, data_dir, compact=True).run()
+                ta, tb = a.trades_df(), b.trades_df()
+                cols = ["date", "ticker", "side", "reason"]
+                if not ta[cols].astype(str).equals(tb[cols].astype(str)):
+                    mismatches.append({"case": f"compact:{name}@{cash}", "field": "trades",
+                                       "want": len(ta), "got": len(tb)})
+                    continue
+                pa, pb = a.portfolio_df(), b.portfolio_df()
+                bought = ta.loc[ta["side"].astype(str) == "BUY"].groupby("date")["notional"].sum()
+                bought = bought.reindex(pa.index, fill_value=0.0).cumsum().to_numpy()
+                bound = 2.0 ** -23 * (bought + pa["holdings"].to_numpy())
+                excess = np.abs(pa["equity"].to_numpy() - pb["equity"].to_numpy()) - bound
+                if (excess > 1e-9).any():
+                    mismatches.append({"case": f"compact:{name}@{cash}", "field": "equity",
+                                       "want": "within bound", "got": float(excess.max())})
+    return mismatches
+
+
+def check_chunked():
+    '''
+    run_chunked() vs run() on the golden universe, with blocks small
+    enough for several ticker and date blocks: trades and portfolio must
+    be identical (float64 and compact).
+    '''
+    mismatches = []
+    with tempfile.TemporaryDirectory() as tmp:
+        case = dict(GOLDEN_CASE)
+        data_dir = Path(tmp) / "adjclose"
+        tickers = synthetic.write_universe(data_dir, case.pop("n_tickers"), case.pop("n_days"), **case)
+        blocks = {"ticker_bytes": 8 * 8 * GOLDEN_CASE["n_days"], "date_bytes": 0}
+        for name, make in _strategies().items():
+            if name == "BENCH":
+                continue
+            for cash in GOLDEN_CASH:
+                for compact in (False, True):
+                    a = make(cash, tickers, data_dir, compact=compact).run()
+                    b = make(cash, tickers, data_dir, compact=compact).run_chunked(**blocks)
+                    case_name = f"chunked:{name}@{cash}" + (":compact" if compact else "")
+                    if not a.trades_df().equals(b.trades_df()):
+                        mismatches.append({"case": case_name, "field": "trades",
+                                           "want": len(a.trades_df()), "got": len(b.trades_df())})
+                    if not a.portfolio_df().equals(b.portfolio_df()):
+                        mismatches.append({"case": case_name, "field": "portfolio",
+                                           "want": "identical", "got": "differs"})
+    return mismatches
+
+
+def check_windows():
+    '''
+    walk-forward "1ME" test windows over the golden calendar, daily and
+    30-minute bars: every window after the first holds exactly the bars
+    of one calendar month
+    '''
+    from walkforward import windows
+    n_days = GOLDEN_CASE["n_days"]
+    daily = pd.bdate_range(synthetic.START, periods=n_days)
+    bars = synthetic.session_index(n_days, "30min")
+    per_day = len(bars) // n_days
+    mismatches = []
+    for idx, trains in ((daily, (pd.DateOffset(years=1), 252)),
+                        (bars, (pd.DateOffset(years=1), 252 * per_day))):
+        months = idx.to_period("M")
+        for train in trains:
+            for _, ts, te in windows(idx, train, "1ME")[1:]:
+                want = np.flatnonzero(months == months[ts])
+                if (ts, te) != (want[0], want[-1] + 1):
+                    mismatches.append({"case": f"windows:1ME:{train}:{len(idx)}", "field": str(months[ts]),
+                                       "want": [str(idx[want[0]]), str(idx[want[-1]])],
+                                       "got": [str(idx[ts]), str(idx[te - 1])]})
+    return mismatches
+
+
+def _stub_loader(close, outdir, download, end=None, **kw):
+    from PriceLoader import PriceLoader
+    end = end or (close.index[-1] + pd.Timedelta(days=1)).strftime("%Y-%m-%d")
+    return PriceLoader(start=close.index[0].strftime("%Y-%m-%d"), end=end, outdir=str(outdir),
+                       sleep=kw.pop("sleep", 0), download=download, retries=0, **kw)
+
+
+def check_update():
+    '''
+    PriceLoader.update against a stub download: after a failed batch the
+    manifest keeps the unfinished run and the next call downloads only
+    that batch; a ticker without data is rejected once and not asked for
+    again; the store equals one clean update() over the whole range
+    '''
+    import warnings
+    from PriceLoader import load_manifest
+    close, volume = synthetic.gbm_panel(30, 300, seed=3)
+    tickers = list(close.columns) + ["NODATA"]        # batches of 10: [0..9] [10..19] [20..29] [NODATA]
+    mid = (close.index[199] + pd.Timedelta(days=1)).strftime("%Y-%m-%d")
+    mismatches = []
+
+    def want(case, field, want, got):
+        if want != got:
+            mismatches.append({"case": f"update:{case}", "field": field, "want": want, "got": got})
+
+    with tempfile.TemporaryDirectory() as tmp:
+        out = Path(tmp) / "adjclose"
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")            # the failed batch is reported as a warning
+            _stub_loader(close, out, synthetic.StubDownload(close, volume, fail=[tickers[12]]),
+                         mid, batch_size=10).update(tickers)
+        run = load_manifest(out)["run"]
+        want("partial", "done", [0, 2, 3], sorted(run["done"]) if run else None)
+
+        stub = synthetic.StubDownload(close, volume)
+        _stub_loader(close, out, stub, mid, batch_size=10).update(tickers)
+        manifest = load_manifest(out)
+        want("resume", "requested", tickers[10:20], sorted(stub.requested()))
+        want("resume", "run", None, manifest["run"])
+        want("resume", "rejected", {"NODATA": {"reason": "no_data"}}, manifest["rejected"])
+
+        stub = synthetic.StubDownload(close, volume)
+        _stub_loader(close, out, stub, batch_size=10).update(tickers)
+        want("extend", "requested", tickers[:30], sorted(stub.requested()))
+
+        ref = Path(tmp) / "ref"
+        _stub_loader(close, ref, synthetic.StubDownload(close, volume), batch_size=10).update(tickers)
+        for col in ("Close", "Volume"):
+            a, b = load_panel(tickers[:30], col, out), load_panel(tickers[:30], col, ref)
+            want("extend", col, "identical", "identical" if a.equals(b) else "differs")
+    return mismatches
+
+
+def check_downloader(latency=0.05, sleep=0.02, max_workers=3):
+    '''
+    fetch_data through a slow stub download: one request per batch;
+    with a rate limit, request k starts no earlier than k * sleep after
+    the first (token bucket of 1 / sleep per second, burst 1); without
+    one, exactly max_workers requests are in flight at the peak
+    '''
+    close, volume = synthetic.gbm_panel(40, 50, seed=3)
+    mismatches = []
+    for rate_sleep in (sleep, 0):
+        stub = synthetic.StubDownload(close, volume, latency=latency)
+        with tempfile.TemporaryDirectory() as tmp:
+            _stub_loader(close, Path(tmp) / "adjclose", stub, sleep=rate_sleep, batch_size=2,
+                         max_workers=max_workers).fetch_data(tickers=list(close.columns))
+        case = f"downloader:sleep={rate_sleep}"
+        times = np.sort([t for t, _ in stub.requests])
+        if len(times) != 20:
+            mismatches.append({"case": case, "field": "requests", "want": 20, "got": len(times)})
+        early = np.arange(len(times)) * rate_sleep - (times - times[0])
+        if len(times) and early.max() > 1e-3:
+            mismatches.append({"case": case, "field": "rate", "want": f"<= {1 / rate_sleep:g}/s",
+                               "got": f"request {int(early.argmax())} {early.max():.4f}s early"})
+        if rate_sleep == 0 and stub.max_in_flight != max_workers:
+            mismatches.append({"case": case, "field": "in_flight", "want": max_workers,
+                               "got": stub.max_in_flight})
+    return mismatches
+
+
+# ---------- reporting ----------
+
+def _commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, cwd=Path(__file__).parent).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def compare(old, new):
+    '''
+    join two result files on (strategy, tickers, days): old / new total time
+    '''
+    cols = ["strategy", "tickers", "days"]
+    a = pd.DataFrame(old["cases"]).set_index(cols)["total_s"]
+    b = pd.DataFrame(new["cases"]).set_index(cols)["total_s"]
+    out = pd.concat({"old_s": a, "new_s": b}, axis=1).dropna()
+    out["speedup"] = out["old_s"] / out["new_s"]
+    return out.reset_index()
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--tickers", type=int, nargs="+", default=[100])
+    ap.add_argument("--days", type=int, nargs="+", default=[2500])
+    ap.add_argument("--strategies", nargs="+", default=["BENCH", "MA", "RSI", "MACD", "VOL"])
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--nan-rate", type=float, default=0.01)
+    ap.add_argument("--late-frac", type=float, default=0.1)
+    ap.add_argument("--delist-frac", type=float, default=0.05)
+    ap.add_argument("--fetch", action="store_true", help="also time PriceLoader.fetch_data")
+    ap.add_argument("--latency", type=float, default=0.0, help="stub download latency (s)")
+    ap.add_argument("--data-dir", default=None, help="keep the generated data here")
+    ap.add_argument("--out", default=None, help="write results JSON here")
+    ap.add_argument("--compare", default=None, help="earlier results JSON to compare with")
+    ap.add_argument("--memory", action="store_true", help="also compare peak memory with compact=True")
+    ap.add_argument("--update-golden", action="store_true")
+    ap.add_argument("--skip-golden", action="store_true")
+    args = ap.parse_args(argv)
+
+    gaps = dict(nan_rate=args.nan_rate, late_frac=args.late_frac, delist_frac=args.delist_frac)
+    sizes = [(n, t) for n in args.tickers for t in args.days]
+    result = {"commit": _commit(), "time": pd.Timestamp.now().isoformat(timespec="seconds"),
+              "python": platform.python_version(), "numpy": np.__version__,
+              "pandas": pd.__version__, "machine": platform.machine(), "gaps": gaps,
+              "cases": bench_sizes(sizes, args.strategies, args.repeat, gaps, args.data_dir)}
+    if args.fetch:
+        result["fetch_data"] = bench_fetch(sizes, args.repeat, gaps, args.latency)
+    if args.memory:
+        result["memory"] = bench_memory(sizes, args.strategies, gaps)
+
+    ok = True
+    if args.update_golden:
+        with open(GOLDEN, "w") as fh:
+            json.dump(golden_outputs(), fh, indent=1, sort_keys=True)
+        print(f"golden outputs written to {GOLDEN}", file=sys.stderr)
+    elif not args.skip_golden:
+        with open(GOLDEN) as fh:
+            mismatches = (check_golden(golden_outputs(), json.load(fh)) + check_compact()
+                          + check_chunked() + check_windows() + check_update()
+                          + check_downloader())
+        ok = not mismatches
+        result["golden"] = {"ok": ok, "mismatches": mismatches}
+        print("golden check: " + ("ok" if ok else f"{len(mismatches)} mismatch(es)"), file=sys.stderr)
+
+    print(pd.DataFrame(result["cases"]).to_string(index=False))
+    if args.memory:
+        print(pd.DataFrame(result["memory"]).round(2).to_string(index=False))
+    if args.compare:
+        with open(args.compare) as fh:
+            print(compare(json.load(fh), result).to_string(index=False))
+    if args.out:
+        with open(args.out, "w") as fh:
+            json.dump(result, fh, indent=1, default=str)
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,87 @@
+import numpy as np
+
+import events
+import instrument
+from execution import fill_orders, value_fills
+from valuation import portfolio_frame
+
+
+'''
+Out-of-core (two-pass) runs for universes larger than memory.
+
+    MACDStrategy(1_000_000, russell3000, data_dir=d).run_chunked()
+    MA(1_000_000, 20, 50, tickers).run_chunked(ticker_bytes=64 << 20, date_bytes=64 << 20)
+
+Signals only look at one ticker's own history and only the cash-limited
+fill step is cross-sectional, so a run splits into two streaming passes
+over the memmapped store (price_store.PanelBlocks):
+
+    1. signal pass: blocks of tickers x all dates are read, their signals
+       turned into sparse (day, ticker) orders (events.blockwise) and the
+       block dropped. Orders are rare, so all of them together take
+       16 bytes per order, not a T x N matrix.
+    2. execution pass: blocks of dates x all tickers are read in date
+       order; the usual fill loop and valuation run on each block,
+       carrying cash and positions into the next one.
+
+Peak memory is one ticker block (plus its indicator frames) in pass 1
+and one date block in pass 2, instead of the full price matrix and
+several same-sized indicator frames. Trades, cash and holdings are
+identical to run() (bench.py checks this). Stored runs (results.py) are
+not consulted: their key would need a full extra read of the inputs.
+'''
+
+TICKER_BYTES = 16 << 20       # float64 prices per ticker block in the signal pass
+DATE_BYTES = 16 << 20         # prices per date block in the execution pass
+VALUATION_BLOCK = 256         # date blocks are a multiple of valuation's block
+
+
+def date_block(n_tickers, date_bytes=DATE_BYTES):
+    # rows per date block: a multiple of VALUATION_BLOCK, at least one
+    rows = date_bytes // (8 * max(n_tickers, 1))
+    return max(VALUATION_BLOCK, rows // VALUATION_BLOCK * VALUATION_BLOCK)
+
+
+def run(strategy, panel, log, ticker_bytes=TICKER_BYTES, date_bytes=DATE_BYTES):
+    '''
+    Two-pass run of a signal strategy over a PanelBlocks.
+
+    input:
+            1. strategy: MA / RSIStrategy / MACDStrategy / VolatilityBreakoutStrategy
+            2. panel: price_store.PanelBlocks of the strategy's prices
+            3. log: the strategy's TradeLog
+            4. ticker_bytes / date_bytes: block sizes of the two passes
+    output:
+            the strategy, with trades / positions / cash / portfolio as after run()
+    '''
+    name = type(strategy).__name__
+    T, N = panel.shape
+    if panel.empty:
+        return strategy
+
+    with instrument.phase(f"{name}.signal"):
+        strategy.events = ev = events.blockwise(strategy, panel, ticker_bytes)
+
+    dates, tickers = panel.index, panel.columns
+    cash = strategy.cash
+    pos = np.asarray([strategy.positions.get(t, 0) for t in tickers], dtype=np.int64)
+    cash_path = np.empty(T, dtype="float64")
+    holdings = np.empty(T, dtype="float64")
+    step = date_block(N, date_bytes)
+    for a in range(0, T, step):
+        b = min(a + step, T)
+        with instrument.phase(f"{name}.load"):
+            px = panel.rows(a, b)
+        with instrument.phase(f"{name}.execution"):
+            fills = fill_orders(ev.window(a, b), px, dates[a:b], tickers, cash,
+                                positions=pos, log=log)
+        with instrument.phase(f"{name}.valuation"):
+            res = value_fills(fills, px)
+        cash, pos = res.cash, res.positions
+        cash_path[a:b], holdings[a:b] = res.cash_path, res.holdings
+        del px, fills, res
+
+    strategy.cash = cash
+    strategy.positions.update(zip(tickers, pos.tolist()))
+    strategy._portfolio.append(portfolio_frame(dates, cash_path, holdings))
+    return strategy
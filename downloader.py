@@ -0,0 +1,151 @@
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+
+import pandas as pd
+
+
+'''
+Concurrent batch downloader.
+
+Batches go through a small thread pool instead of one after another with
+a fixed sleep in between; a token bucket keeps the request rate under the
+API limit while requests overlap. Failed batches are retried with
+exponential backoff + jitter, and every batch gets a BatchReport
+(attempts, wall time, error).
+
+The data source is just a callable fetch(batch) -> result, so tests can
+plug in a local stub that sleeps / raises to simulate latency and
+throttling.
+'''
+
+
+class TokenBucket:
+    """
+    Token bucket: `rate` tokens per second, at most `capacity` saved up.
+    acquire() blocks until a token is available.
+    """
+    def __init__(self, rate, capacity=1, clock=time.monotonic, sleep=time.sleep):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self.tokens = float(capacity)
+        self.clock, self.sleep = clock, sleep
+        self.last = clock()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens=1):
+        while True:
+            with self._lock:
+                now = self.clock()
+                self.tokens = min(self.capacity, self.tokens + (now - self.last) * self.rate)
+                self.last = now
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return
+                wait = (tokens - self.tokens) / self.rate
+            self.sleep(wait)
+
+
+@dataclass
+class BatchReport:
+    index: int
+    tickers: list
+    attempts: int = 0
+    seconds: float = 0.0
+    ok: bool = False
+    error: str = None
+    errors: list = field(default_factory=list)
+
+
+class BatchDownloader:
+    """
+    Run fetch(batch) for many batches with bounded concurrency, a shared
+    rate limit and retries.
+
+    input:
+            1. fetch: callable(batch) -> result (e.g. a DataFrame); a batch is a
+               ticker list, or a tuple (tickers, ...) when fetch needs more
+            2. max_workers: concurrent requests
+            3. rate / burst: token bucket (requests per second); None = no limit
+            4. retries: extra attempts after the first failure
+            5. backoff / max_backoff / jitter: delay before retry k is
+               min(max_backoff, backoff * 2**(k-1)) * (1 + jitter * U[0,1))
+    """
+    def __init__(self, fetch, max_workers=4, rate=None, burst=1, retries=3,
+                 backoff=1.0, max_backoff=30.0, jitter=0.5, retry_on=(Exception,),
+                 sleep=time.sleep, seed=None):
+        self.fetch = fetch
+        self.max_workers = max(1, int(max_workers))
+        self.bucket = TokenBucket(rate, burst, sleep=sleep) if rate else None
+        self.retries = int(retries)
+        self.backoff, self.max_backoff, self.jitter = float(backoff), float(max_backoff), float(jitter)
+        self.retry_on = retry_on
+        self.sleep = sleep
+        self._rng = random.Random(seed)
+        self.reports = []
+
+    def _delay(self, attempt):
+        base = min(self.max_backoff, self.backoff * 2 ** (attempt - 1))
+        return base * (1 + self.jitter * self._rng.random())
+
+    def _one(self, index, batch):
+        tickers = batch[0] if isinstance(batch, tuple) else batch
+        rep = BatchReport(index=index, tickers=list(tickers))
+        t0 = time.perf_counter()
+        result = None
+        for attempt in range(1, self.retries + 2):
+            if self.bucket is not None:
+                self.bucket.acquire()
+            rep.attempts = attempt
+            try:
+                result = self.fetch(batch)
+                rep.ok = True
+                break
+            except self.retry_on as e:
+                rep.errors.append(f"{type(e).__name__}: {e}")
+                if attempt <= self.retries:
+                    self.sleep(self._delay(attempt))
+        rep.seconds = time.perf_counter() - t0
+        if not rep.ok:
+            rep.error = rep.errors[-1] if rep.errors else None
+        return rep, result
+
+    def run(self, batches):
+        '''
+        Yield (index, batch, result, report) as batches complete.
+        Failed batches (retries exhausted) yield result=None, report.ok=False.
+        At most max_workers batches are in flight and a finished future is
+        dropped before its result is yielded, so a consumer that releases
+        each result keeps memory at about max_workers batches.
+        '''
+        batches = list(batches)
+        self.reports = []
+        todo = iter(enumerate(batches))
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            futures = {}
+
+            def refill():
+                for i, b in todo:
+                    futures[pool.submit(self._one, i, b)] = i
+                    if len(futures) >= self.max_workers:
+                        break
+
+            refill()
+            while futures:
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for fut in done:
+                    i = futures.pop(fut)
+                    rep, result = fut.result()
+                    del fut
+                    self.reports.append(rep)
+                    refill()
+                    yield i, batches[i], result, rep
+                    del result
+                del done
+
+    def report_frame(self):
+        rows = [{"index": r.index, "n_tickers": len(r.tickers), "attempts": r.attempts,
+                 "seconds": r.seconds, "ok": r.ok, "error": r.error} for r in self.reports]
+        return pd.DataFrame(rows).sort_values("index") if rows else pd.DataFrame(rows)
@@ -0,0 +1,155 @@
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from indicators import Indicators
+
+
+'''
+Sparse buy events.
+
+Buy signals are rare, so instead of a dense date x ticker order matrix
+the strategies hand the execution engine the (date index, ticker index)
+pairs of their orders, sorted by date and then ticker:
+
+    ev = Events.from_signals(sig_t)      # signal on t -> order on t+1
+    fill_orders(ev, prices, ...)         # visits only these cells
+
+The fill loop then costs O(#orders) instead of a T x N scan.
+
+Only the orders are sparse. The strategies still build a dense bool
+date x ticker signal frame (_make_signals), because the indicators it
+is compared from are dense rolling frames of the same shape anyway,
+and from_signals finds its cells with one nonzero() pass over it. That
+frame is 1/8 the size of one float indicator frame; compact mode and
+run_chunked() (blockwise below) bound it to one block of tickers.
+
+Every strategy keeps the events of its last run() in `.events`:
+
+    s.events.to_frame()                  # date / ticker rows, for a look
+    s.events.save("rsi_events.npz");  Events.load("rsi_events.npz")
+'''
+
+
+@dataclass
+class Events:
+    days: np.ndarray            # row index of every order, ascending
+    tickers: np.ndarray         # column index, ascending within a day
+    shape: tuple                # (T, N) of the matrix the indices refer to
+    dates: pd.DatetimeIndex = None
+    names: list = None
+
+    @classmethod
+    def from_dense(cls, orders, dates=None, names=None):
+        '''
+        non-zero cells of a (T, N) order matrix (row-major = date order)
+        '''
+        orders = np.asarray(orders)
+        days, tickers = np.nonzero(orders)
+        return cls(days, tickers, orders.shape, dates, names)
+
+    @classmethod
+    def from_signals(cls, sig_t):
+        '''
+        orders from a bool signal frame: a signal on day t is an order on t+1
+        '''
+        days, tickers = np.nonzero(sig_t.to_numpy(dtype=bool))
+        keep = days + 1 < sig_t.shape[0]
+        return cls(days[keep] + 1, tickers[keep], sig_t.shape, sig_t.index, list(sig_t.columns))
+
+    def __len__(self):
+        return len(self.days)
+
+    def by_day(self):
+        '''
+        (days with orders, start of each day's run in days / tickers, end)
+        '''
+        order_days, start = np.unique(self.days, return_index=True)
+        end = np.append(start[1:], len(self.days))
+        return order_days, start, end
+
+    def window(self, a, b):
+        # the events of rows [a, b), re-indexed to start at 0
+        lo, hi = np.searchsorted(self.days, [a, b])
+        dates = self.dates[a:b] if self.dates is not None else None
+        return Events(self.days[lo:hi] - a, self.tickers[lo:hi], (b - a, self.shape[1]),
+                      dates, self.names)
+
+    def to_dense(self):
+        out = np.zeros(self.shape, dtype=bool)
+        out[self.days, self.tickers] = True
+        return out
+
+    def pack(self):
+        '''
+        (T, ceil(N/8)) uint8 bitmap of the orders (np.packbits along tickers):
+        1 bit per cell whatever the number of orders (sweep.py keeps one per
+        parameter set)
+        '''
+        return np.packbits(self.to_dense(), axis=1)
+
+    @classmethod
+    def unpack(cls, packed, n, dates=None, names=None):
+        # inverse of pack(); n = number of tickers
+        return cls.from_dense(np.unpackbits(packed, axis=1, count=n), dates, names)
+
+    # ---------- debugging ----------
+
+    def to_frame(self):
+        '''
+        one row per order: day / ticker index, plus date / ticker labels when known
+        '''
+        df = pd.DataFrame({"day": self.days, "ticker_idx": self.tickers})
+        if self.dates is not None:
+            df.insert(0, "date", np.asarray(self.dates)[self.days])
+        if self.names is not None:
+            df.insert(1, "ticker", np.asarray(self.names, dtype=object)[self.tickers])
+        return df
+
+    def counts(self):
+        # orders per date (only dates that have any)
+        days, start, end = self.by_day()
+        index = self.dates[days] if self.dates is not None else days
+        return pd.Series(end - start, index=index, name="orders")
+
+    def save(self, path):
+        extra = {}
+        if self.dates is not None:
+            extra["dates"] = np.asarray(self.dates, dtype="M8[ns]")
+        if self.names is not None:
+            extra["names"] = np.asarray(self.names, dtype=str)
+        np.savez_compressed(path, days=self.days, tickers=self.tickers,
+                            shape=np.asarray(self.shape), **extra)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as z:
+            dates = pd.DatetimeIndex(z["dates"]) if "dates" in z else None
+            names = z["names"].tolist() if "names" in z else None
+            return cls(z["days"], z["tickers"], tuple(z["shape"].tolist()), dates, names)
+
+
+def blockwise(strategy, price, block_bytes=2 << 20):
+    '''
+    Events of strategy._make_signals(price) built on blocks of tickers
+    (compact and chunked modes): each block runs in float64 and its
+    indicators and signal frames are dropped before the next one.
+    `price` is a DataFrame or a price_store.PanelBlocks.
+    '''
+    T, N = price.shape
+    block = max(8, block_bytes // (8 * max(T, 1)))
+    days, tickers = [], []
+    for j in range(0, N, block):
+        if isinstance(price, pd.DataFrame):
+            sub = price.iloc[:, j:j + block].astype("float64")
+        else:
+            sub = price.column_block(j, j + block)
+        ev = Events.from_signals(strategy._make_signals(sub, Indicators(sub, cache=False)))
+        days.append(ev.days)
+        tickers.append(ev.tickers + j)
+        del sub, ev
+    days = np.concatenate(days) if days else np.empty(0, dtype=np.intp)
+    tickers = np.concatenate(tickers) if tickers else np.empty(0, dtype=np.intp)
+    order = np.lexsort((tickers, days))
+    return Events(days[order], tickers[order], (T, N), price.index, list(price.columns))
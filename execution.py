@@ -0,0 +1,223 @@
+import numpy as np
+from dataclasses import dataclass
+
+import instrument
+from events import Events
+from tradelog import BUY, SKIP, REASONS
+from valuation import position_matrix, holdings_from_fills, cash_path as _cash_path
+
+
+'''
+Shared execution engine for the signal strategies (MA / RSI / MACD / VOL).
+
+All four strategies trade the same way:
+    - orders[t, i] == 1 means "buy 1 share of ticker i on day t"
+    - orders with a missing / non-positive price are logged as SKIP (no_price)
+    - if cash covers every candidate -> buy all of them (ticker order)
+    - else cheapest-first (price, then ticker) until cash runs out,
+      the rest are logged as SKIP (insufficient_cash)
+
+The engine works on plain numpy arrays and takes the orders as sparse
+(day, ticker) events, so it only visits the order cells themselves; valuation (position matrix, holdings, cash per day)
+runs once afterwards on the recorded fills, see valuation.py.
+BUY/SKIP rows go to a columnar TradeLog, each day's rows in ticker order
+so the log comes out already sorted by (date, ticker).
+'''
+
+
+@dataclass
+class ExecutionResult:
+    cash: float                 # cash left after the last day
+    positions: np.ndarray       # shares held per ticker (int64, len N)
+    cash_path: np.ndarray       # cash at the end of every day (len T)
+    holdings: np.ndarray        # holdings value at the end of every day (len T)
+    n_fills: int = 0
+    n_skips: int = 0
+    fill_days: np.ndarray = None    # row index of every fill
+    fill_tickers: np.ndarray = None # column index of every fill
+    start: np.ndarray = None        # shares held before the first day
+
+    @property
+    def equity(self):
+        return self.cash_path + self.holdings
+
+    def position_matrix(self):
+        # (T, N) shares held at the end of each day
+        return position_matrix(self.fill_days, self.fill_tickers,
+                               len(self.cash_path), len(self.positions), start=self.start)
+
+
+def _ticker_rank(tickers):
+    # rank of each ticker name, used as the tie-break when prices are equal
+    names = np.asarray([str(t) for t in tickers])
+    rank = np.empty(len(names), dtype=np.int64)
+    rank[np.argsort(names, kind="stable")] = np.arange(len(names))
+    return rank
+
+
+def _price_array(prices):
+    # float32 (compact mode) and float64 prices are used as they are
+    prices = np.asarray(prices)
+    return prices if prices.dtype in (np.float32, np.float64) else prices.astype("float64")
+
+
+_NO_PRICE = REASONS.index("no_price")
+_NO_CASH = REASONS.index("insufficient_cash")
+
+
+@dataclass
+class Fills:
+    cash: float                 # cash left after the last day
+    cash0: float                # starting cash
+    start: np.ndarray           # shares held before the first day
+    order_days: np.ndarray      # days that carried orders
+    day_cash: np.ndarray        # cash at the end of each order day
+    fill_days: np.ndarray       # row index of every fill
+    fill_tickers: np.ndarray    # column index of every fill
+    n_fills: int = 0
+    n_skips: int = 0
+
+
+def execute_orders(orders, prices, dates, tickers, cash, positions=None, log=None,
+                   record=True):
+    '''
+    Fill orders (fill_orders) and value the result (value_fills).
+    Arguments as for fill_orders.
+    output:
+            ExecutionResult with final cash, positions and daily cash/holdings
+    '''
+    return value_fills(fill_orders(orders, prices, dates, tickers, cash, positions, log, record),
+                       prices)
+
+
+def fill_orders(orders, prices, dates, tickers, cash, positions=None, log=None,
+                record=True):
+    '''
+    Run the cash-limited, cheapest-first fill loop.
+
+    input:
+            1. orders: Events (see events.py), or a (T, N) array where
+               non-zero = buy 1 share that day
+            2. prices: (T, N) float64 / float32 array (NaN = no price)
+            3. dates / tickers: labels for the rows / columns
+            4. cash: starting cash
+            5. positions: optional starting shares per ticker
+            6. log: optional TradeLog, BUY/SKIP rows are appended to it
+            7. record: False skips building BUY/SKIP rows (sweeps only need totals)
+    output:
+            Fills: which (day, ticker) filled and the cash on every order day
+    '''
+    prices = _price_array(prices)
+    T, N = prices.shape
+    events = orders if isinstance(orders, Events) else Events.from_dense(np.asarray(orders) != 0)
+    tickers = list(tickers)
+    cash = float(cash)
+    start = (np.zeros(N, dtype=np.int64) if positions is None
+             else np.asarray(positions, dtype=np.int64).copy())
+    cash0 = cash
+    record = record and log is not None
+    if record:
+        codes = log.intern(tickers)
+        dates64 = np.asarray(dates, dtype="M8[ns]")
+        rows = []       # per order day: (idx, side, price, cash_before, cash_after, reason)
+
+    rank = _ticker_rank(tickers)
+    n_fills = n_skips = 0
+
+    order_days, first, last = events.by_day()
+    day_cash = np.empty(len(order_days), dtype="float64")   # cash at the end of each order day
+    fills = []                                    # filled columns per order day
+    n_day = np.zeros(len(order_days), dtype=np.intp)
+
+    for k, d in enumerate(order_days):
+        idx = events.tickers[first[k]:last[k]]
+        px = prices[d, idx]
+        ok = px > 0                                      # False for NaN too
+
+        # orders without a usable price
+        if record and not ok.all():
+            n_np = int((~ok).sum())
+            rows.append((idx[~ok], SKIP, np.full(n_np, np.nan), cash, cash, _NO_PRICE))
+        n_skips += int((~ok).sum())
+
+        c_idx, c_px = idx[ok], px[ok]
+        if len(c_idx):
+            if sum(c_px.tolist()) <= cash:
+                filled, skipped = c_idx, c_idx[:0]
+                fill_px, skip_px = c_px, c_px[:0]
+            else:
+                order = np.lexsort((rank[c_idx], c_px))   # price, then ticker
+                c_idx, c_px = c_idx[order], c_px[order]
+                # sorted ascending: once one doesn't fit, none of the rest do
+                n_ok, cash_left = 0, cash
+                for p in c_px.tolist():
+                    if p > cash_left:
+                        break
+                    cash_left -= p
+                    n_ok += 1
+                filled, skipped = c_idx[:n_ok], c_idx[n_ok:]
+                fill_px, skip_px = c_px[:n_ok], c_px[n_ok:]
+
+            steps = [cash]
+            for p in fill_px.tolist():
+                cash -= p
+                steps.append(cash)
+            fills.append(filled)
+            n_day[k] = len(filled)
+            n_fills += len(filled)
+            if record:
+                if len(filled):
+                    rows.append((filled, BUY, fill_px, steps[:-1], steps[1:], -1))
+                if len(skipped):
+                    rows.append((skipped, SKIP, skip_px, cash, cash, _NO_CASH))
+            n_skips += len(skipped)
+
+        if record:
+            _log_day(log, rows, dates64[d], codes, rank)
+        day_cash[k] = cash
+
+    fill_tickers = np.concatenate(fills) if fills else np.empty(0, dtype=np.intp)
+    if instrument.ENABLED:
+        instrument.count("days", T)
+        instrument.count("order_days", len(order_days))
+        instrument.count("candidates", len(events))
+        instrument.count("fills", n_fills)
+        instrument.count("skips", n_skips)
+    return Fills(cash=cash, cash0=cash0, start=start, order_days=order_days,
+                 day_cash=day_cash, fill_days=np.repeat(order_days, n_day),
+                 fill_tickers=fill_tickers, n_fills=n_fills, n_skips=n_skips)
+
+
+def value_fills(fills, prices):
+    '''
+    valuation: one pass over the fills (see valuation.py)
+    output: ExecutionResult
+    '''
+    prices = _price_array(prices)
+    T, N = prices.shape
+    holdings, pos = holdings_from_fills(fills.fill_days, fills.fill_tickers, prices, start=fills.start)
+    return ExecutionResult(cash=fills.cash, positions=pos,
+                           cash_path=_cash_path(fills.order_days, fills.day_cash, T, fills.cash0),
+                           holdings=holdings,
+                           n_fills=fills.n_fills, n_skips=fills.n_skips,
+                           fill_days=fills.fill_days, fill_tickers=fills.fill_tickers,
+                           start=fills.start)
+
+
+def _log_day(log, rows, date, codes, rank):
+    # one day's BUY/SKIP groups -> one columnar append, in ticker order
+    if not rows:
+        return
+    idx = np.concatenate([r[0] for r in rows])
+    n = [len(r[0]) for r in rows]
+    side = np.repeat([r[1] for r in rows], n)
+    price = np.concatenate([r[2] for r in rows])
+    cb = np.concatenate([np.broadcast_to(r[3], k) for r, k in zip(rows, n)])
+    ca = np.concatenate([np.broadcast_to(r[4], k) for r, k in zip(rows, n)])
+    reason = np.repeat([r[5] for r in rows], n)
+    buy = side == BUY
+    order = np.argsort(rank[idx], kind="stable")
+    log.extend(date, codes[idx[order]], side[order], buy[order].astype(float),
+               price[order], np.where(buy, price, 0.0)[order],
+               cb[order], ca[order], reason[order])
+    rows.clear()
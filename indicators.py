@@ -0,0 +1,276 @@
+import hashlib
+import os
+import threading
+import weakref
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from price_cache import PriceCache
+
+
+'''
+Memoized indicator building blocks.
+
+An Indicators object wraps one aligned price frame (date x ticker) and
+computes each piece at most once: the rolling mean for a window, the EMA
+for a span, the Wilder averages for an RSI period, ... Strategies build
+their signals from these pieces, so when many parameter sets run over the
+same prices (see sweep.py) shared pieces are only computed once, e.g.
+MA(20, 50) and MA(20, 100) share the 20-day mean, and RSI runs that only
+differ in threshold share the whole RSI frame.
+
+Across Indicators objects (every run() builds a new one) and across
+sessions, pieces also go through a content-addressed cache keyed by a
+hash of the price matrix (values, dates, tickers) plus the piece's name
+and parameters: a memory LRU tier and, once configured, an on-disk tier
+of .npy files with size-based eviction.
+
+    indicators.configure(disk_dir="data/indicator_cache", max_disk_bytes=2 << 30)
+
+So re-running with only a new threshold / cash / execution parameter
+skips indicator computation entirely.
+'''
+
+
+def content_hash(price):
+    '''
+    blake2b of the price matrix values, dates and tickers
+    '''
+    h = hashlib.blake2b(digest_size=16)
+    values = np.ascontiguousarray(price.to_numpy())
+    h.update(f"{values.shape}{values.dtype.str}".encode())
+    h.update(memoryview(values).cast("B"))      # no copy of the matrix
+    h.update(np.asarray(price.index.values).astype("M8[ns]").view("i8").tobytes())
+    h.update("\x1f".join(map(str, price.columns)).encode())
+    return h.hexdigest()
+
+
+_HASHES = {}          # id(frame) -> digest, dropped when the frame is collected
+
+
+def _frame_hash(price):
+    key = id(price)
+    digest = _HASHES.get(key)
+    if digest is None:
+        digest = _HASHES[key] = content_hash(price)
+        weakref.finalize(price, _HASHES.pop, key, None)
+    return digest
+
+
+class IndicatorCache:
+    """
+    Two-tier cache of indicator frames: memory LRU, then .npy files on disk.
+
+    Keys are (price hash, name, params); only the values are stored, the
+    frame is rebuilt on the caller's price index / columns (same hash =
+    same labels). The disk tier is off until disk_dir is set; when it
+    grows past max_disk_bytes the least recently used files go first.
+    """
+    def __init__(self, max_memory_bytes=1 << 30, disk_dir=None, max_disk_bytes=2 << 30):
+        self.memory = PriceCache(max_memory_bytes)
+        self.disk_dir = Path(disk_dir) if disk_dir is not None else None
+        self.max_disk_bytes = int(max_disk_bytes)
+        self.disk_hits = self.disk_writes = self.disk_evictions = 0
+        self._disk_bytes = None
+        self._lock = threading.Lock()
+
+    # ---------- disk tier ----------
+
+    def _path(self, digest, name, params):
+        tag = "-".join([name] + [str(p) for p in params])
+        return self.disk_dir / digest / f"{tag}.npy"
+
+    def _disk_load(self, digest, name, params, price):
+        if self.disk_dir is None:
+            return None
+        path = self._path(digest, name, params)
+        try:
+            arr = np.load(path, mmap_mode="r")
+            os.utime(path)                    # recently used
+        except (OSError, ValueError):
+            return None
+        self.disk_hits += 1
+        # tuples (e.g. the Wilder gain / loss pair) are stacked into one 3-D array
+        frames = tuple(pd.DataFrame(a, index=price.index, columns=price.columns, copy=False)
+                       for a in (arr if arr.ndim == 3 else [arr]))
+        return frames if arr.ndim == 3 else frames[0]
+
+    def _disk_save(self, digest, name, params, value):
+        if self.disk_dir is None:
+            return
+        if isinstance(value, tuple):
+            arr = np.stack([f.to_numpy() for f in value])
+        else:
+            arr = value.to_numpy()
+        path = self._path(digest, name, params)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp, "wb") as fh:
+            np.save(fh, arr)
+        os.replace(tmp, path)                 # readers never see a partial file
+        self.disk_writes += 1
+        with self._lock:
+            if self._disk_bytes is None:
+                self._disk_bytes = self._scan_bytes()
+            else:
+                self._disk_bytes += path.stat().st_size
+            if self._disk_bytes > self.max_disk_bytes:
+                self._evict_disk()
+
+    def _files(self):
+        return [p for p in self.disk_dir.glob("*/*.npy")] if self.disk_dir.exists() else []
+
+    def _scan_bytes(self):
+        return sum(p.stat().st_size for p in self._files())
+
+    def _evict_disk(self):
+        files = []
+        for p in self._files():
+            st = p.stat()
+            files.append((st.st_mtime, st.st_size, p))
+        files.sort()
+        total = sum(f[1] for f in files)
+        for _, size, p in files:
+            if total <= self.max_disk_bytes:
+                break
+            p.unlink(missing_ok=True)
+            total -= size
+            self.disk_evictions += 1
+        self._disk_bytes = total
+
+    # ---------- lookup ----------
+
+    def get(self, price, name, params, compute):
+        '''
+        cached value of indicator (name, params) on `price`, computing it
+        (and filling both tiers) on a miss
+        '''
+        digest = _frame_hash(price)
+        key = (digest, name, params)
+
+        def load():
+            value = self._disk_load(digest, name, params, price)
+            if value is None:
+                value = compute()
+                self._disk_save(digest, name, params, value)
+            return value
+        return self.memory.get(key, None, load)
+
+    def clear(self, disk=False):
+        self.memory.clear()
+        if disk and self.disk_dir is not None:
+            for p in self._files():
+                p.unlink(missing_ok=True)
+            self._disk_bytes = 0
+
+    def stats(self):
+        out = self.memory.stats()
+        out.update(disk_dir=str(self.disk_dir) if self.disk_dir else None,
+                   disk_hits=self.disk_hits, disk_writes=self.disk_writes,
+                   disk_evictions=self.disk_evictions,
+                   disk_bytes=self._disk_bytes, max_disk_bytes=self.max_disk_bytes)
+        return out
+
+
+# the process-wide cache used by every Indicators object (None = off)
+CACHE = IndicatorCache()
+
+
+def configure(max_memory_bytes=None, disk_dir=None, max_disk_bytes=None, enabled=True):
+    '''
+    resize the shared cache / turn on its disk tier / switch it off
+    '''
+    global CACHE
+    if not enabled:
+        CACHE = None
+        return None
+    if CACHE is None:
+        CACHE = IndicatorCache()
+    if max_memory_bytes is not None:
+        CACHE.memory.resize(max_memory_bytes)
+    if disk_dir is not None:
+        CACHE.disk_dir = Path(disk_dir)
+        CACHE._disk_bytes = None
+    if max_disk_bytes is not None:
+        CACHE.max_disk_bytes = int(max_disk_bytes)
+    return CACHE
+
+
+def clear(disk=False):
+    if CACHE is not None:
+        CACHE.clear(disk)
+
+
+class Indicators:
+    def __init__(self, price, cache=True):
+        self.price = price
+        self._memo = {}
+        self._cache = cache
+
+    def _get(self, key, compute):
+        if key not in self._memo:
+            cache = CACHE if self._cache else None
+            if cache is None:
+                self._memo[key] = compute()
+            else:
+                self._memo[key] = cache.get(self.price, key[0], key[1:], compute)
+        return self._memo[key]
+
+    # ---------- moving averages ----------
+
+    def rolling_mean(self, window):
+        w = int(window)
+        return self._get(("rolling_mean", w),
+                         lambda: self.price.rolling(w, min_periods=w).mean())
+
+    def ema(self, span):
+        span = int(span)
+        return self._get(("ema", span),
+                         lambda: self.price.ewm(span=span, adjust=False).mean())
+
+    # ---------- MACD ----------
+
+    def macd(self, fast, slow):
+        return self._get(("macd", int(fast), int(slow)),
+                         lambda: self.ema(fast) - self.ema(slow))
+
+    def macd_signal(self, fast, slow, signal_span):
+        span = int(signal_span)
+        return self._get(("macd_signal", int(fast), int(slow), span),
+                         lambda: self.macd(fast, slow).ewm(span=span, adjust=False).mean())
+
+    # ---------- RSI (Wilder smoothing) ----------
+
+    def delta(self):
+        return self._get(("delta",), lambda: self.price.diff())
+
+    def wilder_averages(self, period):
+        p = int(period)
+
+        def compute():
+            delta = self.delta()
+            gain = delta.clip(lower=0)
+            loss = -delta.clip(upper=0)
+            alpha = 1 / p
+            return (gain.ewm(alpha=alpha, adjust=False).mean(),
+                    loss.ewm(alpha=alpha, adjust=False).mean())
+        return self._get(("wilder", p), compute)
+
+    def rsi(self, period):
+        def compute():
+            avg_gain, avg_loss = self.wilder_averages(period)
+            rs = avg_gain / avg_loss
+            return 100 - (100 / (1 + rs))
+        return self._get(("rsi", int(period)), compute)
+
+    # ---------- volatility ----------
+
+    def returns(self):
+        return self._get(("returns",), lambda: self.price.pct_change())
+
+    def rolling_std(self, window):
+        w = int(window)
+        return self._get(("rolling_std", w),
+                         lambda: self.returns().rolling(w, min_periods=w).std())
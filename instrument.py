@@ -0,0 +1,262 @@
+import json
+import logging
+import resource
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import nullcontext
+from pathlib import Path
+
+import pandas as pd
+
+
+'''
+Opt-in instrumentation for strategies and PriceLoader.
+
+Code reports phases and counts:
+
+    with instrument.phase("MA.signal"):
+        ...
+    instrument.count("fills", n)          # added to the innermost open phase
+
+Nothing is recorded until enabled, and the disabled path is one global
+check (phase() hands back a shared no-op context manager), so the calls
+can stay in production code.
+
+    instrument.enable(sinks=[instrument.LogSink(), instrument.JSONSink("timings.json")])
+    MA(...).run()
+    instrument.flush()                    # emit to the sinks, start over
+    instrument.summary()                  # DataFrame for the notebook
+
+or as a block: `with instrument.session(memory=True) as table: ...`
+(table.frame holds the summary afterwards).
+
+Per phase name: calls, wall and CPU seconds, counters, and the process'
+peak RSS at the end of the phase; with memory=True also net allocated
+bytes and the allocation peak inside the phase (tracemalloc, which slows
+allocation-heavy code down, so it is off by default). Allocation stats
+assume phases that track memory are not run from several threads at once.
+'''
+
+ENABLED = False
+_NULL = nullcontext()
+_lock = threading.Lock()
+_local = threading.local()
+_records = {}                 # phase name -> aggregated stats
+_sinks = []
+_memory = False
+
+
+def _peak_rss_mb():
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1 << 20) if sys.platform == "darwin" else rss / 1024
+
+
+def _stack():
+    st = getattr(_local, "stack", None)
+    if st is None:
+        st = _local.stack = []
+    return st
+
+
+class _Phase:
+    __slots__ = ("name", "wall", "cpu", "mem0", "peak", "counts")
+
+    def __init__(self, name):
+        self.name = name
+        self.counts = {}
+        self.peak = 0
+
+    def __enter__(self):
+        _stack().append(self)
+        if _memory:
+            self.mem0 = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+        self.cpu = time.process_time()
+        self.wall = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        wall = time.perf_counter() - self.wall
+        cpu = time.process_time() - self.cpu
+        stack = _stack()
+        stack.pop()
+        alloc = peak = None
+        if _memory:
+            cur, pk = tracemalloc.get_traced_memory()
+            alloc = cur - self.mem0
+            peak = max(pk, self.peak) - self.mem0
+            if stack:                      # the outer phase saw this peak too
+                stack[-1].peak = max(stack[-1].peak, max(pk, self.peak))
+        _add(self.name, wall, cpu, self.counts, alloc, peak)
+        return False
+
+
+def _add(name, wall, cpu, counts, alloc, peak):
+    with _lock:
+        rec = _records.get(name)
+        if rec is None:
+            rec = _records[name] = {"phase": name, "calls": 0, "wall_s": 0.0, "cpu_s": 0.0,
+                                    "alloc_bytes": None, "peak_alloc_bytes": None,
+                                    "peak_rss_mb": 0.0, "counts": {}}
+        rec["calls"] += 1
+        rec["wall_s"] += wall
+        rec["cpu_s"] += cpu
+        rec["peak_rss_mb"] = max(rec["peak_rss_mb"], _peak_rss_mb())
+        if alloc is not None:
+            rec["alloc_bytes"] = (rec["alloc_bytes"] or 0) + alloc
+            rec["peak_alloc_bytes"] = max(rec["peak_alloc_bytes"] or 0, peak)
+        for k, v in counts.items():
+            rec["counts"][k] = rec["counts"].get(k, 0) + v
+
+
+# ---------- reporting API (cheap when disabled) ----------
+
+def phase(name):
+    '''
+    context manager timing one phase; a shared no-op when disabled
+    '''
+    if not ENABLED:
+        return _NULL
+    return _Phase(name)
+
+
+def count(name, n=1):
+    '''
+    add n to counter `name` of the innermost open phase (in this thread)
+    '''
+    if not ENABLED:
+        return
+    stack = _stack()
+    if stack:
+        c = stack[-1].counts
+        c[name] = c.get(name, 0) + int(n)
+    else:
+        _add("(none)", 0.0, 0.0, {name: int(n)}, None, None)
+
+
+# ---------- control ----------
+
+def enable(sinks=None, memory=False):
+    '''
+    start recording; sinks receive the records on flush()
+    memory=True also traces allocations (tracemalloc)
+    '''
+    global ENABLED, _memory, _sinks
+    _sinks = list(sinks) if sinks is not None else []
+    _memory = bool(memory)
+    if _memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    ENABLED = True
+
+
+def disable():
+    global ENABLED, _memory
+    ENABLED = False
+    if _memory and tracemalloc.is_tracing():
+        tracemalloc.stop()
+    _memory = False
+
+
+def records():
+    with _lock:
+        return [dict(r, counts=dict(r["counts"])) for r in _records.values()]
+
+
+def reset():
+    with _lock:
+        _records.clear()
+
+
+def summary(recs=None):
+    '''
+    one row per phase; counters become columns
+    '''
+    recs = records() if recs is None else recs
+    if not recs:
+        return pd.DataFrame()
+    rows = [dict({k: v for k, v in r.items() if k != "counts"}, **r["counts"]) for r in recs]
+    return pd.DataFrame(rows).set_index("phase")
+
+
+def flush():
+    '''
+    send the collected records to every sink and start over
+    '''
+    recs = records()
+    for sink in _sinks:
+        sink.emit(recs)
+    reset()
+    return recs
+
+
+class session:
+    """
+    with instrument.session(memory=False, sinks=[...]) as table:
+        ...
+    enables recording for the block, flushes at the end; table.frame is
+    the summary DataFrame
+    """
+    def __init__(self, sinks=None, memory=False):
+        self.table = TableSink()
+        self.sinks = list(sinks or []) + [self.table]
+        self.memory = memory
+
+    def __enter__(self):
+        reset()
+        enable(self.sinks, self.memory)
+        return self.table
+
+    def __exit__(self, *exc):
+        flush()
+        disable()
+        return False
+
+
+# ---------- sinks ----------
+
+class LogSink:
+    """
+    one log line per phase
+    """
+    def __init__(self, logger=None, level=logging.INFO):
+        self.logger = logger or logging.getLogger("backtest")
+        self.level = level
+
+    def emit(self, recs):
+        for r in recs:
+            counts = " ".join(f"{k}={v}" for k, v in r["counts"].items())
+            mem = (f" alloc={r['alloc_bytes'] / 2**20:.1f}MiB peak={r['peak_alloc_bytes'] / 2**20:.1f}MiB"
+                   if r["alloc_bytes"] is not None else "")
+            self.logger.log(self.level, f"{r['phase']}: {r['calls']}x wall={r['wall_s']:.4f}s "
+                                        f"cpu={r['cpu_s']:.4f}s rss={r['peak_rss_mb']:.0f}MiB{mem} {counts}".rstrip())
+
+
+class JSONSink:
+    """
+    records written to a JSON file (a list; append=True extends an existing one)
+    """
+    def __init__(self, path, append=True):
+        self.path = Path(path)
+        self.append = append
+
+    def emit(self, recs):
+        old = []
+        if self.append and self.path.exists():
+            with open(self.path) as fh:
+                old = json.load(fh)
+        stamp = pd.Timestamp.now().isoformat(timespec="seconds")
+        with open(self.path, "w") as fh:
+            json.dump(old + [dict(r, time=stamp) for r in recs], fh, indent=1)
+
+
+class TableSink:
+    """
+    keeps the last flush as a DataFrame (.frame) for notebooks
+    """
+    def __init__(self):
+        self.frame = pd.DataFrame()
+
+    def emit(self, recs):
+        self.frame = summary(recs)
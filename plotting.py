@@ -1,29 +1,359 @@
-import pandas as pd, numpy as np, matplotlib.pyplot as plt
-import analysis
+import html
+import time
+import weakref
 from pathlib import Path
 
+import numpy as np
+import pandas as pd
+
+import analysis
+from price_store import load_panel, load_series, store_tickers
+
+
+'''
+Charts for the strategy results.
+
+    plotting.TRADES = {name: analysis.get_trades(s) for name, s in strategies.items()}
+    plotting.PORTS  = {name: analysis.get_port(s)   for name, s in strategies.items()}
+    plot_signal_overlay("NVDA");  plot_hce("MA")
+    plot_overlay_grid(tickers[:40], path="overlays.png")
+    write_report("report.html", tickers=tickers)       # HTML, no matplotlib needed
+
+- BUY dates per ticker come from a TradeIndex (ticker -> slice of the
+  date-sorted BUY rows), built once per trade frame instead of a
+  query() scan of every trade log for every chart.
+- Prices come from one full-universe load_panel (a view on the memmapped
+  store, kept in price_cache), not one parquet read per chart.
+- Long series are downsampled with LTTB (largest triangle three buckets)
+  before drawing, which keeps peaks / troughs; BUY markers are still
+  drawn at their exact date and price.
+- matplotlib is only imported by the plot_* functions; write_report()
+  draws small inline SVGs itself, so the report stays a few KB per chart.
+'''
+
+DATA_DIR  = Path("data/adjclose")
+PRICE_COL = "Adj Close"
+TRADES = {}                 # strategy name -> trades frame (analysis.get_trades)
+PORTS = {}                  # strategy name -> portfolio frame (analysis.get_port)
+MARKERS = {"Benchmark": "x", "MA": "^", "VOL": "o", "MACD": "s", "RSI": "v"}
+
+
+def _plt():
+    import matplotlib.pyplot as plt
+    return plt
+
+
+# ---------- downsampling ----------
+
+def lttb(x, y, n_out):
+    '''
+    Largest-Triangle-Three-Buckets: indices of n_out points of (x, y) that
+    keep the visual shape (first and last point always kept).
+    input:
+            1. x, y: float arrays of equal length, x ascending, no NaN
+            2. n_out: number of points wanted
+    output:
+            int array of indices into x / y
+    '''
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype="float64")
+    y = np.asarray(y, dtype="float64")
+    # n - 2 inner points in n_out - 2 buckets
+    edges = (np.arange(n_out - 1) * (n - 2) / (n_out - 2)).astype(np.intp) + 1
+    edges[-1] = n - 1
+    counts = np.diff(edges)
+    avg_x = np.add.reduceat(x[:-1], edges[:-1]) / counts
+    avg_y = np.add.reduceat(y[:-1], edges[:-1]) / counts
+    avg_x = np.append(avg_x, x[-1])       # the "next bucket" of the last bucket is the end point
+    avg_y = np.append(avg_y, y[-1])
+
+    out = np.empty(n_out, dtype=np.intp)
+    out[0], out[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        cx, cy = avg_x[i + 1], avg_y[i + 1]
+        ax, ay = x[a], y[a]
+        area = np.abs((ax - cx) * (y[lo:hi] - ay) - (ax - x[lo:hi]) * (cy - ay))
+        a = lo + int(area.argmax())
+        out[i + 1] = a
+    return out
+
+
+def downsample(series, n_out=1000):
+    '''
+    LTTB-downsampled copy of a date-indexed Series (NaNs dropped)
+    '''
+    s = series.dropna()
+    if len(s) <= n_out:
+        return s
+    x = s.index.values.astype("M8[ns]").view("i8").astype("float64")
+    return s.iloc[lttb(x, s.to_numpy(dtype="float64"), n_out)]
+
+
+# ---------- trade index / prices ----------
+
+class TradeIndex:
+    """
+    ticker -> BUY dates, built once from a trades frame: the BUY rows are
+    sorted by (ticker, date) and each ticker owns one slice of them.
+    """
+    def __init__(self, trades, side="BUY"):
+        if trades is None or trades.empty:
+            self.dates = np.empty(0, dtype="M8[ns]")
+            self._slices = {}
+            return
+        buys = trades.loc[trades["side"].astype(str) == side, ["date", "ticker"]]
+        ticker = pd.Categorical(buys["ticker"].astype(str))
+        dates = pd.to_datetime(buys["date"]).to_numpy(dtype="M8[ns]")
+        order = np.lexsort((dates, ticker.codes))
+        self.dates = dates[order]
+        counts = np.bincount(ticker.codes, minlength=len(ticker.categories))
+        ends = np.cumsum(counts)
+        self._slices = {t: (e - c, e) for t, c, e in zip(ticker.categories, counts, ends) if c}
+
+    def __len__(self):
+        return len(self.dates)
+
+    def __contains__(self, ticker):
+        return ticker in self._slices
+
+    @property
+    def tickers(self):
+        return list(self._slices)
+
+    def count(self, ticker):
+        lo, hi = self._slices.get(ticker, (0, 0))
+        return hi - lo
+
+    def dates_for(self, ticker):
+        lo, hi = self._slices.get(ticker, (0, 0))
+        return pd.DatetimeIndex(self.dates[lo:hi])
+
+
+_INDEXES = {}      # id(trades frame) -> (weakref, TradeIndex)
+
+
+def trade_index(trades):
+    '''
+    TradeIndex of a trades frame, built on first use and kept while the frame lives
+    '''
+    hit = _INDEXES.get(id(trades))
+    if hit is not None and hit[0]() is trades:
+        return hit[1]
+    idx = TradeIndex(trades)
+    key = id(trades)
+    _INDEXES[key] = (weakref.ref(trades), idx)
+    weakref.finalize(trades, _INDEXES.pop, key, None)
+    return idx
+
+
+def trade_indexes(trades_by_name=None):
+    trades_by_name = TRADES if trades_by_name is None else trades_by_name
+    return {name: trade_index(tr) for name, tr in trades_by_name.items() if tr is not None}
+
+
+def price_panel(col=PRICE_COL):
+    '''
+    the whole store's price matrix (memmap view, shared through price_cache)
+    '''
+    tickers = store_tickers(DATA_DIR)
+    return load_panel(tickers, col, DATA_DIR) if tickers else pd.DataFrame()
+
+
 def load_price_series(ticker, col=PRICE_COL):
-    df = pd.read_parquet(DATA_DIR/f"{ticker}.parquet").sort_index()
-    if col not in df.columns:
-        col = "Adj Close" if "Adj Close" in df.columns else "Close"
-    return df[col]
+    panel = price_panel(col)
+    if ticker in panel.columns:
+        return panel[ticker]
+    return load_series(ticker, col, DATA_DIR)
+
+
+def _buy_points(ticker, px, indexes):
+    # (name, dates, prices) of every strategy's BUYs of `ticker`
+    out = []
+    for name, idx in indexes.items():
+        dates = idx.dates_for(ticker)
+        if len(dates):
+            out.append((name, dates, px.reindex(dates).to_numpy()))
+    return out
 
-def plot_signal_overlay(ticker):
+
+# ---------- matplotlib charts ----------
+
+def plot_signal_overlay(ticker, ax=None, n_points=1000, legend=True, show=None):
+    '''
+    price (LTTB-downsampled) with every strategy's BUY markers
+    '''
+    plt = _plt()
     px = load_price_series(ticker)
-    plt.figure(figsize=(11,4))
-    plt.plot(px.index, px.values, label=f"{ticker} price")
-    markers = {"Benchmark":"x", "MA":"^", "VOL":"o", "MACD":"s", "RSI":"v"}
-    for name, tr in TRADES.items():
-        if tr.empty: continue
-        buys = tr.query("side=='BUY' and ticker==@ticker")["date"]
-        if not buys.empty:
-            plt.scatter(buys, px.reindex(buys), marker=markers.get(name,"o"), s=36, label=f"{name} BUY", zorder=3)
-    plt.title(f"{ticker} — price with BUY markers"); plt.legend(ncol=3); plt.tight_layout(); plt.show()
-def plot_hce(name):
-    df = PORTS[name][["holdings","cash","equity"]].dropna(how="all")
-    fig, ax = plt.subplots(3,1, figsize=(11,8), sharex=True)
-    ax[0].plot(df.index, df["holdings"]); ax[0].set_ylabel("Holdings ($)")
-    ax[1].plot(df.index, df["cash"]);     ax[1].set_ylabel("Cash ($)")
-    ax[2].plot(df.index, df["equity"]);   ax[2].set_ylabel("Equity ($)")
+    own = ax is None
+    if own:
+        _, ax = plt.subplots(figsize=(11, 4))
+    line = downsample(px, n_points)
+    ax.plot(line.index, line.values, lw=1, label=f"{ticker} price")
+    for name, dates, prices in _buy_points(ticker, px, trade_indexes()):
+        ax.scatter(dates, prices, marker=MARKERS.get(name, "o"), s=36 if own else 12,
+                   label=f"{name} BUY", zorder=3)
+    ax.set_title(f"{ticker} — price with BUY markers" if own else ticker, fontsize=None if own else 8)
+    if legend:
+        ax.legend(ncol=3, fontsize=None if own else 6)
+    if own and (show is None or show):
+        plt.tight_layout(); plt.show()
+    return ax
+
+
+def plot_overlay_grid(tickers, ncols=4, n_points=300, path=None, dpi=80):
+    '''
+    one small overlay per ticker on a grid; saved to `path` (and closed)
+    when given, shown otherwise
+    '''
+    plt = _plt()
+    tickers = list(tickers)
+    nrows = max(1, -(-len(tickers) // ncols))
+    fig, axes = plt.subplots(nrows, ncols, figsize=(3.2 * ncols, 2.2 * nrows), squeeze=False)
+    for ax, t in zip(axes.flat, tickers):
+        plot_signal_overlay(t, ax=ax, n_points=n_points, legend=False)
+        ax.tick_params(labelsize=6)
+    for ax in list(axes.flat)[len(tickers):]:
+        ax.set_visible(False)
+    fig.tight_layout()
+    if path is not None:
+        fig.savefig(path, dpi=dpi)
+        plt.close(fig)
+    else:
+        plt.show()
+    return fig
+
+
+def plot_hce(name, n_points=1500):
+    plt = _plt()
+    df = PORTS[name][["holdings", "cash", "equity"]].dropna(how="all")
+    fig, ax = plt.subplots(3, 1, figsize=(11, 8), sharex=True)
+    for a, col, label in zip(ax, ["holdings", "cash", "equity"], ["Holdings ($)", "Cash ($)", "Equity ($)"]):
+        s = downsample(df[col], n_points)
+        a.plot(s.index, s.values); a.set_ylabel(label)
     ax[2].set_title(f"{name} — Holdings / Cash / Equity")
     plt.tight_layout(); plt.show()
+
+
+# ---------- HTML report (inline SVG, no matplotlib) ----------
+
+_COLORS = ["#1f77b4", "#ff7f0e", "#2ca02c", "#d62728", "#9467bd", "#8c564b", "#e377c2"]
+
+
+def _svg(lines, points=(), width=320, height=140, title=""):
+    '''
+    lines: [(label, Series)], points: [(label, dates, values)] -> <svg> string
+    '''
+    xs = [s.index.values.astype("M8[ns]").view("i8") for _, s in lines if len(s)]
+    ys = [s.to_numpy(dtype="float64") for _, s in lines if len(s)]
+    ys += [np.asarray(v, dtype="float64") for _, _, v in points]
+    if not xs:
+        return f'<svg width="{width}" height="{height}"></svg>'
+    x0, x1 = min(x.min() for x in xs), max(x.max() for x in xs)
+    finite = np.concatenate([y[np.isfinite(y)] for y in ys])
+    y0, y1 = finite.min(), finite.max()
+    pad, top = 4, 14
+    sx = (width - 2 * pad) / max(x1 - x0, 1)
+    sy = (height - top - pad) / (y1 - y0 if y1 > y0 else 1)
+
+    def fx(x):
+        return pad + (np.asarray(x, dtype="float64") - x0) * sx
+
+    def fy(y):
+        return height - pad - (np.asarray(y, dtype="float64") - y0) * sy
+
+    parts = [f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" '
+             f'font-family="sans-serif" font-size="10">',
+             f'<text x="{pad}" y="10">{html.escape(title)}</text>']
+    for k, (label, s) in enumerate(lines):
+        if not len(s):
+            continue
+        px, py = fx(s.index.values.astype("M8[ns]").view("i8")), fy(s.to_numpy(dtype="float64"))
+        coords = " ".join(f"{a:.1f},{b:.1f}" for a, b in zip(px, py))
+        parts.append(f'<polyline fill="none" stroke="{_COLORS[k % len(_COLORS)]}" stroke-width="1" '
+                     f'points="{coords}"><title>{html.escape(label)}</title></polyline>')
+    for k, (label, dates, vals) in enumerate(points):
+        ok = np.isfinite(np.asarray(vals, dtype="float64"))
+        px = fx(np.asarray(dates, dtype="M8[ns]").view("i8")[ok])
+        py = fy(np.asarray(vals, dtype="float64")[ok])
+        color = _COLORS[(k + 1) % len(_COLORS)]
+        dots = "".join(f'<circle cx="{a:.1f}" cy="{b:.1f}" r="2"/>' for a, b in zip(px, py))
+        parts.append(f'<g fill="{color}"><title>{html.escape(label)}</title>{dots}</g>')
+    parts.append("</svg>")
+    return "".join(parts)
+
+
+def write_report(path="report.html", tickers=None, max_tickers=48, n_points=300,
+                 trades=None, ports=None, bar_freq="1D"):
+    '''
+    Self-contained HTML report: summary table, PnL and holdings / cash /
+    equity per strategy, and an overlay grid.
+
+    input:
+            1. tickers: overlay these (default: the max_tickers most-bought)
+            2. n_points: LTTB points per line
+            3. trades / ports: {name: frame}, default the module's TRADES / PORTS
+            4. bar_freq: bar frequency of the runs (annualizes the summary table)
+    output:
+            path written
+    '''
+    t0 = time.perf_counter()
+    trades = TRADES if trades is None else trades
+    ports = PORTS if ports is None else ports
+    indexes = trade_indexes(trades)
+    if tickers is None:
+        counts = pd.Series({t: sum(idx.count(t) for idx in indexes.values())
+                            for idx in indexes.values() for t in idx.tickers}, dtype="int64")
+        tickers = list(counts.sort_values(ascending=False, kind="stable").index[:max_tickers])
+
+    # summary table: the same metrics as analysis.summarize, one pass for all runs
+    live = {n: p for n, p in ports.items() if p is not None and not p.empty and "equity" in p}
+    summary = pd.DataFrame()
+    if live:
+        full = all({"cash", "holdings"} <= set(p.columns) for p in live.values())
+        sides = {n: trades[n]["side"] if trades.get(n) is not None and "side" in trades[n]
+                 else pd.Series(dtype=object) for n in live}
+        summary = analysis.metrics(analysis.stack(live, "equity"),
+                                   analysis.stack(live, "cash") if full else None,
+                                   analysis.stack(live, "holdings") if full else None,
+                                   fills=[int((sides[n] == "BUY").sum()) for n in live],
+                                   skips=[int((sides[n] == "SKIP").sum()) for n in live],
+                                   periods=analysis.bars_per_year(bar_freq))
+        summary = summary[["final_equity", "total_return", "ann_return", "ann_vol", "sharpe",
+                           "max_drawdown", "n_fills"]].rename_axis("strategy").reset_index()
+        summary["n_fills"] = summary["n_fills"].astype("int64")
+
+    body = ["<h1>Strategy report</h1>",
+            summary.to_html(index=False, float_format=lambda v: f"{v:,.4f}", border=0),
+            "<h2>Equity</h2>",
+            _svg([(n, downsample(p["equity"], n_points * 2)) for n, p in ports.items()
+                  if p is not None and not p.empty], width=900, height=260,
+                 title=" / ".join(ports))]
+    body.append("<h2>Holdings / cash / equity</h2><div class=grid>")
+    for name, port in ports.items():
+        if port is None or port.empty:
+            continue
+        lines = [(c, downsample(port[c], n_points)) for c in ("holdings", "cash", "equity") if c in port]
+        body.append(_svg(lines, title=f"{name}: holdings / cash / equity"))
+    body.append("</div>")
+
+    body.append(f"<h2>Price with BUY markers ({len(tickers)} tickers)</h2><div class=grid>")
+    panel = price_panel()
+    for t in tickers:
+        px = panel[t] if t in panel.columns else load_price_series(t)
+        points = [(f"{name} BUY", d, v) for name, d, v in _buy_points(t, px, indexes)]
+        body.append(_svg([(t, downsample(px, n_points))], points, title=t))
+    body.append("</div>")
+    body.append(f"<p><small>generated {pd.Timestamp.now():%Y-%m-%d %H:%M} in "
+                f"{time.perf_counter() - t0:.1f}s</small></p>")
+
+    page = ("<!DOCTYPE html><html><head><meta charset='utf-8'><title>Strategy report</title>"
+            "<style>body{font-family:sans-serif;margin:20px}"
+            ".grid{display:flex;flex-wrap:wrap;gap:6px}"
+            "table{border-collapse:collapse}td,th{padding:2px 8px;text-align:right}</style>"
+            "</head><body>" + "\n".join(body) + "</body></html>")
+    Path(path).write_text(page, encoding="utf-8")
+    return path
@@ -0,0 +1,113 @@
+import threading
+from collections import OrderedDict
+
+
+'''
+Process-wide cache for aligned price panels.
+
+Every strategy in a comparison reads the same universe, so the aligned
+date x ticker frame is kept once per process, keyed by
+(data directory, ticker tuple, column). Entries carry a signature of the
+source files (mtimes); a changed signature invalidates the entry. Total
+size is bounded and the least recently used panels are evicted first.
+
+Frames handed out are shared between callers: treat them as read-only.
+'''
+
+DEFAULT_MAX_BYTES = 2 << 30   # 2 GiB
+
+
+def _nbytes(obj):
+    if isinstance(obj, tuple):
+        return sum(_nbytes(o) for o in obj)
+    try:
+        return int(obj.memory_usage(index=True, deep=False).sum())
+    except AttributeError:
+        return int(getattr(obj, "nbytes", 0))
+
+
+class PriceCache:
+    """
+    Memory-bounded LRU of loaded panels with mtime-based invalidation.
+    """
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_bytes = int(max_bytes)
+        self._entries = OrderedDict()       # key -> (signature, value, nbytes)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = self.invalidations = 0
+
+    def get(self, key, signature, load):
+        '''
+        Return the cached value for key if its signature still matches,
+        otherwise call load(), store and return the result.
+        '''
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] == signature:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[1]
+                self._drop(key)
+                self.invalidations += 1
+            self.misses += 1
+
+        value = load()
+        self.put(key, signature, value)
+        return value
+
+    def put(self, key, signature, value):
+        '''
+        Store a value loaded elsewhere (e.g. a panel mapped from shared memory).
+        '''
+        with self._lock:
+            size = _nbytes(value)
+            if key in self._entries:
+                self._drop(key)
+            if size <= self.max_bytes:
+                self._entries[key] = (signature, value, size)
+                self._bytes += size
+                self._evict()
+
+    def _drop(self, key):
+        _, _, size = self._entries.pop(key)
+        self._bytes -= size
+
+    def _evict(self):
+        while self._bytes > self.max_bytes and self._entries:
+            key = next(iter(self._entries))
+            self._drop(key)
+            self.evictions += 1
+
+    def resize(self, max_bytes):
+        with self._lock:
+            self.max_bytes = int(max_bytes)
+            self._evict()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {"hits": self.hits, "misses": self.misses,
+                    "hit_rate": (self.hits / total) if total else 0.0,
+                    "evictions": self.evictions,
+                    "invalidations": self.invalidations,
+                    "entries": len(self._entries),
+                    "bytes": self._bytes, "max_bytes": self.max_bytes}
+
+
+# the process-wide instance used by price_store.load_panel
+CACHE = PriceCache()
+
+
+def stats():
+    return CACHE.stats()
+
+
+def clear():
+    CACHE.clear()
@@ -0,0 +1,504 @@
+import json
+import os
+import shutil
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import price_cache
+import instrument
+
+
+'''
+Consolidated price store.
+
+Instead of opening ~500 {ticker}.parquet files and outer-joining them on
+every run, fetch_data also writes one aligned date x ticker matrix per
+column next to the parquet files:
+
+    data/adjclose/panel/
+        meta.json       columns, shape, index name, source mtimes
+        tickers.json    column labels (ticker order of the matrices)
+        dates.npy       datetime64 row labels
+        Close.npy       float64 (T, N), C order
+        Volume.npy      float64 (T, N), C order
+
+The .npy files are opened with numpy.memmap (np.load(mmap_mode="r")), so
+loading the universe is a few header reads and every process reading the
+store shares the same OS pages.
+'''
+
+STORE_DIRNAME = "panel"
+COLUMNS = ("Close", "Volume")
+
+
+def store_path(data_dir="data/adjclose"):
+    return Path(data_dir) / STORE_DIRNAME
+
+
+def resolve_col(col, columns):
+    # same fallback the strategies always used: col -> "Adj Close" -> "Close"
+    if col in columns:
+        return col
+    return "Adj Close" if "Adj Close" in columns else "Close"
+
+
+def _source_mtimes(data_dir, tickers):
+    out = {}
+    for t in tickers:
+        try:
+            out[t] = os.stat(Path(data_dir) / f"{t}.parquet").st_mtime_ns
+        except FileNotFoundError:
+            pass
+    return out
+
+
+class ParquetFrames:
+    """
+    Read-on-access {ticker: frame} mapping over the per-ticker parquet files,
+    so the store can be written without holding the universe in memory.
+    """
+    def __init__(self, data_dir, tickers):
+        self.data_dir = Path(data_dir)
+        self.tickers = list(tickers)
+
+    def keys(self):
+        return list(self.tickers)
+
+    def __getitem__(self, ticker):
+        return pd.read_parquet(self.data_dir / f"{ticker}.parquet").sort_index()
+
+    def index(self, ticker):
+        # dates only (no value columns are read)
+        return pd.read_parquet(self.data_dir / f"{ticker}.parquet", columns=[]).index
+
+
+def write_store(frames, data_dir="data/adjclose", columns=COLUMNS, index=None):
+    '''
+    Align per-ticker frames once and write them as memory-mappable matrices.
+
+    input:
+            1. frames: {ticker: DataFrame indexed by date with `columns`}
+               (or a ParquetFrames, read one ticker at a time)
+            2. data_dir: directory holding the per-ticker parquet files
+            3. index: union of all frames' dates, if already known
+    output:
+            path of the store directory
+    '''
+    tickers = list(frames.keys())
+    if index is None:
+        index = pd.DatetimeIndex([])
+        for t in tickers:
+            idx = frames.index(t) if isinstance(frames, ParquetFrames) else frames[t].index
+            index = index.union(idx)
+    index = pd.DatetimeIndex(index).sort_values()
+
+    tmp, _ = _new_store_dir(data_dir)
+
+    # one pass over the tickers, every column written straight into its memmap
+    T, N = len(index), len(tickers)
+    mats = {}
+    for c in columns:
+        mats[c] = np.lib.format.open_memmap(tmp / f"{c}.npy", mode="w+",
+                                            dtype="float64", shape=(T, N))
+        mats[c][:] = np.nan
+    seen, index_name = set(), None
+    for j, t in enumerate(tickers):
+        df = frames[t]
+        index_name = index_name or df.index.name
+        rows = index.get_indexer(df.index)
+        for c in columns:
+            if c in df.columns:
+                mats[c][rows, j] = df[c].to_numpy(dtype="float64")
+                seen.add(c)
+        del df
+    cols = [c for c in columns if c in seen]
+    for c in columns:
+        mats[c].flush()
+        del mats[c]
+        if c not in seen:
+            os.remove(tmp / f"{c}.npy")
+    return _finish_store(tmp, data_dir, index, tickers, cols, index_name)
+
+
+def _new_store_dir(data_dir):
+    # (tmp, final): the store is written to tmp and swapped in by _finish_store
+    final = store_path(data_dir)
+    tmp = final.with_name(STORE_DIRNAME + ".tmp")
+    shutil.rmtree(tmp, ignore_errors=True)
+    tmp.mkdir(parents=True)
+    return tmp, final
+
+
+def _finish_store(tmp, data_dir, index, tickers, cols, index_name):
+    np.save(tmp / "dates.npy", index.values)
+    with open(tmp / "tickers.json", "w") as fh:
+        json.dump(tickers, fh)
+    meta = {"columns": cols, "shape": [len(index), len(tickers)], "index_name": index_name,
+            "sources": _source_mtimes(data_dir, tickers)}
+    with open(tmp / "meta.json", "w") as fh:
+        json.dump(meta, fh)
+
+    final = store_path(data_dir)
+    shutil.rmtree(final, ignore_errors=True)
+    os.replace(tmp, final)
+    return final
+
+
+def build_store(data_dir="data/adjclose", tickers=None, columns=COLUMNS, index=None):
+    '''
+    (Re)build the store from the per-ticker parquet files in data_dir,
+    reading one file at a time.
+    '''
+    data_dir = Path(data_dir)
+    if tickers is None:
+        tickers = sorted(p.stem for p in data_dir.glob("*.parquet"))
+    return write_store(ParquetFrames(data_dir, tickers), data_dir, columns, index=index)
+
+
+def update_store(data_dir="data/adjclose", tickers=None, rows=None, columns=COLUMNS):
+    '''
+    Bring the store up to date after rows were appended to some parquet
+    files, without reading the files again.
+
+    The existing matrices are copied block by block into the grown
+    (dates x tickers) shape, then only the appended rows are written;
+    tickers the store doesn't have yet are read from their parquet file
+    and added as new columns. Falls back to build_store when there is no
+    store, its columns differ, or a file changed that `rows` doesn't
+    account for.
+
+    input:
+            1. data_dir: directory holding the per-ticker parquet files
+            2. tickers: tickers the store should hold (default: store + new)
+            3. rows: {ticker: DataFrame of the rows appended to its file}
+    output:
+            path of the store directory
+    '''
+    data_dir = Path(data_dir)
+    rows = dict(rows or {})
+    store, _ = _open_store(data_dir)
+    tickers = list(store.tickers if store is not None else []) if tickers is None else list(tickers)
+    if store is None or not set(store.columns) <= set(columns):
+        return build_store(data_dir, tickers, columns)
+    old = store.meta.get("sources", {})
+    now = _source_mtimes(data_dir, store.tickers)
+    if (any(now.get(t) != old.get(t) for t in store.tickers if t not in rows)
+            or not set(store.tickers) <= set(tickers)):
+        return build_store(data_dir, tickers, columns)     # changed outside `rows`
+
+    added = [t for t in tickers if t not in store.ticker_index]
+    new = ParquetFrames(data_dir, added)
+    index = store.dates
+    for t in added:
+        index = index.union(new.index(t))
+    for df in rows.values():
+        index = index.union(df.index)
+    index = pd.DatetimeIndex(index, name=store.dates.name).sort_values()
+    order = list(store.tickers) + added
+    T, N, n_old = len(index), len(order), len(store.tickers)
+    old_rows = index.get_indexer(store.dates)
+
+    tmp, _ = _new_store_dir(data_dir)
+    cols = list(store.columns)
+    mats = {}
+    for c in cols:
+        mats[c] = np.lib.format.open_memmap(tmp / f"{c}.npy", mode="w+", dtype="float64", shape=(T, N))
+        mats[c][:] = np.nan
+        src = store.matrix(c)
+        for a in range(0, len(old_rows), 4096):       # old values, one row block at a time
+            mats[c][old_rows[a:a + 4096], :n_old] = src[a:a + 4096]
+    for j, t in enumerate(order):
+        if j >= n_old:
+            df = new[t]                               # new ticker: its whole file
+        elif t in rows:
+            df = rows[t]                              # stored ticker: the appended rows
+        else:
+            continue
+        at = index.get_indexer(df.index)
+        for c in cols:
+            if c in df.columns:
+                mats[c][at, j] = df[c].to_numpy(dtype="float64")
+    for c in cols:
+        mats[c].flush()
+        del mats[c]
+    return _finish_store(tmp, data_dir, index, order, cols, store.meta.get("index_name"))
+
+
+class PriceStore:
+    """
+    Read side of the consolidated store (zero-copy, memory-mapped).
+    """
+    def __init__(self, path):
+        self.path = Path(path)
+        with open(self.path / "meta.json") as fh:
+            self.meta = json.load(fh)
+        with open(self.path / "tickers.json") as fh:
+            self.tickers = json.load(fh)
+        self.columns = list(self.meta["columns"])
+        self.dates = pd.DatetimeIndex(np.load(self.path / "dates.npy"),
+                                      name=self.meta.get("index_name"))
+        self.ticker_index = {t: i for i, t in enumerate(self.tickers)}
+        self._mats = {}
+
+    @classmethod
+    def open(cls, data_dir="data/adjclose"):
+        # None if no store has been written for this directory yet
+        return _open_store(data_dir)[0]
+
+    def matrix(self, col):
+        # (T, N) read-only memmap; shared between processes through the page cache
+        col = resolve_col(col, self.columns)
+        if col not in self._mats:
+            self._mats[col] = np.load(self.path / f"{col}.npy", mmap_mode="r")
+        return self._mats[col]
+
+    def is_stale(self, data_dir=None):
+        # a parquet file was rewritten after the store was built
+        data_dir = self.path.parent if data_dir is None else data_dir
+        now = _source_mtimes(data_dir, self.tickers)
+        return now != self.meta.get("sources", now)
+
+    def frame(self, col, tickers=None):
+        '''
+        date x ticker DataFrame for `col`.
+        The full universe (in store order) is a view on the memmap, a subset
+        is gathered with one take along the ticker axis.
+        '''
+        mat = self.matrix(col)
+        if tickers is None or list(tickers) == self.tickers:
+            return pd.DataFrame(mat, index=self.dates, columns=list(self.tickers), copy=False)
+        idx = [self.ticker_index[t] for t in tickers]
+        return pd.DataFrame(np.take(mat, idx, axis=1), index=self.dates, columns=list(tickers))
+
+
+def _read_one(data_dir, ticker, col):
+    instrument.count("parquet_reads")
+    df = pd.read_parquet(Path(data_dir) / f"{ticker}.parquet")
+    return df[resolve_col(col, df.columns)].sort_index()
+
+
+_STORES = {}
+
+
+def _open_store(data_dir):
+    # PriceStore objects are cheap but not free (json + dates); reuse them
+    # until meta.json is rewritten
+    path = store_path(data_dir)
+    try:
+        mtime = os.stat(path / "meta.json").st_mtime_ns
+    except FileNotFoundError:
+        return None, None
+    key = str(path.resolve())
+    hit = _STORES.get(key)
+    if hit is None or hit[0] != mtime:
+        hit = _STORES[key] = (mtime, PriceStore(path))
+    return hit[1], mtime
+
+
+def _load_panel(tickers, col, data_dir, strict, store):
+    with instrument.phase("price_store.load_panel"):
+        return _load_panel_inner(tickers, col, data_dir, strict, store)
+
+
+def _load_panel_inner(tickers, col, data_dir, strict, store):
+    if store is not None and store.is_stale(data_dir):
+        store = None
+
+    known = [t for t in tickers if store is not None and t in store.ticker_index]
+    if store is not None and len(known) == len(tickers):
+        return store.frame(col, tickers)
+
+    wide = {}
+    if known:
+        part = store.frame(col, known)
+        wide.update({t: part[t] for t in known})
+    for t in tickers:
+        if t in wide:
+            continue
+        try:
+            wide[t] = _read_one(data_dir, t, col)
+        except FileNotFoundError:
+            if strict:
+                raise
+            wide[t] = pd.Series(dtype="float64")
+    return pd.DataFrame({t: wide[t] for t in tickers}).sort_index()
+
+
+def load_panel(tickers, col="Close", data_dir="data/adjclose", strict=True, cache=True):
+    '''
+    Aligned date x ticker frame for `tickers` (columns in the given order).
+
+    Uses the consolidated store when it exists and is up to date; tickers
+    the store doesn't know about are read from their parquet file.
+    strict=False turns a missing file into an all-NaN column instead of
+    raising FileNotFoundError.
+
+    Results go through the process-wide price_cache (keyed by directory,
+    tickers and column, invalidated by file mtimes), so several strategies
+    over the same universe load it once. The returned frame is shared:
+    don't modify it in place.
+    '''
+    tickers = list(tickers)
+    store, _ = _open_store(data_dir)
+    if not cache:
+        return _load_panel(tickers, col, data_dir, strict, store)
+
+    key, signature, sources = panel_key(tickers, col, data_dir)
+    if strict:
+        for t in tickers:
+            if t not in sources:
+                raise FileNotFoundError(Path(data_dir) / f"{t}.parquet")
+    return price_cache.CACHE.get(
+        key, signature, lambda: _load_panel(tickers, key[2], data_dir, strict, store))
+
+
+def panel_key(tickers, col="Close", data_dir="data/adjclose"):
+    '''
+    (cache key, signature, source mtimes) load_panel uses for this panel;
+    lets other processes prime price_cache with a frame they already have
+    '''
+    tickers = list(tickers)
+    store, store_mtime = _open_store(data_dir)
+    sources = _source_mtimes(data_dir, tickers)
+    if store is not None:
+        col = resolve_col(col, store.columns)
+    key = (str(Path(data_dir).resolve()), tuple(tickers), col)
+    signature = (store_mtime, tuple(sources.get(t) for t in tickers))
+    return key, signature, sources
+
+
+def store_tickers(data_dir="data/adjclose"):
+    '''
+    tickers of the consolidated store, in store order ([] without a store);
+    load_panel of exactly these is a view on the memmap
+    '''
+    store, _ = _open_store(data_dir)
+    return list(store.tickers) if store is not None else []
+
+
+def hide_first(frame, n):
+    '''
+    frame (or Series) with each column's first n valid values set to NaN,
+    e.g. a ticker's first close that only supplies its ADV volume
+    '''
+    return frame.where(frame.notna().cumsum() > n) if n else frame
+
+
+def _first_kept(vals, n):
+    # per column: row of the (n+1)-th valid value (len(vals) if none),
+    # i.e. the rows hide_first(frame, n) masks are the ones above it
+    seen = np.cumsum(~np.isnan(vals), axis=0) > n
+    return np.where(seen.any(axis=0), seen.argmax(axis=0), len(vals))
+
+
+class PanelBlocks:
+    """
+    Out-of-core version of load_panel(tickers, col): blocks of tickers (all
+    dates) or of dates (all tickers) are read from the memmapped store on
+    demand, so the full matrix is never in memory. Tickers the store
+    doesn't have are all-NaN columns (strict=False). Without an
+    up-to-date store it falls back to wrapping the load_panel frame.
+    Rows are the dates in [start, end); the first skip_first valid
+    values of each ticker are NaN (hide_first).
+
+        panel = PanelBlocks(tickers, "Adj Close", data_dir)
+        panel.column_block(0, 200)      # DataFrame, all dates x 200 tickers
+        panel.rows(0, 256)              # ndarray, 256 dates x all tickers
+    """
+    def __init__(self, tickers, col="Close", data_dir="data/adjclose", strict=True,
+                 skip_first=0, dtype="float64", start=None, end=None):
+        self.dtype = np.dtype(dtype)     # float32: values rounded as in compact mode
+        self.skip_first = int(skip_first)
+        if tickers is None:              # from_frame
+            return
+        self.columns = list(tickers)
+        store, _ = _open_store(data_dir)
+        if store is not None and store.is_stale(data_dir):
+            store = None
+        lazy = store is not None and all(
+            t in store.ticker_index or (not strict and not (Path(data_dir) / f"{t}.parquet").exists())
+            for t in self.columns)
+        dates = store.dates if lazy else None
+        if not lazy:
+            frame = load_panel(self.columns, col, data_dir, strict=strict)
+            dates = frame.index
+        lo = 0 if start is None else dates.searchsorted(pd.Timestamp(start))
+        hi = len(dates) if end is None else dates.searchsorted(pd.Timestamp(end))
+        if lazy:
+            self._frame = None
+            self._mat = store.matrix(col)
+            self._idx = np.array([store.ticker_index.get(t, -1) for t in self.columns], dtype=np.intp)
+            self._row0 = lo              # store row of the panel's first date
+            self.index = store.dates[lo:hi]
+            # row of each ticker's first kept value; -1 until its column is read
+            self._kept = np.full(len(self.columns), -1 if self.skip_first else 0, dtype=np.intp)
+        else:
+            self._frame = hide_first(frame.iloc[lo:hi], self.skip_first)
+            self.index = self._frame.index
+        self.shape = (len(self.index), len(self.columns))
+
+    @classmethod
+    def from_frame(cls, frame):
+        '''
+        an already loaded panel (e.g. intraday bars) behind the same interface
+        '''
+        self = cls(None, dtype=frame.dtypes.iloc[0] if frame.shape[1] else "float64")
+        self.columns = list(frame.columns)
+        self._frame = frame
+        self.index = frame.index
+        self.shape = frame.shape
+        return self
+
+    @property
+    def empty(self):
+        return 0 in self.shape
+
+    def _gather(self, rows, idx):
+        # store columns idx (-1 = missing) of the given row slice, as a new array
+        if len(idx) and idx.min() >= 0 and (np.diff(idx) == 1).all():
+            out = np.array(self._mat[rows, idx[0]:idx[-1] + 1], dtype=self.dtype)
+        else:
+            out = np.take(self._mat[rows], np.maximum(idx, 0), axis=1).astype(self.dtype, copy=False)
+            out[:, idx < 0] = np.nan
+        return out
+
+    def column_block(self, a, b):
+        '''
+        float64 DataFrame of tickers [a, b) over all dates
+        '''
+        if self._frame is not None:
+            vals = self._frame.iloc[:, a:b].to_numpy(dtype=self.dtype)
+        else:
+            vals = self._gather(slice(self._row0, self._row0 + self.shape[0]), self._idx[a:b])
+            if self.skip_first:
+                self._kept[a:b] = kept = _first_kept(vals, self.skip_first)
+                vals[np.arange(len(vals))[:, None] < kept] = np.nan
+        return pd.DataFrame(vals.astype("float64", copy=False), index=self.index, columns=self.columns[a:b])
+
+    def rows(self, a, b):
+        '''
+        (b - a, N) array of dates [a, b), all tickers, in self.dtype
+        '''
+        if self._frame is not None:
+            return self._frame.iloc[a:b].to_numpy(dtype=self.dtype)
+        out = self._gather(slice(self._row0 + a, self._row0 + b), self._idx)
+        if self.skip_first:
+            kept = self._first_rows()
+            out[np.arange(a, a + len(out))[:, None] < kept] = np.nan
+        return out
+
+    def _first_rows(self):
+        # _kept for all tickers; columns no column_block has read yet are
+        # scanned here (run_chunked's signal pass has read them all)
+        todo = np.flatnonzero(self._kept < 0)
+        for a in range(0, len(todo), 256):
+            cols = todo[a:a + 256]
+            vals = self._gather(slice(self._row0, self._row0 + self.shape[0]), self._idx[cols])
+            self._kept[cols] = _first_kept(vals, self.skip_first)
+        return self._kept
+
+
+def load_series(ticker, col="Close", data_dir="data/adjclose"):
+    return load_panel([ticker], col, data_dir)[ticker]
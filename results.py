@@ -0,0 +1,237 @@
+import argparse
+import hashlib
+import json
+import shutil
+import sys
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+
+import pandas as pd
+
+import instrument
+from indicators import content_hash
+from tradelog import TradeLog
+
+
+'''
+Stored run results, so a restarted notebook can redraw its charts
+without rerunning every strategy.
+
+    results.configure("data/runs")                   # turn the store on
+    MACDStrategy(1_000_000, tickers).run()           # runs once, saves
+    MACDStrategy(1_000_000, tickers).run()           # same config + data: loaded
+    get_trades(MACDStrategy(1_000_000, tickers))     # loaded, nothing runs
+
+A run is keyed by strategy class, its params(), the starting cash and a
+content hash of the input panels, so new prices or any parameter change
+gives a new key and the strategy simply runs again. Each stored run is
+a directory <root>/<class>-<key>/ holding trades.parquet,
+portfolio.parquet and meta.json. Only fresh strategy objects (nothing
+run yet) are loaded from / saved to the store.
+
+    python results.py list  [--root data/runs]
+    python results.py prune [--older-than DAYS] [--keep N] [--strategy MA] [--all] [--dry-run]
+'''
+
+DEFAULT_ROOT = "data/runs"
+
+
+@dataclass
+class StoredRun:
+    key: str
+    path: Path
+    meta: dict
+    inputs: tuple = ()                 # the panels the key was computed from
+    trades: pd.DataFrame = None        # None until found in / written to the store
+    portfolio: pd.DataFrame = None
+    started: float = field(default_factory=time.perf_counter)
+
+    @property
+    def hit(self):
+        return self.trades is not None
+
+    @property
+    def final_cash(self):
+        return float(self.meta["final_cash"])
+
+    def trade_log(self):
+        return TradeLog.from_frame(self.trades)
+
+    def positions(self):
+        # shares bought per ticker (every strategy starts flat)
+        buys = self.trades[self.trades["side"].astype(str) == "BUY"]
+        qty = buys.groupby(buys["ticker"].astype(str))["qty"].sum()
+        return {t: int(q) if float(q).is_integer() else float(q) for t, q in qty.items()}
+
+
+class RunStore:
+    def __init__(self, root=DEFAULT_ROOT):
+        self.root = Path(root)
+
+    def key(self, strategy, *frames):
+        '''
+        (key, meta) for a fresh strategy about to run on `frames`
+        '''
+        meta = {"strategy": type(strategy).__name__,
+                "params": strategy.params(),
+                "cash": float(getattr(strategy, "init_cash", strategy.cash)),
+                "data": [content_hash(f) for f in frames]}
+        blob = json.dumps(meta, sort_keys=True, default=str).encode()
+        key = f"{meta['strategy']}-{hashlib.blake2b(blob, digest_size=10).hexdigest()}"
+        return key, meta
+
+    def lookup(self, strategy, *frames):
+        with instrument.phase("results.lookup"):
+            key, meta = self.key(strategy, *frames)
+            run = StoredRun(key, self.root / key, meta, inputs=frames)
+            try:
+                with open(run.path / "meta.json") as fh:
+                    run.meta = json.load(fh)
+                run.trades = pd.read_parquet(run.path / "trades.parquet")
+                run.portfolio = pd.read_parquet(run.path / "portfolio.parquet")
+            except (OSError, ValueError):
+                run.trades = run.portfolio = None
+            instrument.count("hits" if run.hit else "misses")
+            return run
+
+    def save(self, run, strategy):
+        with instrument.phase("results.save"):
+            trades, port = strategy.trades_df(), strategy.portfolio_df()
+            meta = dict(run.meta, created=pd.Timestamp.now().isoformat(timespec="seconds"),
+                        seconds=time.perf_counter() - run.started, n_trades=int(len(trades)),
+                        final_cash=float(port["cash"].iloc[-1]) if len(port) else float(strategy.cash),
+                        final_equity=float(port["equity"].iloc[-1]) if len(port) else None)
+            # write next to the final directory, then swap it in
+            tmp = run.path.with_name(run.path.name + ".tmp")
+            shutil.rmtree(tmp, ignore_errors=True)
+            tmp.mkdir(parents=True)
+            trades.to_parquet(tmp / "trades.parquet", index=False)
+            port.to_parquet(tmp / "portfolio.parquet")
+            with open(tmp / "meta.json", "w") as fh:
+                json.dump(meta, fh, indent=1, default=str)
+            shutil.rmtree(run.path, ignore_errors=True)
+            tmp.rename(run.path)
+            run.meta, run.trades, run.portfolio = meta, trades, port
+            return run
+
+    # ---------- housekeeping ----------
+
+    def runs(self):
+        '''
+        one row per stored run: key, strategy, params, cash, created, size, ...
+        '''
+        rows = []
+        for meta_path in sorted(self.root.glob("*/meta.json")):
+            with open(meta_path) as fh:
+                meta = json.load(fh)
+            size = sum(p.stat().st_size for p in meta_path.parent.iterdir())
+            rows.append({"key": meta_path.parent.name, "strategy": meta["strategy"],
+                         "params": json.dumps(meta["params"], sort_keys=True),
+                         "cash": meta["cash"], "created": pd.Timestamp(meta["created"]),
+                         "n_trades": meta.get("n_trades"), "final_equity": meta.get("final_equity"),
+                         "size_mb": size / 2**20})
+        cols = ["key", "strategy", "params", "cash", "created", "n_trades", "final_equity", "size_mb"]
+        return pd.DataFrame(rows, columns=cols)
+
+    def prune(self, older_than=None, keep=None, strategy=None, everything=False, dry_run=False):
+        '''
+        remove stored runs
+        input:
+                1. older_than: days; runs created earlier than that go
+                2. keep: keep only the newest `keep` runs per strategy class
+                3. strategy: only consider runs of this class
+                4. everything: remove every (matching) run
+        output:
+                keys removed
+        '''
+        runs = self.runs()
+        if strategy is not None:
+            runs = runs[runs["strategy"] == strategy]
+        drop = pd.Series(bool(everything), index=runs.index)
+        if older_than is not None:
+            drop |= runs["created"] < pd.Timestamp.now() - pd.Timedelta(days=older_than)
+        if keep is not None:
+            rank = runs.groupby("strategy")["created"].rank(ascending=False, method="first")
+            drop |= rank > keep
+        keys = list(runs.loc[drop, "key"])
+        if not dry_run:
+            for k in keys:
+                shutil.rmtree(self.root / k, ignore_errors=True)
+        return keys
+
+
+# the store the strategies use (None = off)
+STORE = None
+
+
+def configure(root=DEFAULT_ROOT, enabled=True):
+    '''
+    turn the run store on (at `root`) or off
+    '''
+    global STORE
+    STORE = RunStore(root) if enabled else None
+    return STORE
+
+
+def _fresh(strategy):
+    log = next((getattr(strategy, a) for a in ("trades", "trading_log", "trade")
+                if isinstance(getattr(strategy, a, None), TradeLog)), None)
+    return log is not None and len(log) == 0 and hasattr(strategy, "params")
+
+
+def lookup(strategy, *frames):
+    '''
+    StoredRun for a strategy about to run on `frames` (check .hit), or
+    None when the store is off or the strategy has already run
+    '''
+    if STORE is None or not _fresh(strategy):
+        return None
+    return STORE.lookup(strategy, *frames)
+
+
+def save(run, strategy):
+    if run is not None and STORE is not None:
+        STORE.save(run, strategy)
+
+
+def cached(strategy):
+    '''
+    restore a fresh strategy from the store if its run is there (used by
+    analysis.get_trades / get_port); returns the strategy either way
+    '''
+    if STORE is None or not _fresh(strategy):
+        return strategy
+    frames = strategy._inputs()
+    run = STORE.lookup(strategy, *frames)
+    if run.hit:
+        strategy._restore(run)
+    return strategy
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="List / prune stored strategy runs.")
+    ap.add_argument("command", choices=["list", "prune"])
+    ap.add_argument("--root", default=DEFAULT_ROOT)
+    ap.add_argument("--older-than", type=float, default=None, help="days")
+    ap.add_argument("--keep", type=int, default=None, help="newest runs to keep per strategy")
+    ap.add_argument("--strategy", default=None)
+    ap.add_argument("--all", action="store_true")
+    ap.add_argument("--dry-run", action="store_true")
+    args = ap.parse_args(argv)
+
+    store = RunStore(args.root)
+    if args.command == "list":
+        runs = store.runs()
+        print(runs.to_string(index=False) if len(runs) else f"no stored runs in {store.root}")
+        return 0
+    if args.older_than is None and args.keep is None and not args.all:
+        ap.error("prune needs --older-than, --keep or --all")
+    keys = store.prune(args.older_than, args.keep, args.strategy, args.all, args.dry_run)
+    verb = "would remove" if args.dry_run else "removed"
+    print(f"{verb} {len(keys)} run(s)" + "".join(f"\n  {k}" for k in keys))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
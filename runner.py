@@ -0,0 +1,184 @@
+import os
+import resource
+import sys
+import time
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+import price_cache
+from price_store import load_panel, panel_key
+import bar_store
+
+
+'''
+Run several strategies side by side in worker processes.
+
+    configs = [
+        {"name": "BENCH", "strategy": static_stratgy, "args": (1_000_000, tickers)},
+        {"name": "MA",    "strategy": MA, "args": (1_000_000, 20, 50, tickers)},
+        {"name": "RSI",   "strategy": RSIStrategy, "args": (1_000_000, tickers)},
+    ]
+    results = run_strategies(configs)
+    summary(results)            # name, seconds, peak RSS, fills, final equity
+
+The parent loads every aligned price / volume panel the configs need
+once and publishes the matrices via multiprocessing.shared_memory. Each
+worker maps them without copying or pickling, primes its price_cache
+with the mapped frames (so the strategies' own load_panel calls hit it)
+and runs one strategy. Trades and portfolios come back to the parent;
+every strategy gets a fresh worker, so its peak RSS is its own.
+'''
+
+
+@dataclass
+class RunResult:
+    name: str
+    trades: pd.DataFrame = None
+    portfolio: pd.DataFrame = None
+    seconds: float = 0.0          # wall time of run() in the worker
+    peak_rss_mb: float = 0.0      # worker's peak resident set size
+    error: str = None
+
+
+def _panel_columns(strategy):
+    # signal strategies read price_col; the benchmark reads Close and Volume
+    col = getattr(strategy, "price_col", None)
+    return (col,) if col else ("Close", "Volume")
+
+
+def _peak_rss_mb():
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1 << 20) if sys.platform == "darwin" else rss / 1024   # bytes on macOS, KiB on Linux
+
+
+# ---------- parent: publish panels ----------
+
+def _publish(frame):
+    arr = frame.to_numpy(dtype="float64")
+    shm = shared_memory.SharedMemory(create=True, size=max(arr.nbytes, 1))
+    np.ndarray(arr.shape, dtype=arr.dtype, buffer=shm.buf)[:] = arr
+    spec = {"shm": shm.name, "shape": arr.shape, "index": frame.index,
+            "columns": list(frame.columns)}
+    return shm, spec
+
+
+def _panels(strategies):
+    '''
+    load every distinct (data_dir, tickers, column) panel once
+    output: {cache key: (signature, frame)}
+    '''
+    panels = {}
+    for strat in strategies:
+        if not bar_store.is_daily(getattr(strat, "bar_freq", bar_store.DAILY)):
+            continue           # intraday bars: each worker reads its own date range
+        data_dir = getattr(strat, "data_dir", "data/adjclose")
+        for col in _panel_columns(strat):
+            key, signature, _ = panel_key(strat.tickers, col, data_dir)
+            if key not in panels:
+                panels[key] = (signature, load_panel(strat.tickers, col, data_dir, strict=False))
+    return panels
+
+
+# ---------- worker ----------
+
+_SHM = []      # keep mappings alive for the worker's lifetime
+
+
+def _attach(name):
+    # the parent owns (and unlinks) the block; workers share its resource
+    # tracker, so attaching doesn't hand ownership over
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)    # Python >= 3.13
+    except TypeError:
+        return shared_memory.SharedMemory(name=name)
+
+
+def _context():
+    # forkserver with the heavy imports preloaded starts fresh workers fast;
+    # fork can't be combined with one task per worker
+    if "forkserver" in mp.get_all_start_methods():
+        ctx = mp.get_context("forkserver")
+        ctx.set_forkserver_preload(["numpy", "pandas", "runner"])
+        return ctx
+    return mp.get_context("spawn")
+
+
+def _init_worker(specs):
+    for key, signature, spec in specs:
+        shm = _attach(spec["shm"])
+        _SHM.append(shm)
+        arr = np.ndarray(spec["shape"], dtype="float64", buffer=shm.buf)
+        arr.flags.writeable = False
+        frame = pd.DataFrame(arr, index=spec["index"], columns=spec["columns"], copy=False)
+        price_cache.CACHE.put(key, signature, frame)
+
+
+def _run_one(config):
+    name = config.get("name", config["strategy"].__name__)
+    try:
+        strat = config["strategy"](*config.get("args", ()), **config.get("kwargs", {}))
+        t0 = time.perf_counter()
+        strat.run()
+        seconds = time.perf_counter() - t0
+        return RunResult(name=name, trades=strat.trades_df(), portfolio=strat.portfolio_df(),
+                         seconds=seconds, peak_rss_mb=_peak_rss_mb())
+    except Exception as e:
+        return RunResult(name=name, peak_rss_mb=_peak_rss_mb(), error=f"{type(e).__name__}: {e}")
+
+
+# ---------- driver ----------
+
+def run_strategies(configs, processes=None):
+    '''
+    input:
+            1. configs: list of {"name", "strategy": class, "args": tuple, "kwargs": dict}
+            2. processes: pool size (None = min(os.cpu_count(), len(configs)), 1 = inline)
+    output:
+            {name: RunResult} in config order
+    '''
+    configs = list(configs)
+    strategies = [c["strategy"](*c.get("args", ()), **c.get("kwargs", {})) for c in configs]
+    panels = _panels(strategies)
+
+    processes = min(os.cpu_count() or 1, len(configs)) if processes is None else int(processes)
+    if processes <= 1:
+        for key, (signature, frame) in panels.items():
+            price_cache.CACHE.put(key, signature, frame)
+        results = [_run_one(c) for c in configs]
+        return {r.name: r for r in results}
+
+    blocks, specs = [], []
+    try:
+        for key, (signature, frame) in panels.items():
+            shm, spec = _publish(frame)
+            blocks.append(shm)
+            specs.append((key, signature, spec))
+        del panels
+        with ProcessPoolExecutor(max_workers=processes, mp_context=_context(), max_tasks_per_child=1,
+                                 initializer=_init_worker, initargs=(specs,)) as pool:
+            results = list(pool.map(_run_one, configs))
+    finally:
+        for shm in blocks:
+            shm.close()
+            shm.unlink()
+    return {r.name: r for r in results}
+
+
+def summary(results):
+    '''
+    one row per strategy: wall time, peak RSS, number of trades, final equity
+    '''
+    rows = []
+    for r in results.values():
+        port = r.portfolio if r.portfolio is not None else pd.DataFrame()
+        trades = r.trades if r.trades is not None else pd.DataFrame()
+        rows.append({"strategy": r.name, "seconds": r.seconds, "peak_rss_mb": r.peak_rss_mb,
+                     "n_trades": int((trades["side"] == "BUY").sum()) if "side" in trades else 0,
+                     "final_equity": float(port["equity"].iloc[-1]) if len(port) else np.nan,
+                     "error": r.error})
+    return pd.DataFrame(rows)
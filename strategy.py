@@ -0,0 +1,147 @@
+from execution import fill_orders, value_fills
+from price_store import PanelBlocks, hide_first
+import instrument
+import walkforward
+import results
+from tradelog import TradeLog
+import events
+import chunked
+import bar_store
+from valuation import portfolio_frame, concat_portfolio, portfolio_records
+
+
+'''
+Shared plumbing of the signal strategies (MA / RSI / MACD / VOL).
+
+A strategy subclasses SignalStrategy and only defines its parameters,
+_make_signals(price, ind=None) -> bool date x ticker frame (signal on t,
+buy 1 share on t+1; dense, turned into sparse events.Events by run()),
+stream() -> a streaming.* signal object and params(). Loading, the run store, execution, valuation, walk-forward and
+the chunked run are the same for all of them:
+
+    class MyStrategy(SignalStrategy):
+        def __init__(self, initial_cash, tickers, window=20, **kw):
+            super().__init__(initial_cash, tickers, **kw)
+            self.window = int(window)
+        def _make_signals(self, price, ind=None): ...
+        def stream(self): ...
+        def params(self):
+            return dict(super().params(), window=self.window)
+'''
+
+
+class SignalStrategy:
+    """
+    Long-only, cash-limited, 1 share per signal; every BUY/SKIP goes to a
+    TradeLog and every run adds a cash / holdings / equity frame.
+    """
+    SKIP_FIRST = 0         # first valid prices of each ticker not traded on (MA: its ADV day)
+    STRICT = True          # False: missing tickers become all-NaN columns
+
+    def __init__(self, initial_cash, tickers, data_dir=None, price_col="Adj Close",
+                 compact=False, bar_freq="1D", start=None, end=None):
+        self.cash = float(initial_cash)
+        self.tickers = list(tickers)
+        self.price_col = price_col
+        self.compact = bool(compact)       # float32 prices, signals built per ticker block
+        self.bar_freq = bar_store.normalize_freq(bar_freq)          # "1D" daily store, else intraday bar store
+        self.data_dir = bar_store.data_root(self.bar_freq, data_dir)  # None: data/adjclose or data/bars
+        self.start, self.end = start, end  # [start, end) of the bars used (None = all)
+        self.positions = {t: 0 for t in self.tickers}
+        self.trades = TradeLog()           # columnar BUY/SKIP log
+        self._portfolio = []               # one cash/holdings/equity frame per run
+        self.events = None                 # sparse orders of the last run (events.py)
+        self.cached = False                # last run() restored from the run store
+
+    # ---------- data ----------
+
+    def _load_one(self, tkr):
+        # one ticker's prices for the strategy's bar_freq / start / end
+        s = bar_store.load_prices([tkr], self.price_col, self.data_dir, self.bar_freq,
+                                  self.start, self.end, strict=self.STRICT)[tkr]
+        return hide_first(s, self.SKIP_FIRST)
+
+    def _load_price(self):
+        price = bar_store.load_prices(self.tickers, self.price_col, self.data_dir, self.bar_freq,
+                                      self.start, self.end, strict=self.STRICT)
+        price = hide_first(price, self.SKIP_FIRST)
+        return price.astype("float32") if self.compact else price
+
+    def _price_blocks(self):
+        # _load_price without loading: read block by block (run_chunked)
+        if not bar_store.is_daily(self.bar_freq):
+            return PanelBlocks.from_frame(self._load_price())
+        return PanelBlocks(self.tickers, self.price_col, self.data_dir, strict=self.STRICT,
+                           skip_first=self.SKIP_FIRST, start=self.start, end=self.end,
+                           dtype="float32" if self.compact else "float64")
+
+    # ---------- run ----------
+
+    def run(self):
+        name = type(self).__name__
+        with instrument.phase(f"{name}.load"):
+            price = self._load_price()
+        if price.empty:
+            return self
+        run = results.lookup(self, price)      # stored result for this config + data?
+        self.cached = run is not None and run.hit
+        if self.cached:
+            return self._restore(run)
+
+        with instrument.phase(f"{name}.signal"):
+            # sparse (day, ticker) orders: a signal on t buys 1 share on t+1
+            if self.compact:
+                self.events = events.blockwise(self, price)
+            else:
+                self.events = events.Events.from_signals(self._make_signals(price))
+
+        # cash-limited, cheapest-first execution (shared engine)
+        px = price.to_numpy()
+        with instrument.phase(f"{name}.execution"):
+            fills = fill_orders(self.events, px, price.index, list(price.columns), self.cash,
+                                positions=[self.positions.get(t, 0) for t in price.columns],
+                                log=self.trades)
+        with instrument.phase(f"{name}.valuation"):
+            res = value_fills(fills, px)
+            self.cash = res.cash
+            self.positions.update(zip(price.columns, res.positions.tolist()))
+            self._portfolio.append(portfolio_frame(price.index, res.cash_path, res.holdings))
+        results.save(run, self)
+        return self
+
+    def params(self):
+        # what besides cash and the input prices decides the result (run store key);
+        # subclasses add their own parameters
+        return {"price_col": self.price_col, "compact": self.compact, "bar_freq": self.bar_freq}
+
+    def _inputs(self):
+        return (self._load_price(),)
+
+    def _restore(self, run):
+        # results of an identical stored run (see results.py)
+        self.trades = run.trade_log()
+        self._portfolio = [run.portfolio]
+        self.cash = run.final_cash
+        self.positions.update(run.positions())
+        return self
+
+    def walk_forward(self, train, test, step=None, **kw):
+        # out-of-sample windows with fresh cash; indicators computed once (see walkforward.py)
+        return walkforward.walk_forward(self, train, test, step, **kw)
+
+    def run_chunked(self, **kw):
+        # out-of-core two-pass run, same results as run() (see chunked.py)
+        return chunked.run(self, self._price_blocks(), self.trades, **kw)
+
+    # ---------- results ----------
+
+    def trades_df(self):
+        return self.trades.to_frame()
+
+    def portfolio_df(self):
+        return concat_portfolio(self._portfolio)
+
+    @property
+    def portfolio_rows(self):
+        # list-of-dicts view kept for older notebooks
+        return portfolio_records(self._portfolio)
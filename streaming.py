@@ -0,0 +1,238 @@
+import numpy as np
+
+
+'''
+Streaming (bar-by-bar) indicators.
+
+Each object holds constant-size state for N tickers and update(row) takes
+one bar (array of N closes, NaN = no price) in O(1) per ticker:
+rolling windows use a ring buffer plus running sums, EMAs / Wilder
+smoothing keep only the last value. NaN handling follows pandas
+(rolling(min_periods=window), ewm(adjust=False), diff, pct_change), so
+after replaying the same history the values match the batch frames in
+indicators.py up to floating point round-off.
+
+The *Signals classes on top reproduce the strategies' buy signals: feed
+today's closes, get back the tickers to buy tomorrow.
+'''
+
+
+def _row(x):
+    return np.asarray(x, dtype="float64")
+
+
+class RollingMean:
+    """
+    price.rolling(window, min_periods=window).mean(), one bar at a time
+    """
+    def __init__(self, window, n):
+        self.window = int(window)
+        self.buf = np.full((self.window, n), np.nan)
+        self.pos = 0
+        self.total = np.zeros(n)
+        self.count = np.zeros(n, dtype=np.int64)
+
+    def update(self, x):
+        x = _row(x)
+        old = self.buf[self.pos]
+        old_ok, new_ok = ~np.isnan(old), ~np.isnan(x)
+        self.total -= np.where(old_ok, old, 0.0)
+        self.count -= old_ok
+        self.total += np.where(new_ok, x, 0.0)
+        self.count += new_ok
+        self.buf[self.pos] = x
+        self.pos = (self.pos + 1) % self.window
+        self.total[self.count == 0] = 0.0   # drop accumulated round-off on empty windows
+        full = self.count >= self.window
+        return np.where(full, self.total / np.maximum(self.count, 1), np.nan)
+
+
+class RollingStd:
+    """
+    x.rolling(window, min_periods=window).std(ddof) with Welford add/remove
+    """
+    def __init__(self, window, n, ddof=1):
+        self.window, self.ddof = int(window), int(ddof)
+        self.buf = np.full((self.window, n), np.nan)
+        self.pos = 0
+        self.nobs = np.zeros(n)
+        self.mean = np.zeros(n)
+        self.ssqdm = np.zeros(n)
+
+    def _add(self, x, mask):
+        nobs = self.nobs + mask
+        delta = np.where(mask, x - self.mean, 0.0)
+        mean = self.mean + np.where(mask, delta / np.maximum(nobs, 1), 0.0)
+        self.ssqdm += np.where(mask, delta * (np.where(mask, x, 0.0) - mean), 0.0)
+        self.nobs, self.mean = nobs, mean
+
+    def _remove(self, x, mask):
+        nobs = self.nobs - mask
+        delta = np.where(mask, x - self.mean, 0.0)
+        mean = np.where(mask & (nobs > 0), self.mean - delta / np.maximum(nobs, 1), self.mean)
+        ssq = self.ssqdm - np.where(mask, delta * (np.where(mask, x, 0.0) - mean), 0.0)
+        empty = nobs == 0
+        self.nobs = nobs
+        self.mean = np.where(empty, 0.0, mean)
+        self.ssqdm = np.where(empty, 0.0, ssq)
+
+    def update(self, x):
+        x = _row(x)
+        old = self.buf[self.pos]
+        self._remove(old, ~np.isnan(old))
+        self._add(x, ~np.isnan(x))
+        self.buf[self.pos] = x
+        self.pos = (self.pos + 1) % self.window
+        full = self.nobs >= self.window
+        var = np.maximum(self.ssqdm, 0.0) / np.maximum(self.nobs - self.ddof, 1)
+        return np.where(full, np.sqrt(var), np.nan)
+
+
+class EWM:
+    """
+    x.ewm(alpha=..., adjust=False).mean() (or span=...), one bar at a time.
+    Missing bars decay the old weight like pandas (ignore_na=False).
+    """
+    def __init__(self, n, alpha=None, span=None):
+        if alpha is None:
+            alpha = 2.0 / (float(span) + 1.0)
+        self.alpha = float(alpha)
+        self.value = np.full(n, np.nan)
+        self.old_wt = np.ones(n)
+
+    def update(self, x):
+        x = _row(x)
+        obs = ~np.isnan(x)
+        started = ~np.isnan(self.value)
+
+        # running ticker: decay old weight every bar, blend in observations
+        old_wt = np.where(started, self.old_wt * (1.0 - self.alpha), self.old_wt)
+        blend = started & obs & (self.value != x)
+        with np.errstate(invalid="ignore"):
+            mixed = (old_wt * self.value + self.alpha * x) / (old_wt + self.alpha)
+        value = np.where(blend, mixed, self.value)
+        old_wt = np.where(started & obs, 1.0, old_wt)
+
+        # first observation starts the average
+        first = ~started & obs
+        value = np.where(first, x, value)
+        self.value, self.old_wt = value, old_wt
+        return value.copy()
+
+
+class Diff:
+    """
+    x.diff() and x.pct_change() (no fill) against the previous bar
+    """
+    def __init__(self, n):
+        self.prev = np.full(n, np.nan)
+
+    def update(self, x):
+        x = _row(x)
+        d = x - self.prev
+        with np.errstate(divide="ignore", invalid="ignore"):
+            r = x / self.prev - 1.0
+        self.prev = x
+        return d, r
+
+
+class WilderRSI:
+    """
+    RSI with Wilder smoothing (ewm alpha = 1/period), as in RSIStrategy
+    """
+    def __init__(self, period, n):
+        self.diff = Diff(n)
+        self.gain = EWM(n, alpha=1.0 / int(period))
+        self.loss = EWM(n, alpha=1.0 / int(period))
+
+    def update(self, x):
+        delta, _ = self.diff.update(x)
+        avg_gain = self.gain.update(np.where(np.isnan(delta), np.nan, np.maximum(delta, 0.0)))
+        avg_loss = self.loss.update(np.where(np.isnan(delta), np.nan, -np.minimum(delta, 0.0)))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            rs = avg_gain / avg_loss
+            return 100 - (100 / (1 + rs))
+
+
+class MACD:
+    """
+    MACD line (EMA fast - EMA slow) and its signal EMA
+    """
+    def __init__(self, fast, slow, signal_span, n):
+        self.fast, self.slow = EWM(n, span=fast), EWM(n, span=slow)
+        self.signal = EWM(n, span=signal_span)
+
+    def update(self, x):
+        macd = self.fast.update(x) - self.slow.update(x)
+        return macd, self.signal.update(macd)
+
+
+# ---------- strategy signals: today's close -> tomorrow's orders ----------
+
+class MASignals:
+    def __init__(self, s_window, l_window, n):
+        self.ma_s, self.ma_l = RollingMean(s_window, n), RollingMean(l_window, n)
+        self.prev_raw = np.zeros(n, dtype=bool)
+        self.prev_valid = np.zeros(n, dtype=bool)
+
+    def update(self, close):
+        s, l = self.ma_s.update(close), self.ma_l.update(close)
+        raw = s > l
+        valid = ~np.isnan(s) & ~np.isnan(l)
+        sig = raw & ~self.prev_raw & valid & self.prev_valid
+        self.prev_raw, self.prev_valid = raw, valid
+        return sig
+
+
+class RSISignals:
+    def __init__(self, period, threshold, n, event_based=True):
+        self.rsi = WilderRSI(period, n)
+        self.threshold, self.event_based = float(threshold), bool(event_based)
+        self.prev = np.full(n, np.nan)
+
+    def update(self, close):
+        rsi = self.rsi.update(close)
+        below = rsi < self.threshold
+        ok = ~np.isnan(rsi)
+        if self.event_based:
+            sig = below & ~(self.prev < self.threshold) & ok & ~np.isnan(self.prev)
+        else:
+            sig = below & ok
+        self.prev = rsi
+        return sig
+
+
+class MACDSignals:
+    def __init__(self, fast, slow, signal_span, n):
+        self.macd = MACD(fast, slow, signal_span, n)
+        self.prev_macd = np.full(n, np.nan)
+        self.prev_sig = np.full(n, np.nan)
+
+    def update(self, close):
+        macd, sigl = self.macd.update(close)
+        cross_up = (macd > sigl) & ~(self.prev_macd > self.prev_sig)
+        valid = (~np.isnan(macd) & ~np.isnan(sigl)
+                 & ~np.isnan(self.prev_macd) & ~np.isnan(self.prev_sig))
+        self.prev_macd, self.prev_sig = macd, sigl
+        return cross_up & valid
+
+
+class VolBreakoutSignals:
+    def __init__(self, lookback, n):
+        self.diff = Diff(n)
+        self.std = RollingStd(lookback, n)
+
+    def update(self, close):
+        _, ret = self.diff.update(close)
+        vol = self.std.update(ret)
+        return (ret > vol) & ~np.isnan(ret) & ~np.isnan(vol)
+
+
+def replay(stream, price):
+    '''
+    warm a stream up on a (T, N) history; returns the last bar's output
+    '''
+    out = None
+    for row in np.asarray(price, dtype="float64"):
+        out = stream.update(row)
+    return out
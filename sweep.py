@@ -0,0 +1,137 @@
+import itertools
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from analysis import TRADING_DAYS, metrics
+from bar_store import bars_per_year
+from events import Events
+from execution import execute_orders
+from indicators import Indicators
+
+
+'''
+Batched hyperparameter sweeps.
+
+    res = sweep(MACDStrategy, {"fast": [8, 12], "slow": [26, 39], "signal_span": [9]},
+                tickers, initial_cash=1_000_000)
+
+Prices are loaded once, every parameter set builds its signals from one
+shared Indicators memo (so e.g. EMA(12) is computed once for all combos
+that use it) and the orders are kept as one bit-packed
+parameter x date x ticker array. Executions then run in a process pool;
+each worker receives the price matrix once and one packed order slice
+per task. Workers send back their daily cash / holdings and all runs
+are scored together by analysis.metrics. The result is one tidy row
+per parameter set.
+'''
+
+SUMMARY = ["final_equity", "total_return", "ann_return", "ann_vol", "sharpe", "sortino",
+           "max_drawdown", "max_dd_days", "turnover", "exposure", "fill_ratio"]
+
+
+def param_grid(grid):
+    '''
+    dict of lists -> list of dicts (cartesian product); a list of dicts
+    is returned as is.
+    '''
+    if isinstance(grid, dict):
+        keys = list(grid)
+        return [dict(zip(keys, vals)) for vals in itertools.product(*(grid[k] for k in keys))]
+    return [dict(g) for g in grid]
+
+
+def _summary(equity, initial_cash, periods=TRADING_DAYS):
+    # metrics of one equity curve (walk-forward windows)
+    equity = np.asarray(equity, dtype="float64")
+    if np.isnan(equity).all():
+        return {}
+    row = metrics(equity, initial=initial_cash, periods=periods).iloc[0]
+    return {k: float(row[k]) for k in ["final_equity", "total_return", "ann_return", "ann_vol",
+                                       "sharpe", "max_drawdown"]}
+
+
+# ---------- worker side ----------
+
+_WORKER = {}
+
+
+def _init_worker(prices, dates, tickers, initial_cash):
+    _WORKER.update(prices=prices, dates=dates, tickers=tickers, cash=initial_cash)
+
+
+def _execute(packed):
+    w = _WORKER
+    T, N = w["prices"].shape
+    orders = Events.unpack(packed, N)
+    res = execute_orders(orders, w["prices"], w["dates"], w["tickers"], w["cash"], record=False)
+    row = {"final_cash": res.cash, "final_holdings": float(res.holdings[-1]) if T else 0.0,
+           "n_fills": res.n_fills, "n_skips": res.n_skips}
+    return row, res.cash_path, res.holdings
+
+
+# ---------- driver ----------
+
+def build_orders(strategy_cls, combos, tickers, initial_cash, **fixed):
+    '''
+    Load prices once and build the packed (P, T, ceil(N/8)) order stack:
+    the Events of every parameter set (as in run()), bit-packed.
+    output: price frame, packed orders
+    '''
+    first = strategy_cls(initial_cash, tickers=tickers, **fixed, **combos[0])
+    price = first._load_price()
+    ind = Indicators(price)
+
+    T, N = price.shape
+    packed = np.empty((len(combos), T, (N + 7) // 8), dtype=np.uint8)
+    for p, params in enumerate(combos):
+        strat = strategy_cls(initial_cash, tickers=tickers, **fixed, **params)
+        packed[p] = Events.from_signals(strat._make_signals(price, ind)).pack()
+    return price, packed
+
+
+def sweep(strategy_cls, grid, tickers, initial_cash=1_000_000, processes=None, curves=False,
+          **fixed):
+    '''
+    Run strategy_cls for every parameter set in grid.
+
+    input:
+            1. strategy_cls: MA / RSIStrategy / MACDStrategy / VolatilityBreakoutStrategy
+            2. grid: {param: [values]} or a list of {param: value}
+            3. tickers, initial_cash: as for the strategy constructor
+            4. processes: pool size (None = os.cpu_count(), 1 = run inline)
+            5. curves: also return the date x parameter-set equity matrix
+            6. fixed: other constructor kwargs (data_dir, price_col, event_based, ...)
+    output:
+            DataFrame, one row per parameter set: params + final equity / stats
+            (and the equity matrix when curves=True)
+    '''
+    combos = param_grid(grid)
+    if not combos:
+        return (pd.DataFrame(), pd.DataFrame()) if curves else pd.DataFrame()
+    price, packed = build_orders(strategy_cls, combos, tickers, initial_cash, **fixed)
+
+    args = (price.to_numpy(dtype="float64"), price.index, list(price.columns), float(initial_cash))
+    processes = os.cpu_count() if processes is None else int(processes)
+    if processes <= 1 or len(combos) == 1:
+        _init_worker(*args)
+        done = [_execute(packed[p]) for p in range(len(combos))]
+    else:
+        with ProcessPoolExecutor(max_workers=min(processes, len(combos)),
+                                 initializer=_init_worker, initargs=args) as pool:
+            done = list(pool.map(_execute, packed, chunksize=max(1, len(combos) // (4 * processes))))
+
+    # every run scored in one pass over the date x run matrices
+    rows, cash, holdings = zip(*done)
+    cash, holdings = np.column_stack(cash), np.column_stack(holdings)
+    stats = metrics(cash + holdings, cash, holdings,
+                    fills=[r["n_fills"] for r in rows], skips=[r["n_skips"] for r in rows],
+                    initial=float(initial_cash), periods=bars_per_year(fixed.get("bar_freq", "1D")))
+    out = pd.DataFrame([dict(params, **row) for params, row in zip(combos, rows)])
+    out = pd.concat([out, stats[SUMMARY].reset_index(drop=True)], axis=1)
+    out.insert(0, "strategy", strategy_cls.__name__)
+    if curves:
+        return out, pd.DataFrame(cash + holdings, index=price.index, columns=pd.RangeIndex(len(combos), name="combo"))
+    return out
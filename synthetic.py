@@ -0,0 +1,176 @@
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from price_store import build_store
+from bar_store import write_bars, bars_per_year
+
+
+'''
+Deterministic synthetic market data for benchmarks and checks.
+
+Prices follow a geometric Brownian motion per ticker (random drift,
+volatility and starting price), volumes are log-normal. Optional gaps:
+single missing days (nan_rate), tickers that list late or delist early
+(late_frac / delist_frac). Ticker i always gets the same path for a given
+seed, whatever the universe size, so small universes are prefixes of big
+ones.
+
+    close, volume = gbm_panel(500, 5000, seed=0, nan_rate=0.01)
+    write_universe("bench_data/adjclose", 500, 5000)   # {ticker}.parquet + panel/
+    write_bars_universe("bench_data/bars", 50, 20, "1min")   # intraday bar store
+
+StubDownload mimics yf.download on top of such a panel, so
+PriceLoader.fetch_data can run without network access.
+'''
+
+START = "2005-01-03"
+
+
+def ticker_names(n):
+    return [f"S{i:05d}" for i in range(n)]
+
+
+def _one(i, dates, seed, nan_rate, late_frac, delist_frac, per_year=252):
+    rng = np.random.default_rng([seed, i])
+    T = len(dates)
+    mu = rng.normal(0.06, 0.08) / per_year
+    sigma = rng.uniform(0.15, 0.6) / np.sqrt(per_year)
+    s0 = rng.uniform(10, 500)
+    ret = rng.normal(mu - 0.5 * sigma ** 2, sigma, T)
+    close = np.round(s0 * np.exp(np.cumsum(ret)), 2)
+    volume = np.round(rng.lognormal(13, 1, T))
+    missing = rng.random(T) < nan_rate
+    if rng.random() < late_frac:
+        missing[:rng.integers(1, max(2, T // 2))] = True
+    if rng.random() < delist_frac:
+        missing[T - rng.integers(1, max(2, T // 4)):] = True
+    close[missing] = np.nan
+    volume[missing] = np.nan
+    return close, volume
+
+
+def gbm_panel(n_tickers, n_days, seed=0, start=START, nan_rate=0.0,
+              late_frac=0.0, delist_frac=0.0, per_year=252):
+    '''
+    input:
+            1. n_tickers / n_days: universe size (e.g. 10..5000 x 250..20000)
+            2. seed: same seed -> same data
+            3. nan_rate: share of randomly missing days per ticker
+            4. late_frac / delist_frac: share of tickers with a missing head / tail
+            5. per_year: rows per year the drift / volatility are scaled to (bars)
+    output:
+            close, volume: aligned date x ticker frames (business days)
+    '''
+    dates = pd.bdate_range(start, periods=n_days, name="Date")
+    close = np.empty((n_days, n_tickers))
+    volume = np.empty((n_days, n_tickers))
+    for i in range(n_tickers):
+        close[:, i], volume[:, i] = _one(i, dates, seed, nan_rate, late_frac, delist_frac, per_year)
+    names = ticker_names(n_tickers)
+    return (pd.DataFrame(close, index=dates, columns=names),
+            pd.DataFrame(volume, index=dates, columns=names))
+
+
+def write_universe(outdir, n_tickers, n_days, seed=0, store=True, **gaps):
+    '''
+    write one {ticker}.parquet (Close, Volume) per ticker, in the layout
+    PriceLoader.fetch_data produces; store=True also builds panel/
+    output: list of tickers
+    '''
+    out = Path(outdir)
+    out.mkdir(parents=True, exist_ok=True)
+    close, volume = gbm_panel(n_tickers, n_days, seed, **gaps)
+    for t in close.columns:
+        df = pd.DataFrame({"Close": close[t], "Volume": volume[t]}).dropna(how="all")
+        df.to_parquet(out / f"{t}.parquet")
+    if store:
+        build_store(out, tickers=list(close.columns))
+    return list(close.columns)
+
+
+def session_index(n_days, bar_freq="1min", start=START):
+    '''
+    bar timestamps of n_days business days, 09:30 to 16:00 local time
+    '''
+    step = pd.Timedelta(bar_freq)
+    per_day = int(np.ceil(pd.Timedelta(hours=6, minutes=30) / step))
+    days = pd.bdate_range(start, periods=n_days)
+    offsets = pd.TimedeltaIndex(pd.Timedelta(hours=9, minutes=30) + step * np.arange(per_day))
+    stamps = (days.values[:, None] + offsets.values[None, :]).ravel()
+    return pd.DatetimeIndex(stamps, name="timestamp")
+
+
+def write_bars_universe(root, n_tickers, n_days, bar_freq="1min", seed=0, partition="month",
+                        **gaps):
+    '''
+    GBM bars (one path per ticker, as gbm_panel) written to the partitioned
+    bar store under root (see bar_store.py)
+    output: list of tickers
+    '''
+    index = session_index(n_days, bar_freq)
+    close, volume = gbm_panel(n_tickers, len(index), seed, per_year=bars_per_year(bar_freq), **gaps)
+    frames = {t: pd.DataFrame({"Close": close[t].to_numpy(), "Volume": volume[t].to_numpy()},
+                              index=index).dropna(how="all") for t in close.columns}
+    write_bars(frames, root, bar_freq, partition)
+    return list(close.columns)
+
+
+class StubDownload:
+    """
+    yf.download-compatible stand-in serving a synthetic panel.
+
+    download(batch, start=..., end=..., group_by="ticker") returns the
+    (ticker, field) column frame yfinance would; a single symbol such as
+    "^GSPC" returns a flat frame with every date (the trading calendar).
+    latency: seconds slept per call, to mimic network round trips.
+    fail: tickers whose batch request raises (a failed / throttled batch).
+    Every batch request is recorded in .requests as (monotonic start
+    time, tickers); .max_in_flight is the most requests seen at once.
+    """
+    def __init__(self, close, volume, latency=0.0, fail=()):
+        self.close, self.volume = close, volume
+        self.latency = float(latency)
+        self.fail = set(fail)
+        self.calls = 0
+        self.requests = []
+        self.in_flight = self.max_in_flight = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, tickers, start=None, end=None, **kwargs):
+        with self._lock:
+            self.calls += 1
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            if not isinstance(tickers, str):
+                self.requests.append((time.monotonic(), list(tickers)))
+        try:
+            if self.latency:
+                time.sleep(self.latency)
+            if not isinstance(tickers, str) and self.fail.intersection(tickers):
+                raise ConnectionError(f"stub: batch with {sorted(self.fail.intersection(tickers))} failed")
+            return self._frame(tickers, start, end)
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+    def requested(self):
+        # every ticker asked for, in request order (repeats = re-downloads)
+        return [t for _, batch in self.requests for t in batch]
+
+    def _frame(self, tickers, start, end):
+        idx = self.close.index
+        rows = np.ones(len(idx), dtype=bool)
+        if start is not None:
+            rows &= idx >= pd.Timestamp(start)
+        if end is not None:
+            rows &= idx < pd.Timestamp(end)
+        if isinstance(tickers, str):
+            return pd.DataFrame({"Close": np.ones(int(np.sum(rows)))}, index=idx[rows])
+        tickers = [t for t in tickers if t in self.close.columns]
+        parts = {t: pd.DataFrame({"Close": self.close.loc[rows, t],
+                                  "Volume": self.volume.loc[rows, t]}) for t in tickers}
+        return pd.concat(parts, axis=1) if parts else pd.DataFrame()
@@ -0,0 +1,206 @@
+import numpy as np
+import pandas as pd
+
+
+'''
+Columnar trade log shared by all strategies.
+
+Instead of one dict per BUY/SKIP the log keeps growable typed columns:
+
+    date         datetime64[ns]
+    ticker       interned -> small int codes (categorical)
+    side         BUY / SKIP codes
+    qty, price, notional, cash_before, cash_after   float64
+    reason       no_price / insufficient_cash / no_volume codes (-1 = none)
+
+Columns double in capacity when full, so appends are amortized O(1) and
+there is no per-row Python object. to_frame() wraps the filled part of
+the columns in a DataFrame without copying them; to_arrow()/to_parquet()
+export directly.
+'''
+
+COLUMNS = ["date", "ticker", "side", "qty", "price", "notional",
+           "cash_before", "cash_after", "reason"]
+SIDES = ["BUY", "SKIP"]
+REASONS = ["no_price", "insufficient_cash", "no_volume"]
+BUY, SKIP = 0, 1
+_FLOATS = ["qty", "price", "notional", "cash_before", "cash_after"]
+
+
+def _code_dtype(n_categories):
+    # the smallest code dtype pandas uses for this many categories; codes
+    # already in that dtype are wrapped by Categorical without a copy
+    if n_categories < 127:
+        return np.int8
+    if n_categories < 32767:
+        return np.int16
+    return np.int32
+
+
+class TradeLog:
+    def __init__(self, capacity=1024):
+        self._n = 0
+        self._cap = max(16, int(capacity))
+        self._tickers = []               # code -> ticker
+        self._codes = {}                 # ticker -> code
+        self._cols = {"date": np.empty(self._cap, dtype="M8[ns]"),
+                      "ticker": np.empty(self._cap, dtype=np.int8),
+                      "side": np.empty(self._cap, dtype=np.int8),
+                      "reason": np.empty(self._cap, dtype=np.int8)}
+        for c in _FLOATS:
+            self._cols[c] = np.empty(self._cap, dtype="float64")
+
+    # ---------- writing ----------
+
+    def intern(self, tickers):
+        '''
+        codes for a list of tickers (new names are added)
+        '''
+        out = np.empty(len(tickers), dtype=np.int64)
+        for i, t in enumerate(tickers):
+            code = self._codes.get(t)
+            if code is None:
+                code = self._codes[t] = len(self._tickers)
+                self._tickers.append(t)
+            out[i] = code
+        dt = _code_dtype(len(self._tickers))
+        if self._cols["ticker"].dtype != dt:
+            self._cols["ticker"] = self._cols["ticker"].astype(dt)
+        return out
+
+    def _reserve(self, extra):
+        need = self._n + extra
+        if need <= self._cap:
+            return
+        cap = self._cap
+        while cap < need:
+            cap *= 2
+        for c, arr in self._cols.items():
+            new = np.empty(cap, dtype=arr.dtype)
+            new[:self._n] = arr[:self._n]
+            self._cols[c] = new
+        self._cap = cap
+
+    def extend(self, date, ticker_code, side, qty, price, notional,
+               cash_before, cash_after, reason):
+        '''
+        append many rows at once (array-likes of equal length, scalars broadcast)
+        '''
+        k = len(ticker_code)
+        if k == 0:
+            return
+        self._reserve(k)
+        s = slice(self._n, self._n + k)
+        c = self._cols
+        c["date"][s] = date
+        c["ticker"][s] = ticker_code
+        c["side"][s] = side
+        c["qty"][s] = qty
+        c["price"][s] = price
+        c["notional"][s] = notional
+        c["cash_before"][s] = cash_before
+        c["cash_after"][s] = cash_after
+        c["reason"][s] = reason
+        self._n += k
+
+    def append(self, date, ticker, side, qty, price, notional,
+               cash_before, cash_after, reason=None):
+        code = self.intern([ticker])
+        self.extend(np.datetime64(pd.Timestamp(date), "ns"), code,
+                    SIDES.index(side), qty,
+                    np.nan if price is None else price, notional,
+                    cash_before, cash_after,
+                    -1 if reason is None else REASONS.index(reason))
+
+    @classmethod
+    def from_frame(cls, df):
+        '''
+        log holding the rows of a to_frame()-shaped DataFrame (e.g. read back from parquet)
+        '''
+        log = cls(capacity=len(df))
+        if len(df) == 0:
+            return log
+        ticker = pd.Categorical(df["ticker"].astype(str))
+        remap = log.intern(list(ticker.categories))
+        reason = pd.Categorical(df["reason"], categories=REASONS).codes
+        log.extend(pd.to_datetime(df["date"]).to_numpy(dtype="M8[ns]"),
+                   remap[ticker.codes],
+                   pd.Categorical(df["side"], categories=SIDES).codes,
+                   *(df[c].to_numpy(dtype="float64") for c in _FLOATS),
+                   reason)
+        return log
+
+    # ---------- reading ----------
+
+    def __len__(self):
+        return self._n
+
+    def column(self, name):
+        # filled part of a raw column (a view)
+        return self._cols[name][:self._n]
+
+    @property
+    def tickers(self):
+        return list(self._tickers)
+
+    def _is_sorted(self):
+        # already in (date, ticker) order?
+        if self._n < 2:
+            return True
+        d = self.column("date").view("i8")
+        rank = np.empty(len(self._tickers), dtype=np.int64)
+        rank[np.argsort(np.asarray(self._tickers, dtype=str), kind="stable")] = np.arange(len(self._tickers))
+        r = rank[self.column("ticker")]
+        dd, dr = np.diff(d), np.diff(r)
+        return bool(np.all((dd > 0) | ((dd == 0) & (dr > 0))))
+
+    def to_frame(self, sort=True):
+        '''
+        DataFrame view over the columns (no copy). The strategies log in
+        (date, ticker) order already; otherwise sort=True sorts a copy.
+        '''
+        n = self._n
+        cols = self._cols
+        data = {
+            "date": cols["date"][:n],
+            "ticker": pd.Categorical.from_codes(
+                cols["ticker"][:n], dtype=pd.CategoricalDtype(self._tickers), validate=False),
+            "side": pd.Categorical.from_codes(
+                cols["side"][:n], dtype=pd.CategoricalDtype(SIDES), validate=False),
+        }
+        for c in _FLOATS:
+            data[c] = cols[c][:n]
+        data["reason"] = pd.Categorical.from_codes(
+            cols["reason"][:n], dtype=pd.CategoricalDtype(REASONS), validate=False)
+        df = pd.DataFrame(data, columns=COLUMNS, copy=False)
+        if sort and not self._is_sorted():
+            df = df.sort_values(["date", "ticker"], kind="stable",
+                                key=lambda s: s.astype(str) if s.name == "ticker" else s)
+            df = df.reset_index(drop=True)
+        return df
+
+    def __iter__(self):
+        # row dicts, for code that still expects a list of dicts
+        return iter(self.to_frame(sort=False).to_dict("records"))
+
+    def to_arrow(self):
+        import pyarrow as pa
+        n = self._n
+        cols = self._cols
+
+        def dict_col(codes, categories):
+            codes = codes[:n].astype(np.int32)
+            return pa.DictionaryArray.from_arrays(
+                pa.array(codes, mask=codes < 0), pa.array(list(categories), type=pa.string()))
+
+        arrays = {"date": pa.array(cols["date"][:n]),
+                  "ticker": dict_col(cols["ticker"], self._tickers),
+                  "side": dict_col(cols["side"], SIDES)}
+        for c in _FLOATS:
+            arrays[c] = pa.array(cols[c][:n])
+        arrays["reason"] = dict_col(cols["reason"], REASONS)
+        return pa.table([arrays[c] for c in COLUMNS], names=COLUMNS)
+
+    def to_parquet(self, path):
+        import pyarrow.parquet as pq
+        pq.write_table(self.to_arrow(), path)
@@ -0,0 +1,109 @@
+import numpy as np
+import pandas as pd
+
+
+'''
+Portfolio valuation from fills.
+
+Instead of re-summing every ticker's position in Python at the end of
+each day, the date x ticker position matrix is built once from the fills
+(scatter the quantities, cumulative sum down the dates) and holdings are
+one NaN-aware row-wise dot product against the price matrix (done a
+block of dates at a time by holdings_from_fills, to bound memory). Cash
+only changes on fill days, so it is a forward fill of the end-of-day cash.
+'''
+
+
+def position_matrix(fill_days, fill_tickers, T, N, qty=1, start=None):
+    '''
+    input:
+            1. fill_days / fill_tickers: row / column index of every fill
+            2. T, N: number of dates / tickers
+            3. qty: shares per fill (scalar or array)
+            4. start: optional shares held before the first date (len N)
+    output:
+            (T, N) int64 matrix of shares held at the end of each day
+    '''
+    pos = np.zeros((T, N), dtype=np.int64)
+    np.add.at(pos, (np.asarray(fill_days, dtype=np.intp),
+                    np.asarray(fill_tickers, dtype=np.intp)), qty)
+    np.cumsum(pos, axis=0, out=pos)
+    if start is not None:
+        pos += np.asarray(start, dtype=np.int64)
+    return pos
+
+
+def holdings_value(positions, prices):
+    '''
+    sum_i positions[t, i] * prices[t, i] for every t; a missing (NaN)
+    price counts as 0
+    '''
+    px = np.where(np.isnan(prices), 0.0, prices)
+    return np.einsum("ij,ij->i", positions, px)
+
+
+def holdings_from_fills(fill_days, fill_tickers, prices, start=None, block=256):
+    '''
+    holdings_value(position_matrix(...), prices) a block of dates at a
+    time, so the (T, N) position matrix (and a float64 copy of float32
+    prices) never exists in full
+    input:
+            1. fill_days / fill_tickers: fills, days ascending
+            2. prices: (T, N) float32 / float64 matrix
+            3. start: optional shares held before the first date (len N)
+    output:
+            (holdings per day, shares held after the last day)
+    '''
+    T, N = prices.shape
+    days = np.asarray(fill_days, dtype=np.intp)
+    tickers = np.asarray(fill_tickers, dtype=np.intp)
+    pos = np.zeros(N, dtype=np.int64) if start is None else np.asarray(start, dtype=np.int64)
+    out = np.empty(T, dtype="float64")
+    for a in range(0, T, block):
+        b = min(a + block, T)
+        lo, hi = np.searchsorted(days, [a, b])
+        m = position_matrix(days[lo:hi] - a, tickers[lo:hi], b - a, N, start=pos)
+        out[a:b] = holdings_value(m, prices[a:b])
+        pos = m[-1].copy()
+        del m
+    return out, pos
+
+
+def cash_path(days, cash_after, T, cash):
+    '''
+    cash at the end of every day from the end-of-day cash on the days
+    it changed (days ascending)
+    '''
+    days = np.asarray(days, dtype=np.intp)
+    if len(days) == 0:
+        return np.full(T, float(cash))
+    last = np.searchsorted(days, np.arange(T), side="right") - 1
+    vals = np.asarray(cash_after, dtype="float64")
+    return np.where(last < 0, float(cash), vals[np.maximum(last, 0)])
+
+
+def portfolio_frame(dates, cash, holdings):
+    '''
+    date-indexed cash / holdings / equity frame straight from the arrays
+    '''
+    df = pd.DataFrame({"cash": cash, "holdings": holdings, "equity": cash + holdings},
+                      index=pd.Index(dates, name="date"))
+    return df
+
+
+def concat_portfolio(parts):
+    '''
+    portfolio frames of successive run() calls -> one frame sorted by date
+    '''
+    if not parts:
+        return pd.DataFrame()
+    df = parts[0] if len(parts) == 1 else pd.concat(parts)
+    return df if df.index.is_monotonic_increasing else df.sort_index(kind="stable")
+
+
+def portfolio_records(parts):
+    '''
+    the old list-of-dicts form of the portfolio rows
+    '''
+    df = concat_portfolio(parts)
+    return df.reset_index().to_dict("records") if len(df) else []
@@ -0,0 +1,161 @@
+import numpy as np
+import pandas as pd
+from pandas.tseries.frequencies import to_offset
+
+import events
+import instrument
+from execution import fill_orders, value_fills
+from sweep import _summary
+from bar_store import bars_per_year
+
+
+'''
+Walk-forward (out-of-sample) runs.
+
+    res = MACDStrategy(100_000, tickers).walk_forward(train=pd.DateOffset(years=3), test="1ME")
+    res = walk_forward(strategy, train=756, test=21)          # in trading days
+
+Spans are bars (int; trading days for daily bars) or pandas offsets; anchored aliases such as
+"1ME" / "YE" snap to period ends (monthly windows end on month ends, the
+month-end bar included, so "1ME" test windows are calendar months),
+DateOffset(years=3) keeps the exact calendar length.
+
+Prices are loaded once and signals are computed once over the full
+history. Every indicator value only looks backwards, so the signal on a
+test day is exactly what a run started at the beginning of the data
+would see; the train span in front of each test window is the warm-up
+(and in-sample) period. Execution then runs independently per test
+window, with fresh cash and no positions, so the total cost is about one
+full run plus a small fill loop per window instead of one full run per
+window.
+'''
+
+
+# offsets whose dates close a period: the bar on such a date ends the window
+_PERIOD_ENDS = (pd.offsets.MonthEnd, pd.offsets.BusinessMonthEnd, pd.offsets.SemiMonthEnd,
+                pd.offsets.QuarterEnd, pd.offsets.BQuarterEnd, pd.offsets.YearEnd,
+                pd.offsets.BYearEnd)
+
+
+def _ends_period(span):
+    return (isinstance(span, _PERIOD_ENDS)
+            or (isinstance(span, pd.offsets.Week) and span.weekday is not None))
+
+
+def _closes(span, closed):
+    # does a boundary moved by `span` close a period? calendar lengths (21D,
+    # DateOffset(years=3)) keep the side of the boundary they start from
+    if _ends_period(span):
+        return True
+    if isinstance(span, pd.offsets.Day) or type(span) is pd.DateOffset:
+        return closed
+    return False
+
+
+def _span(x):
+    # bars (int) or a calendar offset ("1ME", "21D", DateOffset(years=3))
+    if isinstance(x, (int, np.integer)):
+        return int(x)
+    return to_offset(x)
+
+
+def windows(index, train, test, step=None):
+    '''
+    Row positions of the walk-forward windows over a sorted date index.
+
+    input:
+            1. index: DatetimeIndex of the full history
+            2. train / test: window lengths, bars (int) or offsets
+            3. step: distance between test window starts (default = test)
+    output:
+            list of (train_start, test_start, test_end) positions, test
+            windows are [test_start, test_end); the last one may be short
+    '''
+    index = pd.DatetimeIndex(index)
+    T = len(index)
+    train, test = _span(train), _span(test)
+    step = test if step is None else _span(step)
+    out = []
+    if isinstance(train, int) and isinstance(test, int) and isinstance(step, int):
+        ts = train
+        while ts < T:
+            out.append((ts - train, ts, min(ts + test, T)))
+            ts += step
+        return out
+
+    # calendar offsets: move boundaries (date, closed), then map them to
+    # rows; a closed boundary is a period end: every bar of that day
+    # (intraday bars after midnight too) belongs before it
+    def pos(b):
+        d, closed = b
+        if closed:
+            d = d.normalize() + pd.Timedelta(days=1)
+        return int(index.searchsorted(d, side="left"))
+
+    def shift(b, span, sign=1):
+        if isinstance(span, int):
+            p = min(max(pos(b) + sign * span, 0), T)
+            return (index[p] if p < T else index[-1] + pd.Timedelta(days=1)), False
+        if b[1] and isinstance(span, pd.offsets.Tick):
+            b = (b[0].normalize() + pd.Timedelta(days=1), False)   # sub-day spans: from the day's end
+        d = b[0] + span if sign > 0 else b[0] - span
+        return d, _closes(span, b[1])
+
+    b = shift((index[0], False), train)
+    while pos(b) < T:
+        ts = pos(b)
+        te = pos(shift(b, test))
+        tr = pos(shift(b, train, -1))
+        if te > ts:
+            out.append((tr, ts, te))
+        b = shift(b, step)
+    return out
+
+
+def walk_forward(strategy, train, test, step=None, cash=None, in_sample=False):
+    '''
+    Run `strategy` (MA / RSI / MACD / VOL instance) walk-forward.
+
+    input:
+            1. strategy: a configured strategy (its cash is the fresh cash per window)
+            2. train / test / step: see windows()
+            3. cash: override the starting cash of every window
+            4. in_sample: also execute each train span and add train_* stats
+    output:
+            DataFrame, one row per test window: dates, fills/skips, final
+            cash / equity and return / risk stats
+    '''
+    cash = float(strategy.cash if cash is None else cash)
+    name = type(strategy).__name__
+    with instrument.phase(f"{name}.load"):
+        price = strategy._load_price()
+    if price.empty:
+        return pd.DataFrame()
+    with instrument.phase(f"{name}.signal"):
+        if getattr(strategy, "compact", False):
+            orders = events.blockwise(strategy, price)
+        else:
+            orders = events.Events.from_signals(strategy._make_signals(price))
+    px = price.to_numpy()
+    dates, tickers = price.index, list(price.columns)
+    periods = bars_per_year(getattr(strategy, "bar_freq", "1D"))
+
+    def run(a, b):
+        with instrument.phase(f"{name}.walk_forward"):
+            res = value_fills(fill_orders(orders.window(a, b), px[a:b], dates[a:b], tickers, cash,
+                                          record=False), px[a:b])
+        row = {"n_fills": res.n_fills, "n_skips": res.n_skips, "final_cash": res.cash}
+        row.update(_summary(res.equity, cash, periods))
+        return row
+
+    rows = []
+    for w, (tr, ts, te) in enumerate(windows(dates, train, test, step)):
+        row = {"window": w, "train_start": dates[tr], "test_start": dates[ts],
+               "test_end": dates[te - 1], "days": te - ts}
+        row.update(run(ts, te))
+        if in_sample and ts > tr:
+            row.update({f"train_{k}": v for k, v in run(tr, ts).items()})
+        rows.append(row)
+    out = pd.DataFrame(rows)
+    out.insert(0, "strategy", name)
+    return out